@@ -1,13 +1,28 @@
+import asyncio
+import gzip
+import json
+import numpy as np
 from pathlib import Path
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from services.frame_extract import extract_frames
-from services.process_pipeline import process_pipeline
-from fastapi import BackgroundTasks
+from services.jobs import job_queue, QueueFullError
+from services.metrics import profile_path
+from services.progress import read_progress
+from services.render import render_path
+from services.video_analysis import VideoAnalysisService
+from services.video_metadata import estimate_frames, metadata_store
+from services.detections_store import (
+    IncompleteDetectionsError, detections_path, json_to_columns, query_detections,
+    read_manifest, time_to_frames, to_records
+)
+from models.job import PipelineOptions
 
 
 router = APIRouter()
+analysis_service = VideoAnalysisService()
 
 # Pydantic models for request/response
 class AnalysisRequest(BaseModel):
@@ -20,14 +35,8 @@ class AnalysisResult(BaseModel):
     results: dict
 
 
-@router.post("/process/{video_id}")
-async def process_video(video_id: str, background_tasks: BackgroundTasks):
-    background_tasks.add_task(process_pipeline, video_id)
-    return {"status": "processing"}
-
-
 @router.post("/start", response_model=AnalysisResult)
-async def start_analysis(request: AnalysisRequest, background_tasks: BackgroundTasks):
+async def start_analysis(request: AnalysisRequest):
     """
     Start analysis on an uploaded video.
     
@@ -37,30 +46,83 @@ async def start_analysis(request: AnalysisRequest, background_tasks: BackgroundT
     Returns:
         Analysis results
     """
-    # TODO: Implement your video analysis logic here
-    # This is a placeholder that you can populate with your analysis code
-    output_path = Path(f"frames/{request.filename.split('.')[0]}")
+    try:
+        analysis = await analysis_service.analyze_video(request.filename, request.options)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
     return AnalysisResult(
         filename=request.filename,
-        status="completed",
-        results={
-            "message": "Analysis placeholder - implement your logic here",
-            "options": request.options or {}
-        }
+        status="completed" if analysis["status"] == "success" else analysis["status"],
+        results=analysis["analysis"] or {}
     )
 
 @router.post("/process/{video_id}")
-async def process_video(
-    video_id: str,
-    background_tasks: BackgroundTasks
-):
-    background_tasks.add_task(process_pipeline, video_id)
+async def process_video(video_id: str, options: Optional[PipelineOptions] = None):
+    """
+    Queue the detection pipeline for an uploaded video.
+
+    Submitting the same video with the same options while a job for it is
+    still queued or running returns that job instead of starting another.
+
+    Args:
+        video_id: Name of the uploaded video file
+        options: Optional pipeline options
+
+    Returns:
+        Job status and ID
+    """
+    if not (Path("uploads") / video_id).is_file():
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    options = options or PipelineOptions()
+    try:
+        job, created = await run_in_threadpool(job_queue.submit, video_id, options.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}")
 
+    # Cost estimate from the metadata probed at upload
+    metadata = await run_in_threadpool(metadata_store.get, video_id)
     return {
-        "status": "processing",
-        "video_id": video_id
+        "status": job["status"],
+        "video_id": video_id,
+        "job_id": job["job_id"],
+        "deduplicated": not created,
+        "estimated_frames": estimate_frames(metadata, fps=7)
+    }
+
+
+def _job_status(filename: str) -> Optional[dict]:
+    """
+    Status and live progress of the latest job for `filename`.
+    """
+    job = job_queue.latest_for_video(filename)
+    if job is None:
+        return None
+
+    progress = read_progress(job["job_id"]) or {}
+    status = {
+        "filename": filename,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": progress.get("progress", 0),
+        "stage": progress.get("stage"),
+        "frames_processed": progress.get("frames_processed", 0),
+        "frames_total": progress.get("frames_total"),
+        "fps": progress.get("fps"),
+        "eta_seconds": progress.get("eta_seconds"),
+        "stages": progress.get("stages", {}),
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"]
     }
+    if job["status"] == "completed":
+        status["progress"] = 100
+        status["eta_seconds"] = 0
+    return status
+
+
 @router.get("/status/{filename}")
 async def get_analysis_status(filename: str):
     """
@@ -70,33 +132,254 @@ async def get_analysis_status(filename: str):
         filename: Name of the analyzed file
     
     Returns:
-        Analysis status
+        Analysis status with frames processed, fps, ETA and per-stage
+        throughput
     """
-    # TODO: Implement status tracking logic
+    status = await run_in_threadpool(_job_status, filename)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No analysis job for this file")
+
+    return status
+
+@router.get("/status/{filename}/stream")
+async def stream_analysis_status(filename: str, interval: float = 1.0):
+    """
+    Stream status updates as Server-Sent Events until the job finishes.
+    
+    Args:
+        filename: Name of the analyzed file
+        interval: Seconds between updates
     
+    Returns:
+        `text/event-stream` of status objects (same shape as /status); a
+        final `not_found` event if the job disappears
+    """
+    if await run_in_threadpool(_job_status, filename) is None:
+        raise HTTPException(status_code=404, detail="No analysis job for this file")
+    interval = max(interval, 0.2)
+
+    async def events():
+        last = None
+        while True:
+            status = await run_in_threadpool(_job_status, filename)
+            if status is None:
+                # Job removed while streaming
+                payload = json.dumps({"filename": filename, "detail": "No analysis job for this file"})
+                yield f"event: not_found\ndata: {payload}\n\n"
+                break
+            payload = json.dumps(status)
+            if payload != last:
+                yield f"event: status\ndata: {payload}\n\n"
+                last = payload
+            if status["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+def _query_results(filename: str, frame_start, frame_end, start_time, end_time,
+                   track_ids, teams, offset, limit) -> Optional[dict]:
+    """
+    Run a results query against the stored detections of `filename`.
+    """
+    columnar = detections_path(filename, "columnar")
+    legacy = next((path for path in (detections_path(filename, "jsonl"),
+                                     detections_path(filename, "json")) if path.is_file()), None)
+
+    indexed = (columnar / "manifest.json").is_file()
+    if indexed:
+        manifest = read_manifest(columnar)
+        fps = manifest["fps"]
+        frame_count = manifest["frame_count"]
+    elif legacy is not None:
+        fps, frame_count = None, None
+    else:
+        return None
+
+    first, last = frame_start or 1, frame_end
+    if start_time is not None or end_time is not None:
+        if not fps:
+            raise HTTPException(
+                status_code=400,
+                detail="Time ranges need the sampling fps, which this output does not store"
+            )
+        t_first, t_last = time_to_frames(fps, start_time, end_time)
+        first = max(first, t_first)
+        if t_last is not None:
+            last = t_last if last is None else min(last, t_last)
+
+    if indexed:
+        result = query_detections(
+            columnar, frames=(first, last), track_ids=track_ids, teams=teams,
+            offset=offset, limit=limit
+        )
+        total, columns = result["total"], result["columns"]
+    else:
+        # JSON output has no index; filter the whole file
+        columns = json_to_columns(legacy)
+        mask = columns["frame"] >= first
+        if last is not None:
+            mask &= columns["frame"] <= last
+        if track_ids is not None:
+            mask &= np.isin(columns["track_id"], track_ids)
+        if teams is not None:
+            mask &= np.isin(columns["team"], teams)
+        rows = np.flatnonzero(mask)
+        total = len(rows)
+        page = rows[offset:offset + limit]
+        columns = {name: values[page] for name, values in columns.items()}
+
+    next_offset = offset + limit if offset + limit < total else None
     return {
         "filename": filename,
-        "status": "pending",
-        "progress": 0
+        "fps": fps,
+        "frame_count": frame_count,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset,
+        "detections": to_records(columns, fps)
     }
 
+
+def _json_response(request: Request, payload: dict, min_size: int = 1024) -> Response:
+    """
+    JSON response, gzip-compressed when the client accepts it.
+    """
+    body = json.dumps(payload, separators=(",", ":"), allow_nan=False).encode()
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= min_size and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/results/{filename}")
-async def get_analysis_results(filename: str):
+async def get_analysis_results(
+    request: Request,
+    filename: str,
+    frame_start: Optional[int] = Query(None, ge=1),
+    frame_end: Optional[int] = Query(None, ge=1),
+    start_time: Optional[float] = Query(None, ge=0),
+    end_time: Optional[float] = Query(None, ge=0),
+    track_id: Optional[List[int]] = Query(None),
+    team: Optional[List[int]] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000)
+):
     """
-    Get the results of a completed analysis.
+    Get the detections of a completed analysis.
+    
+    Frame and track ID filters are answered from indexes built when the
+    detections were written, so only the chunks holding the requested page
+    are read.
     
     Args:
         filename: Name of the analyzed file
+        frame_start, frame_end: Inclusive 1-based frame range
+        start_time, end_time: Inclusive range in seconds of video
+        track_id: Track IDs to include (repeatable)
+        team: Team labels to include (repeatable)
+        offset: Number of matching detections to skip
+        limit: Page size
     
     Returns:
-        Analysis results
+        Page of detections ordered by frame, with `total` and `next_offset`
+    """
+    try:
+        results = await run_in_threadpool(
+            _query_results, filename, frame_start, frame_end, start_time, end_time,
+            track_id, team, offset, limit
+        )
+    except IncompleteDetectionsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if results is None:
+        raise HTTPException(status_code=404, detail="No results for this file")
+
+    return _json_response(request, results)
+
+@router.get("/analytics/{filename}")
+async def get_track_analytics(
+    request: Request,
+    filename: str,
+    track_id: Optional[List[int]] = Query(None),
+    frame_start: Optional[int] = Query(None, ge=1),
+    frame_end: Optional[int] = Query(None, ge=1),
+    trajectories: bool = False,
+    team_frames: bool = False
+):
     """
-    # TODO: Implement results retrieval logic
+    Get per-track and per-team analytics of a processed video.
     
-    return {
-        "filename": filename,
-        "status": "completed",
-        "results": {
-            "message": "Results placeholder - implement your logic here"
-        }
-    }
+    Aggregates are precomputed when the processing job finishes, so this
+    only selects from stored arrays.
+    
+    Args:
+        filename: Name of the analyzed file
+        track_id: Track IDs to include (repeatable; default all)
+        frame_start, frame_end: Inclusive frame range of trajectories and
+            team frames
+        trajectories: Include smoothed per-track positions and velocities
+        team_frames: Include team centroid and spread per frame
+    
+    Returns:
+        Track stats (distance, speeds, frames seen) and team totals
+    """
+    try:
+        result = await analysis_service.analyze_video(filename, {
+            "track_ids": track_id,
+            "frame_start": frame_start,
+            "frame_end": frame_end,
+            "trajectories": trajectories,
+            "team_frames": team_frames,
+        })
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if result["analysis"] is None:
+        raise HTTPException(status_code=404, detail="No results for this file")
+
+    return _json_response(request, result)
+
+@router.get("/render/{filename}")
+async def get_rendered_video(filename: str):
+    """
+    Download the annotated video of an analysis.
+    
+    Queue the pipeline with `{"render": true}` to produce it; completed
+    detections are reused from the result cache.
+    
+    Args:
+        filename: Name of the analyzed file
+    
+    Returns:
+        Annotated MP4
+    """
+    path = render_path(filename)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="No rendered video for this file")
+
+    return FileResponse(path, media_type="video/mp4",
+                        filename=f"{Path(filename).stem}_annotated.mp4")
+
+@router.get("/profile/{filename}")
+async def get_job_profile(filename: str):
+    """
+    Download the cProfile dump of the latest analysis job.
+    
+    Queue the pipeline with `{"profile": true}` to produce it. The dump is
+    in pstats format (`python -m pstats`, snakeviz); segment workers of
+    parallel runs are not included.
+    
+    Args:
+        filename: Name of the analyzed file
+    
+    Returns:
+        `.prof` file
+    """
+    job = await run_in_threadpool(job_queue.latest_for_video, filename)
+    path = profile_path(job["job_id"]) if job is not None else None
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="No profile for this file")
+
+    return FileResponse(path, media_type="application/octet-stream",
+                        filename=f"{Path(filename).stem}_{path.name}")
@@ -1,7 +1,18 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
-import shutil
-from datetime import datetime
+import re
+import subprocess
+from typing import Literal, Optional
+from models.job import PipelineOptions
+from models.upload import UploadSessionCreate
+from services.jobs import job_queue, QueueFullError
+from services.metrics import Counter, Histogram
+from services.upload_catalog import upload_catalog
+from services.video_metadata import metadata_store
+from services.uploads import (
+    UploadRangeError, save_stream, stored_name, upload_sessions, WRITE_BLOCK
+)
 
 router = APIRouter()
 
@@ -9,6 +20,17 @@ router = APIRouter()
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Exposed at /metrics; `route` is "video" (single request) or "session"
+# (resumable chunks)
+UPLOAD_REQUESTS = Counter(
+    "upload_requests_total", "Upload requests by route and outcome.", ("route", "outcome")
+)
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes written to disk by uploads.", ("route",))
+UPLOAD_SECONDS = Histogram(
+    "upload_write_seconds", "Time to receive, hash and write an upload request body.", ("route",)
+)
+PROBE_SECONDS = Histogram("video_probe_seconds", "Time to ffprobe a finished upload.")
+
 @router.post("/video")
 async def upload_video(file: UploadFile = File(...)):
     """
@@ -22,74 +44,305 @@ async def upload_video(file: UploadFile = File(...)):
     """
     # Validate file type
     if not file.content_type.startswith("video/"):
+        UPLOAD_REQUESTS.inc(route="video", outcome="rejected")
         raise HTTPException(
             status_code=400,
             detail="File must be a video"
         )
     
     # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = Path(file.filename).suffix
-    filename = f"{timestamp}_{file.filename}"
+    filename = stored_name(file.filename)
     file_path = UPLOAD_DIR / filename
-    
-    # Save file
+
+    async def chunks():
+        while chunk := await file.read(WRITE_BLOCK):
+            yield chunk
+
+    # Save file without blocking the event loop, hashing while writing
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with UPLOAD_SECONDS.time(route="video"):
+            saved = await save_stream(chunks(), file_path)
     except Exception as e:
+        file_path.unlink(missing_ok=True)
+        UPLOAD_REQUESTS.inc(route="video", outcome="error")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to upload file: {str(e)}"
         )
+    UPLOAD_BYTES.inc(saved["size"], route="video")
+    metadata = await _probe_upload(filename, saved["sha256"], "video")
+    await run_in_threadpool(
+        upload_catalog.add, filename, saved["size"], saved["sha256"], file.content_type
+    )
+    UPLOAD_REQUESTS.inc(route="video", outcome="complete")
     
     return {
         "status": "success",
         "filename": filename,
-        "size": file_path.stat().st_size,
-        "content_type": file.content_type
+        "size": saved["size"],
+        "sha256": saved["sha256"],
+        "content_type": file.content_type,
+        "metadata": metadata
+    }
+
+async def _probe_upload(filename: str, sha256: str, route: str) -> Optional[dict]:
+    """
+    Probe a finished upload once and store its metadata; reject (and
+    delete) files ffprobe can't read as video.
+    
+    Returns None, keeping the upload, if ffprobe couldn't be run; the
+    video is probed again on first access.
+    """
+    try:
+        with PROBE_SECONDS.time():
+            return await run_in_threadpool(metadata_store.probe, filename, sha256)
+    except OSError as e:
+        print(f"Could not run ffprobe for {filename}: {e}")
+        return None
+    except (subprocess.CalledProcessError, ValueError, KeyError) as e:
+        print(f"Could not probe {filename}: {e}")
+        UPLOAD_REQUESTS.inc(route=route, outcome="unreadable")
+        (UPLOAD_DIR / filename).unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=400,
+            detail="Could not read the file as a video"
+        )
+
+def _session_response(session: dict) -> dict:
+    return {
+        "session_id": session["session_id"],
+        "status": session["status"],
+        "filename": session["video_id"],
+        "size": session["size"],
+        "received": session["received"],
+        "sha256": session["sha256"]
+    }
+
+@router.post("/sessions")
+async def create_upload_session(request: UploadSessionCreate):
+    """
+    Start a resumable chunked upload.
+    
+    Send the file with `PUT /sessions/{session_id}` in sequential chunks,
+    each with a `Content-Range: bytes start-end/size` header.
+    
+    Args:
+        request: File name, total size and optional processing options
+    
+    Returns:
+        Session ID and upload state
+    """
+    if not request.content_type.startswith("video/"):
+        raise HTTPException(
+            status_code=400,
+            detail="File must be a video"
+        )
+
+    options = None
+    if request.process:
+        options = (request.options or PipelineOptions()).model_dump()
+    session = await run_in_threadpool(
+        upload_sessions.create, request.filename, request.size, request.content_type, options
+    )
+    return _session_response(session)
+
+@router.get("/sessions/{session_id}")
+async def get_upload_session(session_id: str):
+    """
+    Get the state of an upload, e.g. to find where to resume.
+    
+    Args:
+        session_id: Upload session ID
+    
+    Returns:
+        Upload state with the number of bytes received
+    """
+    session = await run_in_threadpool(upload_sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return _session_response(session)
+
+@router.put("/sessions/{session_id}")
+async def upload_chunk(session_id: str, request: Request,
+                       content_range: Optional[str] = Header(None)):
+    """
+    Upload the next chunk of a resumable upload.
+    
+    The chunk must start at or before the number of bytes received so far;
+    already received bytes are skipped, so retrying a chunk is safe. Without
+    a `Content-Range` header the body is appended at the current offset.
+    The body must have exactly as many bytes as the range says (400), and
+    the range must lie within the declared upload size (416).
+    
+    Args:
+        session_id: Upload session ID
+        content_range: `bytes start-end/size` of this chunk
+    
+    Returns:
+        Upload state; once complete, the stored filename and SHA-256 (and
+        the job ID if processing was requested)
+    """
+    session = await run_in_threadpool(upload_sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+
+    start, length = session["received"], None
+    if content_range is not None:
+        match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range.strip())
+        if match is None:
+            raise HTTPException(status_code=400, detail="Invalid Content-Range header")
+        start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+        if end < start:
+            raise HTTPException(status_code=400, detail="Invalid Content-Range header")
+        if total != "*" and int(total) != session["size"]:
+            raise HTTPException(
+                status_code=416,
+                detail=f"Content-Range size {total} differs from the upload size {session['size']}"
+            )
+        if end >= session["size"]:
+            raise HTTPException(status_code=416, detail="Content-Range ends past the upload size")
+        length = end - start + 1
+
+    received = session["received"]
+    try:
+        with UPLOAD_SECONDS.time(route="session"):
+            session = await upload_sessions.append(session_id, start, request.stream(), length)
+    except KeyError:
+        # Aborted while this request waited for the session
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    except UploadRangeError as e:
+        UPLOAD_REQUESTS.inc(route="session", outcome="conflict")
+        raise HTTPException(
+            status_code=409,
+            detail={"message": str(e), "received": e.received}
+        )
+    except ValueError as e:
+        UPLOAD_REQUESTS.inc(route="session", outcome="rejected")
+        raise HTTPException(status_code=400, detail=str(e))
+    UPLOAD_BYTES.inc(session["received"] - received, route="session")
+
+    response = _session_response(session)
+    if session["status"] == "complete":
+        try:
+            metadata = await _probe_upload(session["video_id"], session["sha256"], "session")
+        except HTTPException:
+            # The file was rejected and deleted; don't point at it
+            await run_in_threadpool(upload_sessions.fail, session_id)
+            raise
+        await run_in_threadpool(
+            upload_catalog.add, session["video_id"], session["size"], session["sha256"],
+            session["content_type"]
+        )
+        response["metadata"] = metadata
+    UPLOAD_REQUESTS.inc(route="session", outcome=session["status"])
+    if session["status"] == "complete" and session["process_options"] is not None:
+        # Start processing as soon as the last chunk lands
+        try:
+            job, _ = await run_in_threadpool(
+                job_queue.submit, session["video_id"], session["process_options"]
+            )
+            response["job_id"] = job["job_id"]
+        except QueueFullError as e:
+            response["job_error"] = f"Job queue is full: {e}"
+    return response
+
+@router.delete("/sessions/{session_id}")
+async def abort_upload_session(session_id: str):
+    """
+    Abort an unfinished upload and discard the received bytes.
+    
+    Args:
+        session_id: Upload session ID
+    
+    Returns:
+        Deletion status
+    """
+    if not await upload_sessions.abort(session_id):
+        raise HTTPException(status_code=404, detail="No unfinished upload with this ID")
+    return {
+        "status": "success",
+        "message": f"Upload {session_id} aborted"
     }
 
 @router.get("/list")
-async def list_uploads():
+async def list_uploads(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    sort: Literal["created", "filename", "size", "duration", "artifacts"] = "created",
+    order: Literal["asc", "desc"] = "desc",
+    q: Optional[str] = None,
+    processed: Optional[bool] = None,
+    min_size: Optional[int] = Query(None, ge=0),
+    max_size: Optional[int] = Query(None, ge=0),
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None
+):
     """
-    List all uploaded videos.
+    List uploaded videos, one page at a time, from the upload catalog.
+    
+    Args:
+        offset: Number of matching uploads to skip
+        limit: Page size
+        sort: Sort key; `artifacts` is the disk space used by derived files
+        order: `asc` or `desc`
+        q: Substring of the filename
+        processed: Only uploads that were (or were not) processed
+        min_size, max_size: Upload size range in bytes
+        created_after, created_before: Upload time range (ISO 8601)
     
     Returns:
-        List of uploaded video files
+        Page of uploaded video files with the total number of matches and
+        the offset of the next page (None on the last page)
     """
-    files = []
-    for file_path in UPLOAD_DIR.glob("*"):
-        if file_path.is_file():
-            files.append({
-                "filename": file_path.name,
-                "size": file_path.stat().st_size,
-                "created": datetime.fromtimestamp(file_path.stat().st_ctime).isoformat()
-            })
+    page = await run_in_threadpool(
+        upload_catalog.list, offset, limit, sort, order == "desc", q, processed,
+        min_size, max_size, created_after, created_before
+    )
+    files = [
+        {
+            "filename": upload["video_id"],
+            "size": upload["size"],
+            "created": upload["created_at"],
+            "processed": upload["processed_at"],
+            "duration": upload["duration"],
+            "width": upload["width"],
+            "height": upload["height"],
+            "artifact_bytes": upload["artifact_bytes"]
+        }
+        for upload in page["uploads"]
+    ]
+    next_offset = offset + len(files)
     
-    return {"files": files}
+    return {
+        "files": files,
+        "total": page["total"],
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset if next_offset < page["total"] else None
+    }
 
 @router.delete("/{filename}")
 async def delete_upload(filename: str):
     """
-    Delete an uploaded video file.
+    Delete an uploaded video file with its metadata and everything derived
+    from it (frames, detections, analytics, renders, frame stores).
     
     Args:
         filename: Name of the file to delete
     
     Returns:
-        Deletion status
+        Deletion status and the removed paths
     """
     file_path = UPLOAD_DIR / filename
     
-    if not file_path.exists():
+    if filename != file_path.name or not file_path.exists():
         raise HTTPException(
             status_code=404,
             detail="File not found"
         )
     
     try:
-        file_path.unlink()
+        removed = await run_in_threadpool(upload_catalog.delete, filename)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -98,5 +351,22 @@ async def delete_upload(filename: str):
     
     return {
         "status": "success",
-        "message": f"File {filename} deleted"
+        "message": f"File {filename} deleted",
+        "removed": removed
     }
+
+@router.get("/{filename}/metadata")
+async def get_upload_metadata(filename: str):
+    """
+    Get the probed metadata of an uploaded video.
+    
+    Args:
+        filename: Name of the uploaded file
+    
+    Returns:
+        Duration, fps, frame count, codec, resolution and container format
+    """
+    metadata = await run_in_threadpool(metadata_store.get, filename)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return metadata
@@ -0,0 +1,152 @@
+"""
+Timing, peak memory and result storage shared by the benchmarks.
+
+Results are stored as JSON under `bench/results/` so a run can be compared
+against an earlier one to catch regressions.
+"""
+import json
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+class PeakRSS:
+    """
+    Samples the resident set size of this process and its children in a
+    background thread; use as a context manager and read `peak` (bytes).
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self) -> int:
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass  # Exited between listing and sampling
+        self.peak = max(self.peak, rss)
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.peak = 0
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def measure(fn, frames: int, repeat: int = 3) -> dict:
+    """
+    Time `fn()` and track peak RSS while it runs.
+
+    Args:
+        fn: Callable processing `frames` frames per call
+        frames: Number of frames one call processes
+        repeat: Number of timed calls; the fastest one is reported
+
+    Returns:
+        dict with frames, seconds (fastest call), fps and peak_rss_mb
+    """
+    times = []
+    with PeakRSS() as rss:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    seconds = min(times)
+    return {
+        "frames": frames,
+        "seconds": round(seconds, 6),
+        "fps": round(frames / seconds, 2) if seconds > 0 else None,
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+    }
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: dict, results_dir: Path = RESULTS_DIR) -> Path:
+    """
+    Store a run's results with the commit and machine they came from.
+
+    Returns:
+        Path of the written file
+    """
+    results_dir.mkdir(parents=True, exist_ok=True)
+    commit = _git_commit()
+    created = datetime.now()
+    path = results_dir / f"{created:%Y%m%d_%H%M%S}{'_' + commit if commit else ''}.json"
+    path.write_text(json.dumps({
+        "created_at": created.isoformat(),
+        "commit": commit,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": psutil.cpu_count(),
+        },
+        "results": results,
+    }, indent=2))
+    return path
+
+
+def latest_results(results_dir: Path = RESULTS_DIR, exclude: Path = None):
+    """
+    Path of the most recent stored run, or None.
+    """
+    runs = sorted(p for p in results_dir.glob("*.json") if p != exclude)
+    return runs[-1] if runs else None
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.1):
+    """
+    Compare a run against a baseline run.
+
+    Args:
+        results: {name: measurement} of this run
+        baseline: {name: measurement} of the run to compare against
+        tolerance: Allowed relative drop in fps / growth in peak RSS
+
+    Returns:
+        List of (name, metric, baseline value, value, regressed) for the
+        benchmarks present in both runs
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or current.get("skipped") or before.get("skipped"):
+            continue
+        if current["fps"] and before["fps"]:
+            rows.append((name, "fps", before["fps"], current["fps"],
+                         current["fps"] < before["fps"] * (1 - tolerance)))
+        rows.append((name, "peak_rss_mb", before["peak_rss_mb"], current["peak_rss_mb"],
+                     current["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance)))
+    return rows
@@ -0,0 +1,261 @@
+"""
+Benchmark the detection and team-classification pipeline.
+
+Times jersey color extraction, team clustering, detections serialization
+and (when the model weights are present) the end-to-end pipeline on a
+short clip, reporting frames/s and peak RSS. Each run is stored under
+`bench/results/` and compared with the previous one; the exit status is 1
+when a benchmark got slower or bigger than the tolerance allows.
+
+Usage (from backend/):
+    python -m bench.pipeline
+    python -m bench.pipeline --only cluster_players --only serialize_json
+    python -m bench.pipeline --clip some_game.mp4 --compare bench/results/base.json
+"""
+import argparse
+import importlib.util
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from bench.harness import compare, latest_results, measure, save_results
+from services.detections_store import ColumnarWriter, JsonlWriter, JsonWriter
+from services.player_classification import (
+    assign_teams_frame_batch, cluster_players, get_player_color, get_player_colors
+)
+
+FRAME_SIZE = (1280, 720)
+FIELD_COLOR = (60, 140, 50)
+TEAM_COLORS = [(40, 60, 200), (190, 90, 20)]  # BGR red and blue jerseys
+SHORTS_COLOR = (30, 30, 30)
+SKIN_COLOR = (120, 160, 200)
+
+
+def synthetic_frames(n_frames: int, players_per_team: int = 11, seed: int = 0):
+    """
+    Field-colored frames with two teams of box-shaped players.
+
+    Returns:
+        List of (frame, detections) with detection dicts shaped like the
+        pipeline's output; players drift a few pixels per frame
+    """
+    rng = np.random.default_rng(seed)
+    width, height = FRAME_SIZE
+    n_players = 2 * players_per_team
+    teams = np.repeat([0, 1], players_per_team)
+    sizes = rng.uniform(0.7, 1.3, n_players)[:, None] * [36, 90]
+    positions = rng.uniform([0, 0], [width - 50, height - 120], (n_players, 2))
+
+    frames = []
+    for _ in range(n_frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = FIELD_COLOR
+        frame += rng.integers(0, 12, frame.shape, dtype=np.uint8)
+        positions = np.clip(positions + rng.normal(0, 3, positions.shape), 0, [width - 50, height - 120])
+        detections = []
+        for track_id, ((x, y), (w, h), team) in enumerate(zip(positions, sizes, teams), start=1):
+            x1, y1, x2, y2 = int(x), int(y), int(x + w), int(y + h)
+            frame[y1:y1 + (y2 - y1) // 5, x1:x2] = SKIN_COLOR
+            frame[y1 + (y2 - y1) // 5:y1 + 3 * (y2 - y1) // 5, x1:x2] = TEAM_COLORS[team]
+            frame[y1 + 3 * (y2 - y1) // 5:y2, x1:x2] = SHORTS_COLOR
+            detections.append({
+                "track_id": track_id,
+                "x1": float(x1), "y1": float(y1), "x2": float(x2), "y2": float(y2),
+                "team": int(team),
+                "conf": float(rng.uniform(0.3, 0.95)),
+            })
+        frames.append((frame, detections))
+    return frames
+
+
+def _boxes(detections):
+    return np.array([[d["x1"], d["y1"], d["x2"], d["y2"]] for d in detections])
+
+
+def bench_get_player_color(frames):
+    def run():
+        for frame, detections in frames:
+            for box in _boxes(detections):
+                get_player_color(frame, box)
+    return run
+
+
+def bench_get_player_colors(frames):
+    def run():
+        for frame, detections in frames:
+            get_player_colors(frame, _boxes(detections))
+    return run
+
+
+def bench_cluster_players(frames):
+    colors = []
+    for frame, detections in frames:
+        frame_colors, valid = get_player_colors(frame, _boxes(detections))
+        colors.append(frame_colors[valid])
+
+    def run():
+        centers = None
+        for frame_colors in colors:
+            _, centers = cluster_players(frame_colors, centers)
+    return run
+
+
+def bench_assign_teams_frame_batch(frames):
+    def run():
+        for frame, detections in frames:
+            assign_teams_frame_batch(frame, detections)
+    return run
+
+
+def _bench_writer(frames, make_writer):
+    def run():
+        out_dir = Path(tempfile.mkdtemp(prefix="bench_"))
+        try:
+            writer = make_writer(out_dir)
+            for index, (_, detections) in enumerate(frames, start=1):
+                writer.add(index, detections)
+            writer.close()
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return run
+
+
+def bench_serialize_json(frames):
+    return _bench_writer(frames, lambda out_dir: JsonWriter(out_dir / "detections.json", fps=7))
+
+
+def bench_serialize_jsonl(frames):
+    return _bench_writer(frames, lambda out_dir: JsonlWriter(out_dir / "detections.jsonl", fps=7))
+
+
+def bench_serialize_columnar(frames):
+    return _bench_writer(frames, lambda out_dir: ColumnarWriter(out_dir / "detections", fps=7))
+
+
+MICRO_BENCHMARKS = {
+    "get_player_color": bench_get_player_color,
+    "get_player_colors": bench_get_player_colors,
+    "cluster_players": bench_cluster_players,
+    "assign_teams_frame_batch": bench_assign_teams_frame_batch,
+    "serialize_json": bench_serialize_json,
+    "serialize_jsonl": bench_serialize_jsonl,
+    "serialize_columnar": bench_serialize_columnar,
+}
+
+
+def make_clip(path: Path, seconds: float = 10):
+    """
+    Encode a short synthetic 720p H.264 clip with ffmpeg.
+    """
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={FRAME_SIZE[0]}x{FRAME_SIZE[1]}:rate=30",
+        "-t", str(seconds), "-c:v", "libx264", "-g", "30", "-pix_fmt", "yuv420p",
+        str(path)
+    ], check=True)
+
+
+def bench_process_pipeline(clip: Path = None, seconds: float = 10, **options):
+    """
+    Run `process_pipeline` once on `clip` (or a synthetic clip).
+
+    The clip is uploaded under a fresh `bench_` name, and the upload, its
+    outputs and their result cache entry are removed afterwards.
+
+    Returns:
+        Measurement dict, or a dict with `skipped` if the model can't run
+    """
+    from services.detection import WEIGHTS
+    if importlib.util.find_spec("ultralytics") is None:
+        return {"skipped": "ultralytics is not installed"}
+    if not Path(WEIGHTS).is_file():
+        return {"skipped": f"{WEIGHTS} not found"}
+
+    from services.detections_store import detections_path
+    from services.process_pipeline import process_pipeline
+    from services.result_cache import result_cache
+    from services.upload_catalog import upload_catalog
+    from services.video_metadata import estimate_frames, metadata_store
+
+    # Never collides with (and overwrites) a real upload
+    video_id = f"bench_{uuid.uuid4().hex[:8]}_{Path(clip).name if clip else 'synthetic.mp4'}"
+    video_path = Path("uploads") / video_id
+    video_path.parent.mkdir(parents=True, exist_ok=True)
+    if clip:
+        shutil.copyfile(clip, video_path)
+    else:
+        make_clip(video_path, seconds)
+    output_format = options.get("output_format", "columnar")
+    try:
+        metadata = metadata_store.probe(video_id)
+        result = measure(
+            lambda: process_pipeline(video_id, use_cache=False, **options),
+            frames=estimate_frames(metadata, fps=7), repeat=1
+        )
+    finally:
+        upload_catalog.delete(video_id)
+        result_cache.discard(detections_path(video_id, output_format).name)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=100, help="synthetic frames per micro benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", help="benchmark to run (repeatable)")
+    parser.add_argument("--clip", type=Path, help="video for the end-to-end run (default: synthetic)")
+    parser.add_argument("--seconds", type=float, default=10, help="length of the synthetic clip")
+    parser.add_argument("--options", type=json.loads, default={},
+                        help="pipeline options for the end-to-end run, as JSON")
+    parser.add_argument("--compare", type=Path, help="results file to compare with (default: latest)")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed relative fps drop / peak RSS growth")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    selected = set(args.only or [*MICRO_BENCHMARKS, "process_pipeline"])
+    unknown = selected - {*MICRO_BENCHMARKS, "process_pipeline"}
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {}
+    frames = synthetic_frames(args.frames) if selected & set(MICRO_BENCHMARKS) else None
+    for name, make in MICRO_BENCHMARKS.items():
+        if name in selected:
+            results[name] = measure(make(frames), frames=args.frames, repeat=args.repeat)
+    if "process_pipeline" in selected:
+        results["process_pipeline"] = bench_process_pipeline(args.clip, args.seconds, **args.options)
+
+    print(f"{'benchmark':<28}{'frames/s':>12}{'peak RSS MB':>14}")
+    for name, result in results.items():
+        if result.get("skipped"):
+            print(f"{name:<28}{'skipped: ' + result['skipped']:>26}")
+        else:
+            print(f"{name:<28}{result['fps']:>12.1f}{result['peak_rss_mb']:>14.1f}")
+
+    saved = None if args.no_save else save_results(results)
+    if saved:
+        print(f"Saved {saved}")
+
+    baseline_path = args.compare or latest_results(exclude=saved)
+    if baseline_path is None:
+        return 0
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    rows = compare(results, baseline, args.tolerance)
+    print(f"\nCompared with {baseline_path}")
+    print(f"{'benchmark':<28}{'metric':<14}{'before':>10}{'now':>10}{'change':>9}")
+    for name, metric, before, now, regressed in rows:
+        change = (now - before) / before if before else 0
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<28}{metric:<14}{before:>10.1f}{now:>10.1f}{change:>+9.1%}{flag}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
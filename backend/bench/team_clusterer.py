@@ -0,0 +1,123 @@
+"""
+Benchmark TeamClusterer and TeamColorModel against per-frame cluster_players.
+
+Runs all three on the same synthetic stream of jersey colors (two teams, a few
+officials, slow lighting drift and frames with only a handful of visible
+players) and reports throughput and label stability.
+
+Usage (from backend/):
+    python -m bench.team_clusterer --frames 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.player_classification import TeamClusterer, TeamColorModel, cluster_players
+
+TEAM_COLORS = np.array([[200.0, 60.0, 40.0], [40.0, 50.0, 190.0]])
+OFFICIAL_COLOR = np.array([120.0, 120.0, 120.0])
+
+
+def synthetic_stream(n_frames: int, players_per_team: int = 11,
+                     n_officials: int = 2, seed: int = 0):
+    """
+    Generate per-frame (track_ids, colors, true_teams) tuples.
+
+    True team is -1 for officials.
+    """
+    rng = np.random.default_rng(seed)
+    n_players = 2 * players_per_team
+    track_teams = np.concatenate([
+        np.repeat([0, 1], players_per_team),
+        np.full(n_officials, -1),
+    ])
+    base = np.where(
+        track_teams[:, None] >= 0,
+        TEAM_COLORS[np.maximum(track_teams, 0)],
+        OFFICIAL_COLOR,
+    ) + rng.normal(0, 8, (len(track_teams), 3))
+
+    frames = []
+    for f in range(n_frames):
+        # Slow lighting drift across the game
+        light = 1.0 + 0.25 * np.sin(2 * np.pi * f / max(n_frames, 1))
+        # Mostly full frames, with occasional sparse ones
+        if rng.random() < 0.1:
+            visible = rng.choice(len(track_teams), size=rng.integers(2, 5), replace=False)
+        else:
+            keep = rng.random(n_players) < 0.85
+            visible = np.concatenate([np.where(keep)[0], np.arange(n_players, len(track_teams))])
+        colors = np.clip(base[visible] * light + rng.normal(0, 12, (len(visible), 3)), 0, 255)
+        frames.append((visible, colors, track_teams[visible]))
+    return frames
+
+
+def _run(frames, assign):
+    labels_per_frame = []
+    start = time.perf_counter()
+    for _, colors, _ in frames:
+        labels_per_frame.append(np.asarray(assign(colors), dtype=int))
+    elapsed = time.perf_counter() - start
+    return labels_per_frame, elapsed
+
+
+def label_stability(frames, labels_per_frame):
+    """
+    Returns (flip_rate, accuracy) over team players only.
+
+    flip_rate is the share of consecutive sightings of a track whose label
+    changed; accuracy uses the best global team permutation.
+    """
+    last = {}
+    flips = sightings = 0
+    correct = total = 0
+    for (track_ids, _, truth), labels in zip(frames, labels_per_frame):
+        players = truth >= 0
+        correct += np.sum(labels[players] == truth[players])
+        total += np.sum(players)
+        for tid, label in zip(track_ids[players], labels[players]):
+            if tid in last:
+                sightings += 1
+                flips += last[tid] != label
+            last[tid] = label
+    accuracy = correct / max(total, 1)
+    return flips / max(sightings, 1), max(accuracy, 1 - accuracy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frames = synthetic_stream(args.frames, seed=args.seed)
+
+    prev = {"centers": None}
+
+    def baseline(colors):
+        labels, prev["centers"] = cluster_players(colors, prev["centers"])
+        return labels
+
+    clusterer = TeamClusterer()
+
+    def streaming(colors):
+        return clusterer.assign(colors)[0]
+
+    # Fitted once from a sample of frames, like the pipeline's sampling pass
+    model = TeamColorModel().fit(np.concatenate([colors for _, colors, _ in frames[::20]]))
+
+    def fitted(colors):
+        return model.assign(colors)[0]
+
+    print(f"{'method':<16}{'frames/s':>12}{'flip rate':>12}{'accuracy':>12}")
+    for name, assign in (("cluster_players", baseline), ("TeamClusterer", streaming),
+                         ("TeamColorModel", fitted)):
+        labels, elapsed = _run(frames, assign)
+        flip_rate, accuracy = label_stability(frames, labels)
+        print(f"{name:<16}{len(frames) / elapsed:>12.1f}{flip_rate:>12.4f}{accuracy:>12.4f}")
+    print(f"TeamClusterer full refits: {clusterer.refits}")
+
+
+if __name__ == "__main__":
+    main()
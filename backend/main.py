@@ -1,11 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from api import analysis, upload
+from services.jobs import job_queue
+from services.metrics import CONTENT_TYPE, render_metrics
+from services.upload_catalog import upload_catalog
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Catalog videos copied into uploads/ while the server was down
+    await run_in_threadpool(upload_catalog.sync)
+    # Start the analysis worker pool and resume interrupted jobs
+    job_queue.start()
+    yield
+    job_queue.shutdown()
+
 
 app = FastAPI(
     title="NFL Footage Analysis API",
     description="API for analyzing NFL video footage",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware configuration
@@ -31,3 +49,10 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus scrape target: upload handler metrics of this process plus
+    # pipeline stage metrics reported by the job workers
+    body = await run_in_threadpool(render_metrics)
+    return Response(content=body, media_type=CONTENT_TYPE)
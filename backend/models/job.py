@@ -0,0 +1,42 @@
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from datetime import datetime
+
+class CropRegion(BaseModel):
+    """Region of the source video to keep, in pixels"""
+    x: int = Field(0, ge=0)
+    y: int = Field(0, ge=0)
+    width: int = Field(..., gt=0)
+    height: int = Field(..., gt=0)
+
+class PipelineOptions(BaseModel):
+    """Options forwarded to `process_pipeline`"""
+    stream: bool = True
+    workers: int = 1
+    segment_seconds: float = 60
+    output_format: Literal["columnar", "jsonl", "json"] = "columnar"
+    use_cache: bool = True
+    batch_size: int = Field(8, ge=1, le=64)
+    stride: int = Field(1, ge=1)
+    adaptive_stride: bool = False
+    max_stride: int = Field(8, ge=1)
+    render: bool = False
+    decode_size: Optional[int] = Field(None, ge=32)
+    decode_threads: int = Field(0, ge=0)
+    crop: Optional[CropRegion] = None
+    team_model: bool = False
+    team_samples: int = Field(48, ge=8, le=500)
+    skip_scenes: bool = False
+    frame_store: bool = False
+    profile: bool = False
+
+class Job(BaseModel):
+    """Model for a queued analysis job"""
+    job_id: str
+    video_id: str
+    status: str
+    options: dict
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
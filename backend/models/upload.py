@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from models.job import PipelineOptions
+
+class UploadSessionCreate(BaseModel):
+    """Request to start a resumable upload"""
+    filename: str
+    size: int = Field(..., gt=0)
+    content_type: str = "video/mp4"
+    # Queue the pipeline with these options as soon as the upload completes
+    process: bool = False
+    options: Optional[PipelineOptions] = None
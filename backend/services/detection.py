@@ -1,63 +1,432 @@
-from ultralytics import YOLO
 from pathlib import Path
-from services.player_classification import get_player_color, cluster_players
+from typing import Iterable
+from services.frame_extract import iter_frames
+from services.model_registry import get_model
+from services.player_classification import (
+    TeamClusterer, TeamColorModel, TrackColorCache, get_player_colors
+)
+from services.progress import ProgressReporter
+from services.scene_filter import CUT, OFF_PLAY, PLAY, STATIC, SceneFilter
+import numpy as np
 import cv2
-import json
+import yaml
 
-def run_yolo(frames_dir: Path, output_json: Path):
-    model = YOLO("yolos/best.pt")
+WEIGHTS = "yolos/best.pt"
+TRACKER_CONFIG = "yolos/bytetrack.yaml"
 
-    results = model.track(
+DETECT_ARGS = dict(
+    conf=0.3,
+    iou=0.5,
+    classes=[0],  # Only detect people
+    imgsz=640,
+)
+
+# Target player motion between keyframes with adaptive striding, in box
+# heights
+STRIDE_MAX_MOTION = 0.5
+
+
+def new_tracker(config: str = TRACKER_CONFIG):
+    """
+    Create a fresh ByteTrack tracker from `config`.
+
+    Each run gets its own tracker instead of the one `model.track` keeps on
+    the (cached, shared) model, so no state leaks between videos.
+    """
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace
+
+    with open(config) as f:
+        args = IterableSimpleNamespace(**yaml.safe_load(f))
+    # Same frame rate `model.track` uses, so track_buffer keeps its meaning
+    return BYTETracker(args=args, frame_rate=30)
+
+
+def apply_tracker(tracker, r):
+    """
+    Update `tracker` with the detections of result `r` and return the result
+    restricted to tracked boxes, with track IDs (as `model.track` does).
+    """
+    import torch
+
+    tracks = tracker.update(r.boxes.cpu().numpy(), r.orig_img)
+    if len(tracks) == 0:
+        # No confirmed tracks: boxes stay without IDs and are skipped
+        return r
+    r = r[tracks[:, -1].astype(int)]
+    r.update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return r
+
+
+def _frame_detections(frame, frame_index, r, clusterer, color_cache,
+                      progress: ProgressReporter):
+    """
+    Assign teams to the tracked boxes of a single frame.
+
+    Jersey colors come from `color_cache`, so only new tracks and tracks due
+    for a refresh are sampled from the frame, and teams come from the
+    streaming `clusterer` which keeps its centers across frames. Color
+    extraction is timed as "classify" and team assignment as "cluster".
+
+    Returns:
+        List of detection dicts
+    """
+    with progress.timed("classify", frames=1):
+        if r.boxes is None or len(r.boxes) == 0 or r.boxes.id is None:
+            return []
+
+        boxes = r.boxes.xyxy.cpu().numpy()
+        track_ids = r.boxes.id.cpu().numpy()
+        confs = r.boxes.conf.cpu().numpy()
+
+        # PASS 1 — gather colors, sampling only new or stale tracks
+        colors, valid = color_cache.colors_for(frame, frame_index, boxes, track_ids)
+
+    with progress.timed("cluster", frames=1):
+        # PASS 2 — cluster with frame-to-frame consistency
+        teams, _ = clusterer.assign(colors[valid])
+
+    # PASS 3 — build JSON records
+    detections = []
+    for box, track_id, conf, team in zip(boxes[valid], track_ids[valid], confs[valid], teams):
+        detections.append({
+            "track_id": int(track_id),
+            "x1": float(box[0]),
+            "y1": float(box[1]),
+            "x2": float(box[2]),
+            "y2": float(box[3]),
+            "team": int(team),
+            "conf": float(conf)
+        })
+
+    return detections
+
+
+def _to_source(detections, scale, offset):
+    """
+    Map boxes from decoded (cropped / scaled) frame pixels back to the
+    source video's pixels, in place.
+    """
+    (sx, sy), (ox, oy) = scale, offset
+    for d in detections:
+        d["x1"] = d["x1"] / sx + ox
+        d["y1"] = d["y1"] / sy + oy
+        d["x2"] = d["x2"] / sx + ox
+        d["y2"] = d["y2"] / sy + oy
+    return detections
+
+
+def run_yolo(frames_dir: Path, writer, progress: ProgressReporter = None,
+             batch_size: int = 1, clusterer=None):
+    """
+    Track players on extracted JPEG frames and write their detections.
+
+    Args:
+        frames_dir: Directory of frames written by `extract_frames`
+        writer: Detections writer from `services.detections_store.open_writer`
+        progress: Optional reporter for per-stage timings and frame counts
+        batch_size: Number of frames per model call
+        clusterer: Team clusterer or fitted `TeamColorModel` (default: a
+            new streaming `TeamClusterer`)
+    """
+    progress = progress or ProgressReporter()
+    # Reads the JPEGs itself, so it can't go through an inference server
+    model = get_model(WEIGHTS, imgsz=DETECT_ARGS["imgsz"], local=True)
+    tracker = new_tracker()
+
+    results = model.predict(
         source=str(frames_dir),
-        tracker="yolos/bytetrack.yaml",
-        conf=0.3,
-        iou=0.5,
-        persist=True,
-        classes=[0],  # Only detect people
-        imgsz=640,
-        save=True   
+        stream=True,
+        batch=batch_size,
+        verbose=False,
+        **DETECT_ARGS
     )
 
-    output = {}
-    prev_team_centers = None  # Track team colors across frames
+    if clusterer is None:
+        clusterer = TeamClusterer()  # Track team colors across frames
+    color_cache = TrackColorCache()
 
-    for r in results:
-        frame_name = Path(r.path).name
-        frame_path = frames_dir / frame_name
+    for index, r in enumerate(progress.iterate(results, "detect"), start=1):
+        frame_path = frames_dir / Path(r.path).name
+        with progress.timed("track", frames=1):
+            r = apply_tracker(tracker, r)
 
-        frame = cv2.imread(str(frame_path)) 
+        with progress.timed("classify"):
+            frame = cv2.imread(str(frame_path))
 
-        output[frame_name] = []
+        detections = _frame_detections(
+            frame, index, r, clusterer, color_cache, progress
+        )
 
-        if r.boxes is None or len(r.boxes) == 0 or r.boxes.id is None:
+        with progress.timed("serialize", frames=1):
+            writer.add(index, detections)
+        progress.advance()
+
+
+def fit_team_model(video_path: Path, duration: float, samples: int = 48,
+                   batch_size: int = 8, frames: Iterable[np.ndarray] = None,
+                   **decode_options):
+    """
+    Fit a `TeamColorModel` from players on frames sampled across the video.
+
+    `samples` frames are decoded evenly over the whole video and run
+    through the detector (no tracking); the jersey colors of every detected
+    player form the training set.
+
+    Args:
+        video_path: Path to the video file
+        duration: Video duration in seconds
+        samples: Number of frames to sample
+        batch_size: Number of frames per model call
+        frames: Already decoded sample frames (e.g. from a
+            `services.frame_store.FrameStore`) to use instead of decoding
+        **decode_options: Crop, scale and thread options for `iter_frames`,
+            so colors are sampled like the tracking pass sees them
+
+    Returns:
+        Fitted model, or None if too few players were found
+    """
+    model = get_model(WEIGHTS, imgsz=DETECT_ARGS["imgsz"])
+    sample_fps = samples / max(duration, 1e-3)
+    colors = []
+    batch = []
+
+    def sample_batch(frames):
+        results = model.predict(source=frames, verbose=False, **DETECT_ARGS)
+        for frame, r in zip(frames, results):
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            frame_colors, valid = get_player_colors(frame, r.boxes.xyxy.cpu().numpy())
+            colors.append(frame_colors[valid])
+
+    if frames is None:
+        frames = iter_frames(video_path, fps=sample_fps, **decode_options)
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            sample_batch(batch)
+            batch = []
+    if batch:
+        sample_batch(batch)
+
+    try:
+        return TeamColorModel().fit(np.concatenate(colors) if colors else [])
+    except ValueError as e:
+        print(f"Could not fit team colors for {video_path}: {e}")
+        return None
+
+
+def _interpolate(previous, current, indices):
+    """
+    Linearly interpolate boxes of tracks seen on two keyframes.
+
+    Args:
+        previous, current: (frame_index, detections) of two keyframes
+        indices: Skipped frame indices between them
+
+    Returns:
+        List of (frame_index, detections), one per skipped frame
+    """
+    (i0, before), (i1, after) = previous, current
+    after_by_id = {d["track_id"]: d for d in after}
+    pairs = [(a, after_by_id[a["track_id"]]) for a in before if a["track_id"] in after_by_id]
+
+    frames = []
+    for index in indices:
+        t = (index - i0) / (i1 - i0)
+        detections = []
+        for a, b in pairs:
+            d = dict(a if t < 0.5 else b)
+            for key in ("x1", "y1", "x2", "y2", "conf"):
+                if key in a and key in b:
+                    d[key] = a[key] + (b[key] - a[key]) * t
+            detections.append(d)
+        frames.append((index, detections))
+    return frames
+
+
+def _adapt_stride(previous, current, min_stride: int, max_stride: int,
+                  max_motion: float = STRIDE_MAX_MOTION) -> int:
+    """
+    Pick the next keyframe stride from player motion between two keyframes.
+
+    The stride is chosen so the faster players (90th percentile) move about
+    `max_motion` box heights from one keyframe to the next, which keeps
+    linear interpolation close to the real boxes.
+    """
+    (i0, before), (i1, after) = previous, current
+    before_by_id = {d["track_id"]: d for d in before}
+    motion = []
+    for b in after:
+        a = before_by_id.get(b["track_id"])
+        if a is None:
             continue
+        dx = (b["x1"] + b["x2"] - a["x1"] - a["x2"]) / 2
+        dy = (b["y1"] + b["y2"] - a["y1"] - a["y2"]) / 2
+        motion.append(np.hypot(dx, dy) / max(b["y2"] - b["y1"], 1.0))
 
-        colors = []
-        valid = []
+    if not motion:
+        # Nobody on screen: skip ahead; new or lost players: look closely
+        return max_stride if not after else min_stride
+    per_frame = np.percentile(motion, 90) / (i1 - i0)
+    if per_frame <= 0:
+        return max_stride
+    return int(np.clip(max_motion // per_frame, min_stride, max_stride))
 
-        # PASS 1 — gather colors
-        for box, track_id in zip(r.boxes.xyxy, r.boxes.id):
-            color = get_player_color(frame, box)
 
-            if color is not None:
-                colors.append(color)
-                valid.append((box, track_id))
+def track_frames(frames: Iterable[np.ndarray], start_index: int = 1,
+                 clusterer: TeamClusterer = None, progress: ProgressReporter = None,
+                 batch_size: int = 1, stride: int = 1, adaptive_stride: bool = False,
+                 max_stride: int = 8, geometry=None, scene_filter: SceneFilter = None,
+                 static_stride: int = 7):
+    """
+    Track players on in-memory frames and assign teams.
 
-        # PASS 2 — cluster with frame-to-frame consistency
-        teams, team_centers = cluster_players(colors, prev_team_centers)
-        prev_team_centers = team_centers  # Save for next frame
-
-        # PASS 3 — write JSON
-        for (box, track_id), team in zip(valid, teams):
-            output[frame_name].append({
-                "track_id": int(track_id),
-                "x1": float(box[0]),
-                "y1": float(box[1]),
-                "x2": float(box[2]),
-                "y2": float(box[3]),
-                "team": int(team)
-            })
-
-    # Save JSON
-    with open(output_json, "w") as f:
-        json.dump(output, f, indent=2)
+    Each decoded frame goes straight to the tracker and is reused for color
+    extraction, so nothing is re-read from disk. Only every `stride`-th
+    frame (a keyframe) goes through the model, in batches of `batch_size`;
+    boxes on the frames in between are interpolated from the surrounding
+    keyframes. The last frame is always a keyframe.
+
+    With a `scene_filter`, frames are classified before detection: off-play
+    frames (crowd, close-ups, ads) are not detected and get no boxes,
+    static frames are only detected every `static_stride` frames, and at a
+    hard cut the tracker, color cache and team clusterer start over (track
+    IDs keep counting up, so a new shot never reuses an ID).
+
+    Args:
+        frames: Iterable of BGR frames in video order (e.g. `iter_frames`)
+        start_index: 1-based index of the first frame in the whole video
+        clusterer: Team clusterer to use; pass one in to inspect its centers,
+            or a fitted `TeamColorModel` for fixed per-video team colors
+        progress: Optional reporter for per-stage timings and frame counts
+        batch_size: Number of keyframes per model call
+        stride: Detect every `stride`-th frame (minimum stride when
+            adaptive)
+        adaptive_stride: Adjust the stride between `stride` and
+            `max_stride` from how fast players move
+        max_stride: Largest stride used when adaptive
+        geometry: ((sx, sy), (ox, oy)) scale and offset of the frames
+            relative to the source video (see
+            `services.frame_extract.frame_geometry`); boxes are mapped back
+            to source pixels. None: frames are the full source frames
+        scene_filter: Optional `services.scene_filter.SceneFilter`
+        static_stride: Keyframe stride inside static stretches
+
+    Yields:
+        tuple: (frame_index, list of detection dicts)
+    """
+    model = get_model(WEIGHTS, imgsz=DETECT_ARGS["imgsz"])
+    tracker = new_tracker()
+
+    progress = progress or ProgressReporter()
+    if clusterer is None:
+        clusterer = TeamClusterer()  # Track team colors across frames
+    color_cache = TrackColorCache()
+
+    min_stride = max(1, stride)
+    max_stride = max(min_stride, max_stride)
+    current_stride = min_stride
+    previous = None  # Last processed keyframe: (index, detections)
+    id_offset = 0  # Added to the IDs of a tracker started after a cut
+    max_id = 0
+
+    def run_batch(batch):
+        nonlocal current_stride, previous, max_id
+        with progress.timed("detect", frames=len(batch)):
+            results = model.predict(
+                source=[frame for _, frame, _ in batch], verbose=False, **DETECT_ARGS
+            )
+
+        for (index, frame, skipped), r in zip(batch, results):
+            with progress.timed("track", frames=1):
+                r = apply_tracker(tracker, r)
+
+            detections = _frame_detections(frame, index, r, clusterer, color_cache, progress)
+            if geometry is not None:
+                _to_source(detections, *geometry)
+            for d in detections:
+                d["track_id"] += id_offset
+                max_id = max(max_id, d["track_id"])
+
+            if skipped:
+                for skipped_index, interpolated in _interpolate(previous, (index, detections), skipped):
+                    progress.advance()
+                    yield skipped_index, interpolated
+            progress.advance()
+            yield index, detections
+
+            if adaptive_stride and previous is not None:
+                current_stride = _adapt_stride(previous, (index, detections), min_stride, max_stride)
+            previous = (index, detections)
+
+    batch = []  # Keyframes waiting for inference: (index, frame, skipped indices)
+    skipped = []
+    last_keyframe = None
+    held = None  # Most recent skipped frame, promoted if the shot ends
+
+    def finish_shot():
+        # Run everything pending, as at the end of the video
+        nonlocal batch, skipped, held, last_keyframe
+        if held is not None:
+            batch.append((skipped[-1], held, skipped[:-1]))
+        pending = batch
+        batch, skipped, held, last_keyframe = [], [], None, None
+        if pending:
+            yield from run_batch(pending)
+
+    for index, frame in enumerate(progress.iterate(frames, "extract"), start=start_index):
+        kind = PLAY
+        if scene_filter is not None:
+            with progress.timed("filter", frames=1):
+                kind = scene_filter.classify(frame, index)
+
+        if kind == CUT and index > start_index:
+            yield from finish_shot()
+            tracker = new_tracker()
+            clusterer.reset()
+            color_cache = TrackColorCache()
+            previous, current_stride, id_offset = None, min_stride, max_id
+        if kind == CUT and scene_filter.shots[-1]["off_play"]:
+            kind = OFF_PLAY  # Cut to a crowd shot, close-up, ad, ...
+        if kind == OFF_PLAY:
+            yield from finish_shot()
+            # Don't adapt the stride across the skipped frames
+            previous = None
+            progress.advance()
+            yield index, []
+            continue
+
+        keyframe_stride = max(current_stride, static_stride) if kind == STATIC else current_stride
+        if last_keyframe is None or index - last_keyframe >= keyframe_stride:
+            batch.append((index, frame, skipped))
+            skipped, held, last_keyframe = [], None, index
+        else:
+            skipped.append(index)
+            held = frame
+
+        if len(batch) >= batch_size:
+            yield from run_batch(batch)
+            batch = []
+
+    yield from finish_shot()
+
+
+def run_yolo_stream(frames: Iterable[np.ndarray], writer,
+                    progress: ProgressReporter = None, **options):
+    """
+    Track players on in-memory frames and write their detections.
+
+    Detections are handed to `writer` frame by frame, so nothing
+    accumulates in memory beyond what the writer buffers.
+
+    Args:
+        frames: Iterable of BGR frames in video order (e.g. `iter_frames`)
+        writer: Detections writer from `services.detections_store.open_writer`
+        progress: Optional reporter for per-stage timings and frame counts
+        **options: Batching, striding and geometry options for `track_frames`
+    """
+    progress = progress or ProgressReporter()
+    for index, detections in track_frames(frames, progress=progress, **options):
+        with progress.timed("serialize", frames=1):
+            writer.add(index, detections)
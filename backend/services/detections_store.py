@@ -0,0 +1,691 @@
+import json
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.frame_extract import frame_name
+
+# One row per detection. Frames without detections have no rows; the
+# manifest's `frame_count` gives the extent of the video.
+COLUMNS = {
+    "frame": np.int32,
+    "track_id": np.int32,
+    "x1": np.float32,
+    "y1": np.float32,
+    "x2": np.float32,
+    "y2": np.float32,
+    "team": np.int8,
+    "conf": np.float32,
+}
+
+FORMATS = ("columnar", "json", "jsonl")
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+INDEX = "index.npz"
+CHUNK_PATTERN = "chunk_%05d.npz"
+
+# Frames between checkpoints (30 s of video at the 7 fps sampling rate): a
+# crashed job loses at most this much work
+CHECKPOINT_FRAMES = 210
+
+
+class IncompleteDetectionsError(Exception):
+    """Raised when reading detections a job is still writing"""
+
+
+def detections_path(video_id: str, fmt: str = "columnar", root: Path = Path("detections")) -> Path:
+    """
+    Where the detections of `video_id` are stored in format `fmt`.
+
+    Columnar output is a directory of chunks, JSON and JSON Lines output a
+    single file.
+    """
+    if fmt in ("json", "jsonl"):
+        return root / f"{video_id}.{fmt}"
+    return root / video_id
+
+
+def _fsync_dir(path: Path):
+    # Make a rename in `path` durable (not supported on Windows)
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: Path, write):
+    """
+    Write `path` through a temporary file so readers never see it half
+    written, and fsync it so it survives a crash once this returns.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+def _write_json(path: Path, data: Dict[str, Any]):
+    _write_atomic(path, lambda f: f.write(json.dumps(data, indent=2).encode()))
+
+
+class ColumnarWriter:
+    """
+    Writes detections as column chunks (`.npz`) plus a JSON manifest.
+
+    Rows are buffered per column and written out every `chunk_rows` rows
+    (and, when resumable, every `checkpoint_frames` frames), always on a
+    frame boundary, so memory stays
+    bounded no matter how long the video is. The manifest records each
+    chunk's frame and track ID range and is rewritten (and fsynced) after
+    every chunk, so a reader can pick the chunks it needs and already sees a
+    consistent prefix while the job is still running. On `close()` the
+    frame and track ID indexes used by `query_detections` are built.
+
+    With a `resume_key`, the chunks of an unfinished run written with the
+    same key are kept and `resume_frame` is the first frame still missing;
+    otherwise the output of a previous run is dropped.
+    """
+
+    def __init__(self, out_dir: Path, chunk_rows: int = 50_000, fps: Optional[float] = None,
+                 checkpoint_frames: int = CHECKPOINT_FRAMES, resume_key: Optional[str] = None):
+        self.out_dir = Path(out_dir)
+        self.chunk_rows = chunk_rows
+        self.checkpoint_frames = checkpoint_frames
+        self.fps = fps
+        self.key = resume_key
+        self.chunks = []
+        self.rows = 0
+        self.frame_count = 0
+        self.resume_state = None
+        self.state_fn = None  # Called at each checkpoint for `resume_state`
+        self.track_offset = 0
+        self._buffer = {name: [] for name in COLUMNS}
+        self._buffered = 0
+        self._checkpoint_frame = 0
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if resume_key is not None and self._resume(resume_key):
+            return
+        # Drop the output of a previous run
+        for old in self.out_dir.glob("chunk_*.npz"):
+            old.unlink()
+        (self.out_dir / MANIFEST).unlink(missing_ok=True)
+        (self.out_dir / INDEX).unlink(missing_ok=True)
+
+    def _resume(self, key: str) -> bool:
+        try:
+            manifest = read_manifest(self.out_dir)
+        except (OSError, ValueError):
+            return False
+        checkpoint = manifest.get("checkpoint") or {}
+        if manifest.get("complete") or checkpoint.get("key") != key:
+            return False
+
+        kept = {chunk["file"] for chunk in manifest["chunks"]}
+        for old in self.out_dir.glob("chunk_*.npz"):
+            if old.name not in kept:
+                old.unlink()  # Written after the last checkpoint
+        self.chunks = manifest["chunks"]
+        self.rows = manifest["rows"]
+        self.frame_count = self._checkpoint_frame = manifest["frame_count"]
+        self.resume_state = checkpoint.get("state")
+        # A resumed tracker numbers its tracks from 1 again
+        self.track_offset = max((chunk["track_max"] for chunk in self.chunks), default=0)
+        return True
+
+    @property
+    def resume_frame(self) -> int:
+        """
+        First frame not covered by the output so far.
+        """
+        return self._checkpoint_frame + 1
+
+    def add(self, frame_index: int, detections: List[Dict[str, Any]]):
+        """
+        Append the detections of one frame. Frames must arrive in order.
+        """
+        self.frame_count = max(self.frame_count, frame_index)
+        for d in detections:
+            self._buffer["frame"].append(frame_index)
+            self._buffer["track_id"].append(d["track_id"] + self.track_offset)
+            for name in ("x1", "y1", "x2", "y2", "team"):
+                self._buffer[name].append(d[name])
+            self._buffer["conf"].append(d.get("conf", np.nan))
+        self._buffered += len(detections)
+
+        resumable = self.key is not None
+        if (self._buffered >= self.chunk_rows or resumable
+                and self.frame_count - self._checkpoint_frame >= self.checkpoint_frames):
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if self._buffered:
+            columns = {
+                name: np.asarray(values, dtype=dtype)
+                for (name, dtype), values in zip(COLUMNS.items(), self._buffer.values())
+            }
+            file = CHUNK_PATTERN % len(self.chunks)
+            _write_atomic(self.out_dir / file, lambda f: np.savez(f, **columns))
+
+            self.chunks.append({
+                "file": file,
+                "rows": self._buffered,
+                "frame_min": int(columns["frame"][0]),
+                "frame_max": int(columns["frame"][-1]),
+                "track_min": int(columns["track_id"].min()),
+                "track_max": int(columns["track_id"].max()),
+            })
+            self.rows += self._buffered
+            self._buffer = {name: [] for name in COLUMNS}
+            self._buffered = 0
+        if self.frame_count > self._checkpoint_frame:
+            # Frames without detections still move the checkpoint
+            self._checkpoint_frame = self.frame_count
+            self._write_manifest(complete=False)
+
+    def _write_manifest(self, complete: bool):
+        manifest = {
+            "version": FORMAT_VERSION,
+            "complete": complete,
+            "fps": self.fps,
+            "frame_count": self.frame_count,
+            "rows": self.rows,
+            "columns": {name: np.dtype(dtype).name for name, dtype in COLUMNS.items()},
+            "chunks": self.chunks,
+        }
+        if not complete and self.key is not None:
+            manifest["checkpoint"] = {
+                "key": self.key,
+                "state": self.state_fn() if self.state_fn else None,
+            }
+        _write_json(self.out_dir / MANIFEST, manifest)
+
+    def close(self):
+        """
+        Write the remaining rows, build the indexes and mark the output
+        complete.
+        """
+        self._flush_chunk()
+        build_index(self.out_dir, self.chunks, self.frame_count)
+        self._write_manifest(complete=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+class JsonWriter:
+    """
+    Writes the original `{frame_name: [detection, ...]}` JSON file.
+
+    Frames are streamed into a temporary file as they arrive, so memory
+    stays bounded, and the file replaces the previous output on `close()`.
+    A half-written object can't be resumed; use `JsonlWriter` or
+    `ColumnarWriter` for that.
+    """
+
+    resume_frame = 1
+    resume_state = None
+
+    def __init__(self, path: Path, fps: Optional[float] = None):
+        self.path = Path(path)
+        self.fps = fps
+        self.state_fn = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Replace rather than truncate on close: the old file may be
+        # hard-linked into the result cache
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._file = open(self._tmp, "w")
+        self._file.write("{")
+        self._empty = True
+
+    def add(self, frame_index: int, detections: List[Dict[str, Any]]):
+        separator = "\n" if self._empty else ",\n"
+        self._file.write(f"{separator}  {json.dumps(frame_name(frame_index))}: {json.dumps(detections)}")
+        self._empty = False
+
+    def close(self):
+        self._file.write("\n}\n" if not self._empty else "}\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+        _fsync_dir(self.path.parent)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+class JsonlWriter:
+    """
+    Writes detections as JSON Lines, one `{"frame": i, "detections": [...]}`
+    line per frame (including frames without detections).
+
+    Lines are appended to `{path}.partial` as frames arrive. Every
+    `checkpoint_frames` frames the file is fsynced and a checkpoint
+    (`{path}.checkpoint`) records the last complete frame and the file size
+    at that point. `close()` renames the file to `path` and drops the
+    checkpoint.
+
+    With a `resume_key`, an unfinished run checkpointed with the same key
+    is truncated back to its checkpoint and appended to; `resume_frame` is
+    the first frame still missing.
+    """
+
+    def __init__(self, path: Path, fps: Optional[float] = None,
+                 checkpoint_frames: int = CHECKPOINT_FRAMES, resume_key: Optional[str] = None):
+        self.path = Path(path)
+        self.fps = fps
+        self.checkpoint_frames = checkpoint_frames
+        self.key = resume_key
+        self.partial = self.path.with_name(self.path.name + ".partial")
+        self.checkpoint_path = self.path.with_name(self.path.name + ".checkpoint")
+        self.frame_count = 0
+        self.track_max = 0
+        self.track_offset = 0
+        self.resume_state = None
+        self.state_fn = None
+        self._checkpoint_frame = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        offset = self._resume(resume_key) if resume_key is not None else None
+        if offset is None:
+            self.checkpoint_path.unlink(missing_ok=True)
+            self._file = open(self.partial, "wb")
+        else:
+            self._file = open(self.partial, "r+b")
+            # Drop lines written after the checkpoint (possibly a torn one)
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+    def _resume(self, key: str) -> Optional[int]:
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            size = self.partial.stat().st_size
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get("key") != key or size < checkpoint["offset"]:
+            return None
+        self.frame_count = self._checkpoint_frame = checkpoint["frame"]
+        self.track_max = self.track_offset = checkpoint["track_max"]
+        self.resume_state = checkpoint.get("state")
+        return checkpoint["offset"]
+
+    @property
+    def resume_frame(self) -> int:
+        """
+        First frame not covered by the output so far.
+        """
+        return self._checkpoint_frame + 1
+
+    def add(self, frame_index: int, detections: List[Dict[str, Any]]):
+        """
+        Append the detections of one frame. Frames must arrive in order.
+        """
+        if self.track_offset:
+            detections = [dict(d, track_id=d["track_id"] + self.track_offset) for d in detections]
+        for d in detections:
+            self.track_max = max(self.track_max, d["track_id"])
+        line = json.dumps({"frame": frame_index, "detections": detections})
+        self._file.write(line.encode() + b"\n")
+        self.frame_count = max(self.frame_count, frame_index)
+        if self.frame_count - self._checkpoint_frame >= self.checkpoint_frames:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Make everything written so far durable and record it as resumable.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._checkpoint_frame = self.frame_count
+        if self.key is not None:
+            _write_json(self.checkpoint_path, {
+                "key": self.key,
+                "frame": self.frame_count,
+                "offset": self._file.tell(),
+                "track_max": self.track_max,
+                "state": self.state_fn() if self.state_fn else None,
+            })
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.partial, self.path)
+        _fsync_dir(self.path.parent)
+        self.checkpoint_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def open_writer(path: Path, fmt: str = "columnar", fps: Optional[float] = None,
+                resume_key: Optional[str] = None):
+    """
+    Create a detections writer for output format `fmt`.
+
+    Args:
+        path: Output path (see `detections_path`)
+        fmt: "columnar", "json" or "jsonl"
+        fps: Sampling rate the frames were decoded at, stored with the output
+        resume_key: Continue an unfinished run checkpointed under the same
+            key (e.g. the pipeline's cache key) instead of starting over.
+            Ignored for "json", which can't be resumed.
+
+    Returns:
+        Writer with `add(frame_index, detections)`, `close()`,
+        `resume_frame` (first frame still to write), `resume_state` (the
+        value `state_fn()` returned at the last checkpoint) and a settable
+        `state_fn`
+    """
+    if fmt == "columnar":
+        return ColumnarWriter(path, fps=fps, resume_key=resume_key)
+    if fmt == "json":
+        return JsonWriter(path, fps=fps)
+    if fmt == "jsonl":
+        return JsonlWriter(path, fps=fps, resume_key=resume_key)
+    raise ValueError(f"Unknown detections format: {fmt}")
+
+
+def build_index(out_dir: Path, chunks: List[Dict[str, Any]], frame_count: int):
+    """
+    Build the frame and track ID indexes of a columnar detections directory.
+
+    Rows are numbered globally in write (frame) order. The index holds:
+
+    - `frame_offsets`: first row of each frame, so the rows of frames
+      `a..b` are `frame_offsets[a - 1]:frame_offsets[b]`
+    - `track_ids`, `track_starts`, `track_rows`: rows of `track_ids[i]` are
+      `track_rows[track_starts[i]:track_starts[i + 1]]`, in frame order
+
+    Only the `frame` and `track_id` columns are read.
+    """
+    out_dir = Path(out_dir)
+    frames, tracks = [], []
+    for chunk in chunks:
+        with np.load(out_dir / chunk["file"]) as data:
+            frames.append(data["frame"])
+            tracks.append(data["track_id"])
+    frame = np.concatenate(frames) if frames else np.empty(0, dtype=COLUMNS["frame"])
+    track = np.concatenate(tracks) if tracks else np.empty(0, dtype=COLUMNS["track_id"])
+
+    frame_offsets = np.searchsorted(frame, np.arange(1, frame_count + 2), side="left")
+    track_rows = np.argsort(track, kind="stable")
+    track_ids, track_starts = np.unique(track[track_rows], return_index=True)
+    track_starts = np.append(track_starts, len(track_rows))
+
+    index = {
+        "frame_offsets": frame_offsets.astype(np.int64),
+        "track_ids": track_ids.astype(COLUMNS["track_id"]),
+        "track_starts": track_starts.astype(np.int64),
+        "track_rows": track_rows.astype(np.int64),
+    }
+    _write_atomic(out_dir / INDEX, lambda f: np.savez(f, **index))
+
+
+def read_manifest(out_dir: Path) -> Dict[str, Any]:
+    """
+    Load the manifest of a columnar detections directory.
+    """
+    with open(Path(out_dir) / MANIFEST) as f:
+        return json.load(f)
+
+
+def read_detections(out_dir: Path, frames: Optional[Tuple[int, int]] = None,
+                    track_ids: Optional[Iterable[int]] = None,
+                    columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Read columnar detections, loading only the chunks that can match.
+
+    Args:
+        out_dir: Columnar detections directory
+        frames: Optional inclusive (first, last) frame range
+        track_ids: Optional track IDs to keep
+        columns: Columns to return (default: all)
+
+    Returns:
+        Dict of column name to array, rows ordered by frame
+    """
+    out_dir = Path(out_dir)
+    manifest = read_manifest(out_dir)
+    columns = list(columns or COLUMNS)
+    wanted = sorted(set(int(t) for t in track_ids)) if track_ids is not None else None
+
+    parts = {name: [] for name in columns}
+    for chunk in manifest["chunks"]:
+        if frames is not None and (chunk["frame_max"] < frames[0] or chunk["frame_min"] > frames[1]):
+            continue
+        if wanted is not None and not any(chunk["track_min"] <= t <= chunk["track_max"] for t in wanted):
+            continue
+
+        with np.load(out_dir / chunk["file"]) as data:
+            # Only the columns needed for filtering and output are read
+            mask = np.ones(chunk["rows"], dtype=bool)
+            if frames is not None:
+                frame = data["frame"]
+                mask &= (frame >= frames[0]) & (frame <= frames[1])
+            if wanted is not None:
+                mask &= np.isin(data["track_id"], wanted)
+            if not mask.any():
+                continue
+            for name in columns:
+                parts[name].append(data[name][mask])
+
+    return {
+        name: np.concatenate(arrays) if arrays else np.empty(0, dtype=COLUMNS[name])
+        for name, arrays in parts.items()
+    }
+
+
+def to_frame_dict(columns: Dict[str, np.ndarray]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Convert columns back to the `{frame_name: [detection, ...]}` layout.
+    """
+    output = {}
+    fields = [name for name in COLUMNS if name != "frame" and name in columns]
+    values = {name: columns[name].tolist() for name in fields}
+    for row, frame in enumerate(columns["frame"].tolist()):
+        output.setdefault(frame_name(frame), []).append(
+            {name: values[name][row] for name in fields}
+        )
+    return output
+
+
+@lru_cache(maxsize=16)
+def _load_index(out_dir: str, mtime: float) -> Dict[str, np.ndarray]:
+    # Keyed on the index mtime so a rerun of the job invalidates the entry
+    with np.load(Path(out_dir) / INDEX) as data:
+        return {name: data[name] for name in data.files}
+
+
+def load_index(out_dir: Path) -> Dict[str, np.ndarray]:
+    """
+    Load (and cache per process) the indexes written by `build_index`.
+    """
+    path = Path(out_dir) / INDEX
+    return _load_index(str(out_dir), path.stat().st_mtime)
+
+
+def time_to_frames(fps: float, start: Optional[float] = None,
+                   end: Optional[float] = None) -> Tuple[int, Optional[int]]:
+    """
+    Inclusive 1-based frame range sampled within `start..end` seconds.
+
+    Frame `i` is sampled at `(i - 1) / fps` seconds.
+    """
+    first = math.ceil(start * fps) + 1 if start is not None else 1
+    last = math.floor(end * fps) + 1 if end is not None else None
+    return first, last
+
+
+def _gather(out_dir: Path, chunks: List[Dict[str, Any]], rows: np.ndarray,
+            columns: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Read `columns` for sorted global row numbers `rows`, loading only the
+    chunks that contain them.
+    """
+    chunk_starts = np.cumsum([0] + [c["rows"] for c in chunks])
+    owner = np.searchsorted(chunk_starts, rows, side="right") - 1
+    parts = {name: [] for name in columns}
+    for n in np.unique(owner):
+        local = rows[owner == n] - chunk_starts[n]
+        with np.load(out_dir / chunks[n]["file"]) as data:
+            for name in columns:
+                parts[name].append(data[name][local])
+    return {
+        name: np.concatenate(arrays) if arrays else np.empty(0, dtype=COLUMNS[name])
+        for name, arrays in parts.items()
+    }
+
+
+def query_detections(out_dir: Path, frames: Optional[Tuple[int, Optional[int]]] = None,
+                     track_ids: Optional[Iterable[int]] = None,
+                     teams: Optional[Iterable[int]] = None,
+                     offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Query a completed columnar detections directory using its indexes.
+
+    Frame and track ID filters are resolved to row numbers from the index
+    alone; chunks are only opened for the rows of the requested page (and,
+    with a team filter, for the `team` column of the candidate rows).
+
+    Args:
+        out_dir: Columnar detections directory
+        frames: Optional inclusive (first, last) frame range; `last` may be
+            None for "until the end"
+        track_ids: Optional track IDs to keep
+        teams: Optional team labels to keep
+        offset: Number of matching rows to skip
+        limit: Maximum number of rows to return (default: all)
+
+    Returns:
+        dict with `total` matching rows and `columns` for the page, rows
+        ordered by frame
+    """
+    out_dir = Path(out_dir)
+    manifest = read_manifest(out_dir)
+    if not manifest.get("complete"):
+        raise IncompleteDetectionsError("Detections are still being written")
+    index = load_index(out_dir)
+    chunks = manifest["chunks"]
+    frame_count = manifest["frame_count"]
+    offsets = index["frame_offsets"]
+
+    lo, hi = 0, int(offsets[-1])
+    if frames is not None:
+        first = min(max(frames[0], 1), frame_count + 1)
+        last = frame_count if frames[1] is None else min(max(frames[1], first - 1), frame_count)
+        lo, hi = int(offsets[first - 1]), int(offsets[last])
+
+    if track_ids is not None:
+        ids = np.asarray(sorted(set(int(t) for t in track_ids)), dtype=index["track_ids"].dtype)
+        ids = ids[np.isin(ids, index["track_ids"])]
+        pos = np.searchsorted(index["track_ids"], ids)
+        starts, ends = index["track_starts"][pos], index["track_starts"][pos + 1]
+        rows = np.concatenate(
+            [index["track_rows"][s:e] for s, e in zip(starts, ends)]
+        ) if len(pos) else np.empty(0, dtype=np.int64)
+        rows = np.sort(rows[(rows >= lo) & (rows < hi)])
+    else:
+        rows = np.arange(lo, hi, dtype=np.int64)
+
+    if teams is not None and len(rows):
+        team = _gather(out_dir, chunks, rows, ["team"])["team"]
+        rows = rows[np.isin(team, list(teams))]
+
+    total = len(rows)
+    page = rows[offset:] if limit is None else rows[offset:offset + limit]
+    return {
+        "total": total,
+        "columns": _gather(out_dir, chunks, page, list(COLUMNS)),
+    }
+
+
+def iter_detections(path: Path):
+    """
+    Stream stored detections frame by frame, in any format.
+
+    Columnar output is read one chunk at a time, JSON Lines one line at a
+    time.
+
+    Yields:
+        tuple: (frame_index, list of detection dicts) for frames with
+        detections
+    """
+    path = Path(path)
+    if path.is_dir():
+        manifest = read_manifest(path)
+        for chunk in manifest["chunks"]:
+            with np.load(path / chunk["file"]) as data:
+                columns = {name: data[name] for name in COLUMNS}
+            starts = np.flatnonzero(np.diff(columns["frame"], prepend=-1))
+            ends = np.append(starts[1:], len(columns["frame"]))
+            records = to_records({k: v for k, v in columns.items() if k != "frame"})
+            for start, end in zip(starts, ends):
+                yield int(columns["frame"][start]), records[start:end]
+    elif path.suffix == ".jsonl":
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record["detections"]:
+                    yield record["frame"], record["detections"]
+    else:
+        with open(path) as f:
+            output = json.load(f)
+        for name in sorted(output):
+            yield int(Path(name).stem.split("_")[-1]), output[name]
+
+
+def json_to_columns(path: Path) -> Dict[str, np.ndarray]:
+    """
+    Load a legacy `{frame_name: [detection, ...]}` JSON file, or a JSON
+    Lines file, as columns.
+    """
+    rows = {name: [] for name in COLUMNS}
+    for frame, detections in iter_detections(path):
+        for d in detections:
+            rows["frame"].append(frame)
+            for column in ("track_id", "x1", "y1", "x2", "y2", "team"):
+                rows[column].append(d[column])
+            rows["conf"].append(d.get("conf", np.nan))
+    columns = {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in rows.items()}
+    order = np.argsort(columns["frame"], kind="stable")
+    return {name: values[order] for name, values in columns.items()}
+
+
+def to_records(columns: Dict[str, np.ndarray], fps: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Convert columns to a list of row dicts, adding `time` when `fps` is
+    known.
+    """
+    values = {name: columns[name].tolist() for name in columns}
+    if "conf" in values:
+        # Legacy output has no confidences (NaN), which JSON can't encode
+        values["conf"] = [round(c, 4) if math.isfinite(c) else None for c in values["conf"]]
+    if fps and "frame" in values:
+        values["time"] = [round((f - 1) / fps, 3) for f in values["frame"]]
+    names = list(values)
+    return [dict(zip(names, row)) for row in zip(*(values[name] for name in names))]
@@ -1,6 +1,23 @@
+import json
+import queue
 import subprocess
+import threading
 from pathlib import Path
 
+import numpy as np
+
+# ffmpeg numbers extracted frames from 1; streamed frames reuse the same names
+# so detections keep the same keys regardless of how frames were decoded.
+FRAME_PATTERN = "frame_%04d.jpg"
+
+
+def frame_name(index: int) -> str:
+    """
+    Name of the `index`-th (1-based) sampled frame.
+    """
+    return FRAME_PATTERN % index
+
+
 def extract_frames(video_path: Path, output_dir: Path, fps: int = 7):
     """
     Extract frames from video at `fps` frames per second.
@@ -12,6 +29,303 @@ def extract_frames(video_path: Path, output_dir: Path, fps: int = 7):
         "ffmpeg",
         "-i", str(video_path),
         "-vf", f"fps={fps}",
-        str(output_dir / "frame_%04d.jpg")
+        str(output_dir / FRAME_PATTERN)
     ]
     subprocess.run(cmd, check=True)
+
+
+# ffprobe entries needed by `_display_size`: rotation is stored as display
+# matrix side data, or as a `rotate` tag by older muxers
+ROTATION_ENTRIES = "stream_side_data=rotation:stream_tags=rotate"
+
+
+def _display_size(stream: dict):
+    """
+    (width, height) of a probed stream as ffmpeg decodes it.
+
+    ffmpeg applies the stream's rotation by default, so a portrait phone
+    clip coded as 1920x1080 with a 90 degree rotation decodes to 1080x1920.
+    """
+    width, height = int(stream["width"]), int(stream["height"])
+    rotation = stream.get("tags", {}).get("rotate", 0)
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = side_data["rotation"]
+    if round(float(rotation)) % 180 == 90:
+        return height, width
+    return width, height
+
+
+def probe_frame_size(video_path: Path):
+    """
+    Get the (width, height) of decoded frames of the first video stream
+    (rotation applied) using ffprobe.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", f"stream=width,height:{ROTATION_ENTRIES}",
+        "-of", "json",
+        str(video_path)
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    stream = json.loads(result.stdout)["streams"][0]
+    return _display_size(stream)
+
+
+def probe_duration(video_path: Path) -> float:
+    """
+    Get the container duration in seconds using ffprobe.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "json",
+        str(video_path)
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+
+def _parse_rate(rate: str):
+    # ffprobe reports rates as fractions, e.g. "30000/1001"; "0/0" if unknown
+    num, _, den = rate.partition("/")
+    return float(num) / float(den or 1) if float(den or 1) else None
+
+
+def probe_video(video_path: Path) -> dict:
+    """
+    Read video metadata with ffprobe: container and first video stream.
+
+    Only the container and stream headers are read, so this takes the same
+    time for any length of video. Keyframes are probed separately, where
+    they are needed (`probe_keyframes`).
+
+    Returns:
+        dict with duration, fps, frame_count, codec, width and height (of
+        decoded frames, rotation applied), format and bit_rate;
+        frame_count is estimated from the duration when the container
+        doesn't store it
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries",
+        "format=duration,format_name,bit_rate:"
+        "stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration:"
+        f"{ROTATION_ENTRIES}",
+        "-of", "json",
+        str(video_path)
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    info = json.loads(result.stdout)
+    if not info.get("streams"):
+        raise ValueError(f"No video stream in {video_path}")
+    stream = info["streams"][0]
+    container = info.get("format", {})
+
+    duration = stream.get("duration") or container.get("duration")
+    duration = float(duration) if duration not in (None, "N/A") else None
+    fps = _parse_rate(stream.get("avg_frame_rate", "0/0")) or _parse_rate(stream.get("r_frame_rate", "0/0"))
+    nb_frames = stream.get("nb_frames")
+    width, height = _display_size(stream)
+    if nb_frames not in (None, "N/A"):
+        frame_count = int(nb_frames)
+    else:
+        frame_count = round(duration * fps) if duration and fps else None
+
+    return {
+        "duration": duration,
+        "fps": fps,
+        "frame_count": frame_count,
+        "codec": stream.get("codec_name"),
+        "width": width,
+        "height": height,
+        "format": container.get("format_name"),
+        "bit_rate": int(container["bit_rate"]) if container.get("bit_rate") not in (None, "N/A") else None,
+    }
+
+
+def probe_keyframes(video_path: Path, start: float, duration: float) -> list:
+    """
+    Timestamps (seconds) of the keyframes of the first video stream from
+    about `start` to `start + duration`.
+
+    Only packets in that interval are demuxed (nothing is decoded); ffprobe
+    seeks to the keyframe before `start`, so it is included.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-read_intervals", f"{max(start, 0):.3f}%+{duration:.3f}",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "json",
+        str(video_path)
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    packets = json.loads(result.stdout).get("packets", [])
+    return sorted(
+        float(p["pts_time"]) for p in packets
+        if "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A")
+    )
+
+
+def _read_exact(pipe, buffer: bytearray) -> bool:
+    """
+    Fill `buffer` from `pipe`. Returns False on a clean EOF before any bytes.
+    """
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(buffer):
+        n = pipe.readinto(view[filled:])
+        if not n:
+            if filled == 0:
+                return False
+            raise EOFError("ffmpeg stream ended in the middle of a frame")
+        filled += n
+    return True
+
+
+def frame_geometry(size, crop=None, max_side: int = None):
+    """
+    Output size of decoded frames and how to map their pixels back to the
+    source video.
+
+    Args:
+        size: (width, height) of the source video
+        crop: Optional (x, y, width, height) region of the source to keep
+        max_side: Optional limit for the longer side of the output; frames
+            are only ever scaled down
+
+    Returns:
+        tuple: ((width, height) of the output, (sx, sy) scale, (ox, oy)
+        offset), where a source pixel is `output / scale + offset`
+
+    Raises:
+        ValueError: If `crop` is not inside the frame
+    """
+    x, y, width, height = crop if crop else (0, 0, *size)
+    if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > size[0] or y + height > size[1]:
+        raise ValueError(f"Crop {crop} does not fit in a {size[0]}x{size[1]} video")
+    scale = 1.0
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+    out_width = max(2, round(width * scale))
+    out_height = max(2, round(height * scale))
+    return (out_width, out_height), (out_width / width, out_height / height), (x, y)
+
+
+def iter_frames(video_path: Path, fps: int = 7, buffer_size: int = 8,
+                start: float = None, duration: float = None, size=None,
+                crop=None, max_side: int = None, threads: int = None):
+    """
+    Decode `video_path` at `fps` frames per second and yield raw BGR frames.
+
+    ffmpeg pipes rawvideo into a reader thread which hands frames over through
+    a bounded queue, so decoding overlaps with whatever consumes the frames
+    while at most `buffer_size` decoded frames are held in memory. Frames are
+    never written to disk.
+
+    Args:
+        video_path: Path to the video file
+        fps: Sampling rate, same meaning as in `extract_frames`
+        buffer_size: Maximum number of decoded frames waiting to be consumed
+        start: Optional offset in seconds to start decoding from
+        duration: Optional number of seconds to decode
+        size: (width, height) of the video if already known (skips a probe)
+        crop: Optional (x, y, width, height) source region to keep, e.g. to
+            drop broadcast overlays; applied before scaling
+        max_side: Optional limit for the longer output side (e.g. the
+            inference size); scaling happens inside ffmpeg so frames never
+            cross the pipe at full resolution
+        threads: Decoder threads (default: ffmpeg's choice)
+
+    Yields:
+        (H, W, 3) uint8 BGR frames, in order; see `frame_geometry` for their
+        size and mapping back to source pixels
+    """
+    size = size or probe_frame_size(video_path)
+    (width, height), (sx, sy), _ = frame_geometry(size, crop, max_side)
+    frame_bytes = width * height * 3
+
+    filters = [f"fps={fps}"]
+    if crop:
+        x, y, crop_width, crop_height = crop
+        filters.append(f"crop={crop_width}:{crop_height}:{x}:{y}")
+    if sx != 1.0 or sy != 1.0:
+        filters.append(f"scale={width}:{height}:flags=area")
+
+    cmd = ["ffmpeg", "-loglevel", "error"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    if start:
+        # Input seeking jumps to the keyframe before `start`
+        cmd += ["-ss", f"{start:.6f}"]
+    cmd += ["-i", str(video_path)]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.6f}"]
+    cmd += [
+        "-vf", ",".join(filters),
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "pipe:1"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    frames = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Keep retrying so the reader notices `stop` if the consumer went away
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            while not stop.is_set():
+                buffer = bytearray(frame_bytes)
+                if not _read_exact(proc.stdout, buffer):
+                    break
+                frame = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+                if not put(frame):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(done)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = frames.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+        returncode = proc.wait()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr=proc.stderr.read()
+            )
+    finally:
+        stop.set()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        thread.join()
+        proc.stdout.close()
+        proc.stderr.close()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+FRAME_STORE_DIR = Path("frame_store")
+# Largest store written for one video and decode setting (default 8 GB)
+MAX_BYTES = int(os.environ.get("FRAME_STORE_MAX_BYTES", 8 * 1024 ** 3))
+FORMAT_VERSION = 1
+MAGIC = b"CXCFRAME"
+# The JSON header is padded to this size so frame data starts page aligned
+HEADER_SIZE = 4096
+
+
+def frame_store_path(video_id: str, video_hash: Optional[str], fps: float, crop=None,
+                     max_side: Optional[int] = None, root: Path = FRAME_STORE_DIR) -> Path:
+    """
+    Where the frames of `video_id` decoded with these settings are stored.
+
+    Every decode setting gets its own file under `frame_store/{video_id}/`.
+    """
+    settings = json.dumps({"video": video_hash, "fps": fps, "crop": crop, "max_side": max_side},
+                          sort_keys=True)
+    digest = hashlib.sha256(settings.encode()).hexdigest()[:16]
+    return root / video_id / f"{digest}.frames"
+
+
+def _header_bytes(header: dict) -> bytes:
+    body = json.dumps(header).encode()
+    if len(MAGIC) + 4 + len(body) > HEADER_SIZE:
+        raise ValueError("Frame store header too large")
+    block = MAGIC + struct.pack("<I", len(body)) + body
+    return block.ljust(HEADER_SIZE, b"\0")
+
+
+class FrameStoreWriter:
+    """
+    Writes decoded frames to a frame store file as they arrive.
+
+    Layout: a `HEADER_SIZE` block holding a JSON header, the frames as one
+    contiguous (N, H, W, 3) uint8 array, then N float64 timestamps. The
+    file is written under a temporary name and only renamed into place by
+    `close()`, so a store that exists is always complete.
+    """
+
+    def __init__(self, path: Path, fps: float, meta: Optional[dict] = None):
+        self.path = Path(path)
+        self.fps = fps
+        self.meta = meta or {}
+        self.shape = None
+        self.count = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._file = open(self._tmp, "wb")
+        self._file.write(b"\0" * HEADER_SIZE)
+
+    def add(self, frame: np.ndarray):
+        if self.shape is None:
+            self.shape = frame.shape
+        elif frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} differs from {self.shape}")
+        self._file.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        self.count += 1
+
+    def close(self):
+        timestamps = np.arange(self.count, dtype=np.float64) / self.fps
+        data_size = self.count * int(np.prod(self.shape or (0,)))
+        self._file.write(timestamps.tobytes())
+        header = dict(self.meta, version=FORMAT_VERSION, dtype="uint8",
+                      shape=[self.count, *(self.shape or (0, 0, 3))], fps=self.fps,
+                      data_offset=HEADER_SIZE, timestamps_offset=HEADER_SIZE + data_size)
+        self._file.seek(0)
+        self._file.write(_header_bytes(header))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._file.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+class FrameStore:
+    """
+    Read-only, memory-mapped view of a frame store file.
+
+    Frames are returned as zero-copy views into the mapping, indexed from 1
+    like the rest of the pipeline; only the pages actually touched are read
+    from disk.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            block = f.read(HEADER_SIZE)
+        if block[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a frame store")
+        (length,) = struct.unpack("<I", block[len(MAGIC):len(MAGIC) + 4])
+        self.header = json.loads(block[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+        if self.header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported frame store version {self.header['version']}")
+
+        self.shape = tuple(self.header["shape"])
+        self.fps = self.header["fps"]
+        count = self.shape[0]
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode="r",
+                                offset=self.header["data_offset"], shape=self.shape) \
+            if count else np.empty(self.shape, dtype=np.uint8)
+        self.timestamps = np.memmap(self.path, dtype=np.float64, mode="r",
+                                    offset=self.header["timestamps_offset"], shape=(count,)) \
+            if count else np.empty(0)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, frame_index: int) -> np.ndarray:
+        """
+        Frame `frame_index` (1-based).
+        """
+        if not 1 <= frame_index <= len(self):
+            raise IndexError(frame_index)
+        return self.frames[frame_index - 1]
+
+    def iter_frames(self, start_index: int = 1) -> Iterator[np.ndarray]:
+        """
+        Frames from `start_index` (1-based) to the end, in order.
+        """
+        for i in range(max(start_index, 1) - 1, len(self)):
+            yield self.frames[i]
+
+    def sample(self, count: int) -> Iterator[np.ndarray]:
+        """
+        `count` frames spread evenly over the video.
+        """
+        if not len(self):
+            return
+        for i in np.linspace(0, len(self) - 1, min(count, len(self))).astype(int):
+            yield self.frames[i]
+
+
+def open_frame_store(path: Path, video_hash: Optional[str] = None) -> Optional[FrameStore]:
+    """
+    Open the frame store at `path`, or None if there is none (or it was
+    written from different video content).
+    """
+    try:
+        store = FrameStore(path)
+    except (OSError, ValueError) as e:
+        if Path(path).exists():
+            print(f"Ignoring frame store {path}: {e}")
+        return None
+    if video_hash and store.header.get("video") not in (None, video_hash):
+        return None
+    return store
+
+
+def fits_frame_store(size, frame_count: Optional[int], max_bytes: int = MAX_BYTES) -> bool:
+    """
+    Whether `frame_count` frames of `size` (width, height) fit in
+    `max_bytes`; unknown frame counts are allowed.
+    """
+    return frame_count is None or frame_count * size[0] * size[1] * 3 <= max_bytes
+
+
+def build_frame_store(frames: Iterable[np.ndarray], writer: FrameStoreWriter) -> FrameStore:
+    """
+    Write all of `frames` to `writer` and open the finished store.
+    """
+    for _ in store_frames(frames, writer):
+        pass
+    return FrameStore(writer.path)
+
+
+def store_frames(frames: Iterable[np.ndarray], writer: FrameStoreWriter) -> Iterator[np.ndarray]:
+    """
+    Pass `frames` through unchanged while writing them to `writer`.
+
+    The store is only completed if every frame was consumed; otherwise the
+    partial file is removed.
+    """
+    try:
+        for frame in frames:
+            writer.add(frame)
+            yield frame
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
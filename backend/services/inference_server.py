@@ -0,0 +1,257 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from typing import Callable, Optional, Tuple
+
+# Largest number of frames sent through the model in one call
+MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", 32))
+# How long the first request of a batch waits for requests of other jobs
+MAX_LATENCY = float(os.environ.get("INFERENCE_MAX_LATENCY_MS", 10)) / 1000
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _args_key(kwargs: dict):
+    # Requests are only batched together when they ask for the same
+    # predict arguments
+    return tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+
+
+class InferenceServer:
+    """
+    Runs one model for many clients, batching their frames dynamically.
+
+    Every client connection (one per job process) gets a thread that reads
+    its requests into a shared queue. A single batching thread takes the
+    first waiting request, then keeps collecting requests for up to
+    `max_latency` seconds or until `max_batch` frames are waiting, runs them
+    through the model together and sends each client the boxes of its own
+    frames. Only boxes go back; trackers stay in the jobs.
+    """
+
+    def __init__(self, model, max_batch: int = MAX_BATCH, max_latency: float = MAX_LATENCY):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._requests = queue.Queue()
+
+    def serve(self, listener: Listener):
+        """
+        Accept clients on `listener` forever.
+        """
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"Rejected inference client: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            conn.send({"names": self.model.names})
+            while True:
+                request_id, frames, kwargs = conn.recv()
+                self._requests.put((conn, request_id, frames, kwargs))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _collect(self):
+        batch = [self._requests.get()]
+        frames = len(batch[0][2])
+        deadline = time.monotonic() + self.max_latency
+        while frames < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            frames += len(request[2])
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            groups = {}
+            for request in self._collect():
+                groups.setdefault(_args_key(request[3]), []).append(request)
+            for requests in groups.values():
+                self._run(requests)
+
+    def _run(self, requests):
+        frames = [frame for _, _, request_frames, _ in requests for frame in request_frames]
+        boxes, error = [], None
+        try:
+            for start in range(0, len(frames), self.max_batch):
+                results = self.model.predict(
+                    source=frames[start:start + self.max_batch], verbose=False, **requests[0][3]
+                )
+                boxes.extend(r.boxes.data.cpu().numpy() for r in results)
+        except Exception as e:
+            error = repr(e)
+
+        position = 0
+        for conn, request_id, request_frames, _ in requests:
+            count = len(request_frames)
+            reply = (request_id, None if error else boxes[position:position + count], error)
+            position += count
+            try:
+                conn.send(reply)
+            except OSError:
+                pass  # Client went away; its handler thread cleans up
+
+
+class RemoteModel:
+    """
+    Client of an `InferenceServer` with the `predict` call of an
+    `ultralytics.YOLO` model, so the pipeline can use either.
+
+    Results are rebuilt locally from the returned boxes and the caller's
+    frames, so trackers and color sampling work as with a local model.
+
+    If the connection drops (the server died or restarted), the request is
+    retried once on a new connection; if that fails too, `fallback()` is
+    called for a local model, which serves this and all later requests.
+    """
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None,
+                 fallback: Optional[Callable[[], object]] = None):
+        self.address = address
+        self.authkey = authkey
+        self.fallback = fallback
+        self._local = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._conn = Client(parse_address(self.address), authkey=self.authkey)
+        self.names = self._conn.recv()["names"]
+
+    def _request(self, frames, kwargs):
+        self._next_id += 1
+        self._conn.send((self._next_id, frames, kwargs))
+        _, boxes, error = self._conn.recv()
+        return boxes, error
+
+    def predict(self, source, verbose: bool = False, **kwargs):
+        if self._local is not None:
+            return self._local.predict(source=source, verbose=verbose, **kwargs)
+
+        import torch
+        from ultralytics.engine.results import Results
+
+        frames = list(source) if isinstance(source, (list, tuple)) else [source]
+        with self._lock:
+            try:
+                boxes, error = self._request(frames, kwargs)
+            except (EOFError, OSError) as e:
+                print(f"Lost inference server {self.address}: {e!r}")
+                self._conn.close()
+                try:
+                    self._connect()
+                    boxes, error = self._request(frames, kwargs)
+                except (AuthenticationError, EOFError, OSError):
+                    if self.fallback is None:
+                        raise ConnectionError(f"Inference server {self.address} unavailable") from e
+                    print("Inference server unavailable; using a local model")
+                    self._local = self.fallback()
+        if self._local is not None:
+            return self._local.predict(source=source, verbose=verbose, **kwargs)
+        if error:
+            raise RuntimeError(f"Inference server failed: {error}")
+        return [
+            Results(orig_img=frame, path="", names=self.names, boxes=torch.from_numpy(data))
+            for frame, data in zip(frames, boxes)
+        ]
+
+    def close(self):
+        try:
+            self._conn.close()
+        except OSError:
+            pass
+
+
+def serve(address: str, weights: str, imgsz: int = 640, backend: Optional[str] = None,
+          authkey: Optional[bytes] = None, max_batch: int = MAX_BATCH,
+          max_latency: float = MAX_LATENCY, ready=None):
+    """
+    Load the model once and serve it on `address` ("host:port"; port 0
+    picks a free one).
+
+    Args:
+        ready: Optional connection that receives the bound "host:port"
+            once the model is loaded
+    """
+    from services.model_registry import get_model
+
+    model = get_model(weights, imgsz=imgsz, backend=backend, local=True)
+    listener = Listener(parse_address(address), authkey=authkey)
+    host, port = listener.address
+    print(f"Inference server on {host}:{port} (max batch {max_batch}, "
+          f"max latency {max_latency * 1000:.0f} ms)")
+    if ready is not None:
+        ready.send(f"{host}:{port}")
+        ready.close()
+    InferenceServer(model, max_batch, max_latency).serve(listener)
+
+
+def start_sidecar(weights: str, imgsz: int = 640, backend: Optional[str] = None,
+                  address: str = "127.0.0.1:0", authkey: Optional[bytes] = None):
+    """
+    Start an inference server in a local process, by default on a free
+    port with a new authkey.
+
+    Args:
+        address, authkey: Reuse the address and authkey of a server that
+            died, so its clients can reconnect
+
+    Returns:
+        tuple: (process, "host:port", authkey)
+    """
+    context = multiprocessing.get_context("spawn")
+    authkey = authkey or secrets.token_bytes(16)
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=serve, args=(address, weights, imgsz, backend, authkey),
+        kwargs={"ready": sender}, daemon=True,
+    )
+    process.start()
+    sender.close()
+    try:
+        address = receiver.recv()
+    except EOFError:
+        raise RuntimeError("Inference server failed to start") from None
+    return process, address, authkey
+
+
+def main():
+    from services.detection import DETECT_ARGS, WEIGHTS
+
+    parser = argparse.ArgumentParser(description="Serve the detection model to job workers")
+    parser.add_argument("--address", default="127.0.0.1:8765")
+    parser.add_argument("--weights", default=WEIGHTS)
+    parser.add_argument("--imgsz", type=int, default=DETECT_ARGS["imgsz"])
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-latency-ms", type=float, default=MAX_LATENCY * 1000)
+    args = parser.parse_args()
+
+    authkey = os.environ.get("INFERENCE_AUTHKEY")
+    serve(args.address, args.weights, args.imgsz,
+          authkey=bytes.fromhex(authkey) if authkey else None,
+          max_batch=args.max_batch, max_latency=args.max_latency_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
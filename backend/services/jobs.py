@@ -0,0 +1,313 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from services.model_registry import INFERENCE_SERVER_ENV
+from services.progress import SCHEMA as PROGRESS_SCHEMA
+from utils.db import DATA_DIR, connect
+
+JOBS_DB = DATA_DIR / "jobs.db"
+
+ACTIVE_STATUSES = ("queued", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    options TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+CREATE INDEX IF NOT EXISTS jobs_video ON jobs (video_id, created_at);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised when a job is rejected by admission control"""
+
+
+def _run_job(job_id: str, video_id: str, options: Dict[str, Any]):
+    """
+    Entry point executed in a worker process.
+    """
+    # Imported here so the API process never loads the model stack
+    from services.process_pipeline import process_pipeline
+    options = dict(options)
+    if options.pop("profile", False):
+        from services.metrics import profile_path, profiled
+        with profiled(profile_path(job_id)):
+            process_pipeline(video_id, job_id=job_id, **options)
+    else:
+        process_pipeline(video_id, job_id=job_id, **options)
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+def _dedup_key(video_id: str, options: Dict[str, Any]) -> str:
+    payload = json.dumps({"video_id": video_id, "options": options}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    job = dict(row)
+    job["options"] = json.loads(job["options"])
+    job.pop("dedup_key", None)
+    return job
+
+
+class JobQueue:
+    """
+    Persistent analysis job queue backed by SQLite and a process pool.
+
+    Jobs run in separate worker processes so the CPU-heavy pipeline never
+    blocks the API. At most `max_workers` jobs run at once; submissions are
+    rejected once `max_pending` jobs are queued or running, and submitting
+    the same video with the same options while it is still queued or running
+    returns the existing job. Jobs left queued or running by a previous
+    server process are picked up again on `start()`.
+
+    With `INFERENCE_SERVER=local`, `start()` also launches an inference
+    server process (see `services.inference_server`) and points the
+    workers at it, so all running jobs share one model and batch their
+    frames together.
+    """
+
+    def __init__(self, db_path: Path = JOBS_DB, max_workers: int = 2, max_pending: int = 32):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        # Re-entrant: a future that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._pool = None
+        self._inference = None
+        self._inference_restarting = False
+        self._running = set()
+
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.executescript(SCHEMA)
+            conn.executescript(PROGRESS_SCHEMA)
+
+    def _connect(self):
+        return closing(connect(self.db_path))
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def start(self):
+        """
+        Start the worker pool and resume jobs interrupted by a restart.
+        """
+        with self._lock:
+            if self._pool is not None:
+                return
+            if os.environ.get(INFERENCE_SERVER_ENV) == "local":
+                self._start_inference()
+            self._pool = self._new_pool()
+            with self._connect() as conn, conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+                )
+        self._dispatch()
+
+    def _start_inference(self, address: str = "127.0.0.1:0", authkey: Optional[bytes] = None):
+        # Imported here so the API process only loads the model stack in
+        # the server process
+        from services.detection import DETECT_ARGS, WEIGHTS
+        from services.inference_server import start_sidecar
+
+        try:
+            self._inference, address, authkey = start_sidecar(
+                WEIGHTS, imgsz=DETECT_ARGS["imgsz"], address=address, authkey=authkey
+            )
+        except RuntimeError as e:
+            print(f"{e}; workers load their own models")
+            return
+        # Spawned workers inherit the environment
+        os.environ[INFERENCE_SERVER_ENV] = address
+        os.environ["INFERENCE_AUTHKEY"] = authkey.hex()
+
+    def _check_inference(self):
+        """
+        Restart the inference server if it exited, on the same address and
+        authkey so existing workers reconnect (they use local models until
+        it is back).
+        """
+        with self._lock:
+            inference = self._inference
+            if inference is None or inference.is_alive() or self._inference_restarting:
+                return
+            self._inference_restarting = True
+        print(f"Inference server exited with code {inference.exitcode}; restarting it")
+
+        def restart():
+            address = os.environ[INFERENCE_SERVER_ENV]
+            authkey = bytes.fromhex(os.environ["INFERENCE_AUTHKEY"])
+            with self._lock:
+                self._inference = None
+            self._start_inference(address, authkey)
+            with self._lock:
+                self._inference_restarting = False
+                if self._pool is None and self._inference is not None:
+                    # Shut down while restarting
+                    self._inference.terminate()
+                    self._inference = None
+
+        threading.Thread(target=restart, daemon=True).start()
+
+    def shutdown(self, wait: bool = False):
+        """
+        Stop the worker pool (and the inference server it started).
+        Unfinished jobs stay in the table.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+            inference, self._inference = self._inference, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+        if inference is not None:
+            inference.terminate()
+            os.environ[INFERENCE_SERVER_ENV] = "local"
+
+    def submit(self, video_id: str, options: Optional[Dict[str, Any]] = None):
+        """
+        Queue a pipeline run for `video_id`.
+
+        Args:
+            video_id: Name of the uploaded video file
+            options: Keyword arguments for `process_pipeline`
+
+        Returns:
+            tuple: (job dict, True if a new job was created)
+
+        Raises:
+            QueueFullError: If too many jobs are already pending
+        """
+        options = options or {}
+        key = _dedup_key(video_id, options)
+
+        with self._lock, self._connect() as conn, conn:
+            existing = conn.execute(
+                "SELECT * FROM jobs WHERE dedup_key = ? AND status IN (?, ?)"
+                " ORDER BY created_at LIMIT 1",
+                (key, *ACTIVE_STATUSES),
+            ).fetchone()
+            if existing is not None:
+                return _row_to_job(existing), False
+
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs already pending")
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (job_id, video_id, options, dedup_key, status, created_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, video_id, json.dumps(options), key, _now()),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+        self._dispatch()
+        return _row_to_job(job), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job by ID.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def latest_for_video(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Most recently submitted job for `video_id`.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE video_id = ? ORDER BY created_at DESC LIMIT 1",
+                (video_id,),
+            ).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def _dispatch(self):
+        """
+        Hand queued jobs to the pool while there are free workers.
+        """
+        self._check_inference()
+        with self._lock:
+            if self._pool is None:
+                return
+            free = self.max_workers - len(self._running)
+            if free <= 0:
+                return
+            with self._connect() as conn, conn:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT ?",
+                    (free,),
+                ).fetchall()
+                for row in rows:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?",
+                        (_now(), row["job_id"]),
+                    )
+            pool = self._pool
+            for row in rows:
+                self._running.add(row["job_id"])
+                future = pool.submit(
+                    _run_job, row["job_id"], row["video_id"], json.loads(row["options"])
+                )
+                future.add_done_callback(
+                    lambda f, job_id=row["job_id"]: self._finish(job_id, f, pool)
+                )
+
+    def _finish(self, job_id: str, future, pool):
+        exc = None if future.cancelled() else future.exception()
+        if future.cancelled():
+            # Pool shut down before the job ran; leave it for the next start
+            status, error = "queued", None
+        elif exc is not None:
+            status, error = "failed", repr(exc)
+        else:
+            status, error = "completed", None
+
+        with self._lock:
+            self._running.discard(job_id)
+            if isinstance(exc, BrokenProcessPool) and self._pool is pool:
+                # A worker died (e.g. OOM); replace the pool for later jobs.
+                # Every job on the broken pool fails, but only the first
+                # callback replaces it
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+            with self._connect() as conn, conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?",
+                    (status, None if status == "queued" else _now(), error, job_id),
+                )
+        self._dispatch()
+
+
+job_queue = JobQueue(
+    max_workers=int(os.environ.get("JOB_WORKERS", 2)),
+    max_pending=int(os.environ.get("JOB_MAX_PENDING", 32)),
+)
@@ -0,0 +1,183 @@
+import cProfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from services.progress import LATENCY_BUCKETS, PROGRESS_DB
+from utils.db import connect
+
+PROFILE_DIR = Path("profiles")
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Metrics created in this process (API handlers); see `render_metrics`
+REGISTRY = []
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _bound(bound) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Counter:
+    """
+    Monotonic counter kept in this process, optionally split by labels.
+    """
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.label_names, key)} {value}"
+
+
+class Histogram:
+    """
+    Distribution of observed values (e.g. durations) in this process.
+    """
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> ([count per bucket], sum)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the wall time of the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            yield from _histogram_lines(self.name, self.label_names, key,
+                                        self.buckets, counts, total)
+
+
+def _histogram_lines(name, label_names, key, buckets, counts, total):
+    cumulative = 0
+    for bound, count in zip((*buckets, float("inf")), counts):
+        cumulative += count
+        labels = _labels((*label_names, "le"), (*key, _bound(bound)))
+        yield f"{name}_bucket{labels} {cumulative}"
+    yield f"{name}_sum{_labels(label_names, key)} {total}"
+    yield f"{name}_count{_labels(label_names, key)} {cumulative}"
+
+
+def pipeline_metrics(db_path: Path = PROGRESS_DB):
+    """
+    Exposition lines for the pipeline stages and jobs.
+
+    Jobs run in worker processes, which report per-stage totals and
+    duration histograms into the jobs database (see
+    `services.progress.ProgressReporter`), so these are read from there
+    rather than kept in memory.
+    """
+    with closing(connect(db_path)) as conn:
+        stages = conn.execute("SELECT * FROM stage_metrics ORDER BY stage").fetchall()
+        latency = conn.execute("SELECT stage, bucket, count FROM stage_latency").fetchall()
+        jobs = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+
+    yield "# HELP pipeline_stage_seconds_total Wall time spent in each pipeline stage."
+    yield "# TYPE pipeline_stage_seconds_total counter"
+    for row in stages:
+        yield f'pipeline_stage_seconds_total{{stage="{row["stage"]}"}} {row["seconds"]}'
+    yield "# HELP pipeline_stage_frames_total Frames processed by each pipeline stage."
+    yield "# TYPE pipeline_stage_frames_total counter"
+    for row in stages:
+        yield f'pipeline_stage_frames_total{{stage="{row["stage"]}"}} {row["frames"]}'
+
+    counts = {}
+    for row in latency:
+        stage_counts = counts.setdefault(row["stage"], [0] * (len(LATENCY_BUCKETS) + 1))
+        stage_counts[min(row["bucket"], len(LATENCY_BUCKETS))] += row["count"]
+    yield "# HELP pipeline_stage_duration_seconds Duration of individual timed calls per stage."
+    yield "# TYPE pipeline_stage_duration_seconds histogram"
+    for row in stages:
+        stage_counts = counts.get(row["stage"], [0] * (len(LATENCY_BUCKETS) + 1))
+        yield from _histogram_lines("pipeline_stage_duration_seconds", ("stage",), (row["stage"],),
+                                    LATENCY_BUCKETS, stage_counts, row["seconds"])
+
+    yield "# HELP analysis_jobs Analysis jobs by status."
+    yield "# TYPE analysis_jobs gauge"
+    for row in jobs:
+        yield f'analysis_jobs{{status="{row["status"]}"}} {row["n"]}'
+
+
+def render_metrics(db_path: Path = PROGRESS_DB) -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    lines.extend(pipeline_metrics(db_path))
+    return "\n".join(lines) + "\n"
+
+
+def profile_path(job_id: str) -> Path:
+    """
+    Where the cProfile dump of a profiled job is written.
+    """
+    return PROFILE_DIR / f"{job_id}.prof"
+
+
+@contextmanager
+def profiled(path: Path):
+    """
+    Profile the block with cProfile and dump the stats to `path`.
+
+    The dump is in the standard pstats format (`python -m pstats`,
+    snakeviz, or `flameprof` for a flame graph).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
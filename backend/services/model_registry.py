@@ -0,0 +1,142 @@
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# "torch" runs the .pt weights directly; "onnx" and "openvino" export them
+# once and run the exported model, which is usually faster on CPU-only hosts
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "openvino")
+
+# "host:port" of a shared inference server (see `services.inference_server`)
+# to send frames to instead of loading the model in this process. "local"
+# makes the job queue start one next to its workers.
+INFERENCE_SERVER_ENV = "INFERENCE_SERVER"
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _exported_path(weights: Path, imgsz: int, backend: str) -> Path:
+    if backend == "onnx":
+        return weights.with_name(f"{weights.stem}_{imgsz}.onnx")
+    return weights.with_name(f"{weights.stem}_{imgsz}_openvino_model")
+
+
+def export_model(weights: Path, imgsz: int, backend: str) -> Path:
+    """
+    Export `weights` for `backend`, reusing an export newer than the weights.
+
+    Exports have a dynamic batch dimension so batched inference works.
+
+    Returns:
+        Path of the exported model
+    """
+    target = _exported_path(weights, imgsz, backend)
+    if target.exists() and target.stat().st_mtime >= weights.stat().st_mtime:
+        return target
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} to {backend} (imgsz={imgsz})")
+    exported = Path(YOLO(str(weights)).export(format=backend, imgsz=imgsz, dynamic=True))
+    # Ultralytics names exports after the weights only; keep one per imgsz
+    if target.is_dir():
+        shutil.rmtree(target)
+    elif target.exists():
+        target.unlink()
+    exported.rename(target)
+    return target
+
+
+def _load(weights: Path, imgsz: int, backend: str):
+    from ultralytics import YOLO
+
+    start = time.perf_counter()
+    source = weights if backend == "torch" else export_model(weights, imgsz, backend)
+    model = YOLO(str(source), task="detect")
+
+    # The first inference builds the graph / picks kernels; pay it up front
+    model.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+    print(f"Loaded {source} ({backend}) in {time.perf_counter() - start:.1f}s")
+    return model
+
+
+def get_model(weights: str, imgsz: int = 640, backend: str = None, local: bool = False):
+    """
+    YOLO model for `weights`, loaded and warmed up once per process.
+
+    Ultralytics (and torch) are only imported on the first call, so
+    importing this module is cheap. When `INFERENCE_SERVER` holds a server
+    address, a client of that server is returned instead, so concurrent
+    jobs share one copy of the weights and their frames are batched
+    together; the server must run the same weights.
+
+    Args:
+        weights: Path to the .pt weights
+        imgsz: Inference size the model is warmed up (and exported) for
+        backend: "torch", "onnx" or "openvino" (default: `MODEL_BACKEND`)
+        local: Always load the model in this process
+
+    Returns:
+        Cached `ultralytics.YOLO` instance, or a
+        `services.inference_server.RemoteModel` with the same `predict`
+        (which falls back to a local model if the server goes away)
+    """
+    address = os.environ.get(INFERENCE_SERVER_ENV, "")
+    if not local and address not in ("", "local"):
+        model = _remote_model(address, weights, imgsz, backend)
+        if model is not None:
+            return model
+
+    backend = backend or MODEL_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend}")
+
+    weights = Path(weights)
+    key = (str(weights.resolve()), imgsz, backend)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = _load(weights, imgsz, backend)
+    return model
+
+
+def _remote_model(address: str, weights: str, imgsz: int, backend: str):
+    """
+    Cached client of the server at `address`, or None if it can't be
+    reached.
+    """
+    from multiprocessing.connection import AuthenticationError
+    from services.inference_server import RemoteModel
+
+    def fallback():
+        # Later jobs of this worker try the server again with a new client
+        with _lock:
+            if _models.get(address) is model:
+                del _models[address]
+        return get_model(weights, imgsz=imgsz, backend=backend, local=True)
+
+    authkey = os.environ.get("INFERENCE_AUTHKEY")
+    with _lock:
+        model = _models.get(address)
+        if model is None:
+            try:
+                model = _models[address] = RemoteModel(
+                    address, authkey=bytes.fromhex(authkey) if authkey else None,
+                    fallback=fallback,
+                )
+            except (AuthenticationError, EOFError, OSError) as e:
+                print(f"Inference server {address} unavailable ({e!r}); loading the model locally")
+    return model
+
+
+def clear_models():
+    """
+    Drop all cached models (e.g. after the weights were replaced).
+    """
+    with _lock:
+        _models.clear()
@@ -0,0 +1,316 @@
+import math
+import multiprocessing
+import os
+import subprocess
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from services.frame_extract import (
+    frame_geometry, iter_frames, probe_duration, probe_frame_size, probe_keyframes
+)
+from services.progress import ProgressReporter
+
+# Seconds either side of a segment boundary searched for a keyframe
+KEYFRAME_WINDOW = 10
+
+
+def _init_worker(threads: int):
+    """
+    Limit intra-op threads so parallel workers don't oversubscribe the CPU.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+
+
+class _SegmentProgress(ProgressReporter):
+    """
+    Reporter of a segment that doesn't count its first `lead` frames, which
+    the previous segment already counted. Their stage timings still count.
+    """
+
+    def __init__(self, job_id, lead: int):
+        super().__init__(job_id)
+        self.lead = lead
+
+    def advance(self, frames: int = 1):
+        skipped = min(frames, self.lead)
+        self.lead -= skipped
+        if frames > skipped:
+            super().advance(frames - skipped)
+
+
+def _track_segment(video_path: str, fps: int, first_index: int, n_frames,
+                   overlap: int, job_id=None, detect_options=None, decode_options=None,
+                   team_model=None):
+    """
+    Decode and track one segment of the video in a worker process.
+
+    Returns:
+        dict with the segment's (frame_index, detections) pairs, the team
+        centers once the overlap frames have been processed and the team
+        centers at the end of the segment
+    """
+    # Imported here so the parent process never loads the model stack
+    from services.detection import track_frames
+    from services.player_classification import TeamClusterer
+
+    decode_options = decode_options or {}
+    start = (first_index - 1) / fps
+    duration = None if n_frames is None else n_frames / fps
+    frames = iter_frames(Path(video_path), fps=fps, start=start, duration=duration,
+                         **decode_options)
+    if n_frames is not None:
+        frames = islice(frames, n_frames)
+
+    # Segments report into the parent job's progress
+    progress = _SegmentProgress(job_id, overlap)
+    clusterer = team_model if team_model is not None else TeamClusterer()
+    records = []
+    centers = None
+    _, scale, offset = frame_geometry(
+        decode_options["size"], decode_options.get("crop"), decode_options.get("max_side")
+    )
+    for index, detections in track_frames(frames, start_index=first_index,
+                                          clusterer=clusterer, progress=progress,
+                                          geometry=(scale, offset),
+                                          **(detect_options or {})):
+        records.append((index, detections))
+        if centers is None and index >= first_index + overlap - 1:
+            centers = clusterer.centers
+    progress.flush(force=True)
+    return {
+        "frames": records,
+        "start_centers": centers,
+        "end_centers": clusterer.centers,
+    }
+
+
+def _iou(a, b):
+    """
+    Pairwise IoU between two (N, 4) and (M, 4) box arrays.
+    """
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _boxes(detections):
+    return np.array([[d["x1"], d["y1"], d["x2"], d["y2"]] for d in detections]).reshape(-1, 4)
+
+
+def _match_tracks(prev_frames, cur_frames, min_iou: float = 0.5):
+    """
+    Match track IDs of a segment to the previous one over their overlap.
+
+    Returns:
+        tuple: ({cur_id: prev_id}, list of (prev_team, cur_team) pairs seen
+        on matched boxes)
+    """
+    votes = defaultdict(Counter)
+    team_pairs = []
+    for index, cur in cur_frames.items():
+        prev = prev_frames.get(index)
+        if not prev or not cur:
+            continue
+        iou = _iou(_boxes(prev), _boxes(cur))
+        # Greedy one-to-one matching per frame, best IoU first
+        while iou.size and iou.max() >= min_iou:
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            votes[cur[j]["track_id"]][prev[i]["track_id"]] += 1
+            team_pairs.append((prev[i]["team"], cur[j]["team"]))
+            iou[i, :] = -1
+            iou[:, j] = -1
+
+    # One-to-one over the whole overlap, strongest agreement first
+    candidates = sorted(
+        ((count, cur_id, prev_id)
+         for cur_id, counter in votes.items()
+         for prev_id, count in counter.items()),
+        reverse=True,
+    )
+    mapping = {}
+    used = set()
+    for _, cur_id, prev_id in candidates:
+        if cur_id in mapping or prev_id in used:
+            continue
+        mapping[cur_id] = prev_id
+        used.add(prev_id)
+    return mapping, team_pairs
+
+
+def _should_flip(team_pairs, prev_centers, cur_centers) -> bool:
+    """
+    Whether a segment's team labels are the opposite of the previous one's.
+    """
+    if team_pairs:
+        disagree = sum(p != c for p, c in team_pairs)
+        return disagree > len(team_pairs) - disagree
+    if prev_centers is None or cur_centers is None:
+        return False
+    same = np.linalg.norm(prev_centers[0] - cur_centers[0]) + np.linalg.norm(prev_centers[1] - cur_centers[1])
+    swapped = np.linalg.norm(prev_centers[0] - cur_centers[1]) + np.linalg.norm(prev_centers[1] - cur_centers[0])
+    return swapped < same
+
+
+def _stitch(segments, overlap: int, fixed_teams: bool = False):
+    """
+    Merge per-segment results, in segment order, into one stream of
+    (frame_index, detections) pairs in frame order.
+
+    Track IDs are made unique across segments, tracks that continue across
+    a boundary keep the ID from the earlier segment, and team labels are
+    flipped where a segment's clustering came out in the opposite
+    orientation (unless `fixed_teams`: all segments used one team color
+    model). Overlapping frames keep the earlier segment's detections.
+
+    Segments are consumed lazily and only the previous segment's overlap
+    frames are kept, so each segment can be dropped once it is written.
+    """
+    next_id = 1
+    prev_frames = {}
+    prev_centers = None
+
+    for n, segment in enumerate(segments):
+        cur_frames = dict(segment["frames"])
+        overlap_frames = {i: d for i, d in cur_frames.items() if i in prev_frames}
+
+        mapping, team_pairs = _match_tracks(prev_frames, overlap_frames)
+        flip = n > 0 and not fixed_teams and _should_flip(team_pairs, prev_centers, segment["start_centers"])
+
+        for track_id in sorted({d["track_id"] for dets in cur_frames.values() for d in dets}):
+            if track_id not in mapping:
+                mapping[track_id] = next_id
+                next_id += 1
+
+        remapped = {}
+        for index in sorted(cur_frames):
+            remapped[index] = [
+                dict(d, track_id=mapping[d["track_id"]],
+                     team=(1 - d["team"]) if flip and d["team"] in (0, 1) else d["team"])
+                for d in cur_frames[index]
+            ]
+            if index not in prev_frames:
+                yield index, remapped[index]
+
+        centers = segment["end_centers"]
+        if flip and centers is not None:
+            centers = centers[::-1]
+        prev_frames = {i: remapped[i] for i in sorted(remapped)[-overlap:]} if overlap else {}
+        prev_centers = centers if centers is not None else prev_centers
+
+
+def _segment_starts(total_frames: int, segment_frames: int, overlap: int, fps: int,
+                    keyframes_near=None):
+    """
+    1-based index of the first frame each segment keeps.
+
+    Segments are decoded from `overlap` frames before their start. With
+    `keyframes_near` (a function from a time to the keyframe timestamps
+    around it, in seconds), each boundary is moved to the nearest keyframe
+    within half a segment so that decoding starts right at it, instead of
+    decoding and discarding most of a GOP to reach an arbitrary seek point.
+    """
+    starts = [1]
+    target = segment_frames + 1
+    while target <= total_frames:
+        start = target
+        keyframes = np.asarray(
+            keyframes_near((target - overlap - 1) / fps) if keyframes_near else [], dtype=float
+        )
+        if keyframes.size:
+            # Keyframe closest to where this segment's decode would begin
+            decode_time = (target - overlap - 1) / fps
+            keyframe = keyframes[np.argmin(np.abs(keyframes - decode_time))]
+            snapped = math.ceil(keyframe * fps - 1e-6) + 1 + overlap
+            if abs(snapped - target) <= segment_frames // 2 and snapped > starts[-1] + overlap:
+                start = snapped
+        if start > total_frames:
+            break
+        starts.append(start)
+        target = start + segment_frames
+    return starts
+
+
+def process_pipeline_parallel(video_path: Path, writer, fps: int = 7,
+                              workers: int = None, segment_seconds: float = 60,
+                              overlap: int = 7, progress: ProgressReporter = None,
+                              metadata: dict = None, decode_options: dict = None,
+                              team_model=None, **detect_options):
+    """
+    Track a video by splitting it into time segments processed in parallel.
+
+    Each segment is decoded, tracked and team-clustered in its own worker
+    process. Segments start `overlap` sampled frames early so their tracks
+    can be matched to the previous segment by box IoU; matched tracks keep
+    one ID and team labels are reoriented to agree across boundaries.
+
+    Args:
+        video_path: Path to the video file
+        writer: Detections writer from `services.detections_store.open_writer`
+        fps: Sampling rate
+        workers: Number of worker processes (defaults to the CPU count)
+        segment_seconds: Length of each segment, rounded to whole frames
+            (boundaries move to nearby keyframes when they are known)
+        overlap: Number of sampled frames shared by adjacent segments
+        progress: Optional reporter; workers report into the same job
+        metadata: Stored video metadata (see `services.video_metadata`);
+            saves probing the video again
+        decode_options: Crop, scale and decoder-thread options for
+            `services.frame_extract.iter_frames`; decoder threads default to
+            each worker's share of the CPUs
+        team_model: Fitted `TeamColorModel` shared by all segments, so
+            team labels agree without reorienting them
+        **detect_options: Batching and striding options for `track_frames`
+    """
+    progress = progress or ProgressReporter()
+    workers = workers or os.cpu_count() or 1
+    segment_frames = max(1, round(segment_seconds * fps))
+    duration = metadata["duration"] if metadata and metadata.get("duration") else probe_duration(video_path)
+    size = (metadata["width"], metadata["height"]) if metadata else probe_frame_size(video_path)
+    total_frames = math.ceil(duration * fps)
+    # Keyframes are only probed in a short window around each boundary
+    window = min(segment_seconds / 2, KEYFRAME_WINDOW)
+
+    def keyframes_near(t):
+        try:
+            return probe_keyframes(video_path, t - window, 2 * window)
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            print(f"Could not probe keyframes of {video_path} near {t:.1f}s: {e}")
+            return []
+
+    starts = _segment_starts(total_frames, segment_frames, overlap, fps, keyframes_near)
+    n_segments = len(starts)
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    decode_options = dict(decode_options or {}, size=size)
+    decode_options["threads"] = decode_options.get("threads") or threads
+
+    tasks = []
+    for n, start in enumerate(starts):
+        lead = overlap if n > 0 else 0
+        first_index = start - lead
+        last = n == n_segments - 1
+        n_frames = None if last else starts[n + 1] - first_index
+        tasks.append((str(video_path), fps, first_index, n_frames, lead,
+                      progress.job_id, detect_options, decode_options, team_model))
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, n_segments), mp_context=context,
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        # Results arrive in segment order; each is stitched and written as
+        # soon as it and the ones before it are done, then dropped
+        segments = pool.map(_track_segment, *zip(*tasks))
+        for index, detections in _stitch(segments, overlap, fixed_teams=team_model is not None):
+            with progress.timed("serialize", frames=1):
+                writer.add(index, detections)
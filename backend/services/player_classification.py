@@ -72,6 +72,136 @@ def get_player_color(frame, box):
     
     return dominant_color_bgr
 
+
+def get_player_colors(frame, boxes):
+    """
+    Batched version of `get_player_color` for all boxes of a frame.
+
+    The jersey regions of all boxes are packed into one mosaic, so the HSV
+    conversion, masks, morphology, hue histograms and color means each run
+    once per frame instead of once per box. Results match `get_player_color`.
+
+    Args:
+        frame: BGR image (numpy array)
+        boxes: (N, 4) array of x1, y1, x2, y2 boxes
+
+    Returns:
+        tuple: (colors, valid) where colors is an (N, 3) uint8 BGR array and
+        valid is an (N,) bool mask of boxes with a usable jersey color
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    n = len(boxes)
+    colors = np.zeros((n, 3), dtype=np.uint8)
+    valid = np.zeros(n, dtype=bool)
+    if n == 0:
+        return colors, valid
+
+    # Same crop arithmetic as get_player_color, clipped to the frame
+    frame_h, frame_w = frame.shape[:2]
+    b = boxes.astype(int)
+    x1 = np.clip(b[:, 0], 0, frame_w)
+    y1 = np.clip(b[:, 1], 0, frame_h)
+    x2 = np.clip(b[:, 2], x1, frame_w)
+    y2 = np.clip(b[:, 3], y1, frame_h)
+    h = y2 - y1
+    w = x2 - x1
+    jy1 = y1 + (h * 0.25).astype(int)
+    jy2 = y1 + (h * 0.6).astype(int)
+    jx1 = x1 + (w * 0.3).astype(int)
+    jx2 = x1 + (w * 0.7).astype(int)
+
+    candidates = np.where((jy2 > jy1) & (jx2 > jx1))[0]
+    if len(candidates) == 0:
+        return colors, valid
+
+    # Pack all jersey crops side by side into one mosaic, separated by a
+    # one-pixel gap, so conversion, masks and morphology run once for all
+    crop_h = jy2[candidates] - jy1[candidates]
+    crop_w = jx2[candidates] - jx1[candidates]
+    offsets = np.concatenate([[0], np.cumsum(crop_w + 1)[:-1]])
+    mosaic = np.zeros((crop_h.max() + 1, offsets[-1] + crop_w[-1] + 1, 3), dtype=np.uint8)
+    owner = np.full(mosaic.shape[:2], -1)
+    for i, ox, ch, cw in zip(candidates, offsets, crop_h, crop_w):
+        mosaic[:ch, ox:ox + cw] = frame[jy1[i]:jy2[i], jx1[i]:jx2[i]]
+        owner[:ch, ox:ox + cw] = i
+    gap = owner < 0
+
+    hsv = cv2.cvtColor(mosaic, cv2.COLOR_BGR2HSV)
+    h_img, s_img, v_img = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    # Multi-stage filtering, same thresholds as get_player_color
+    saturation_mask = s_img > 45
+    brightness_mask = (v_img > 40) & (v_img < 230)
+    grass_mask = (h_img >= 40) & (h_img <= 100) & (s_img < 50)
+    skin_mask = (
+        ((h_img <= 25) | (h_img >= 155)) &
+        (s_img < 70) &
+        (v_img > 60) &
+        (v_img < 200)
+    )
+    combined_mask = saturation_mask & brightness_mask & ~grass_mask & ~skin_mask & ~gap
+
+    filtered_counts = np.bincount(owner[combined_mask], minlength=n)
+
+    # Morphological cleaning. The gap pixels stand in for the image border
+    # of a per-crop pass: 1 while eroding and 0 while dilating leaves crop
+    # edges untouched, exactly like OpenCV's default border handling.
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    mask_2d = combined_mask.astype(np.uint8)
+    mask_2d[gap] = 1
+    mask_2d = cv2.erode(mask_2d, kernel)
+    mask_2d[gap] = 0
+    mask_2d = cv2.dilate(mask_2d, kernel)   # open
+    mask_2d[gap] = 0
+    mask_2d = cv2.dilate(mask_2d, kernel)
+    mask_2d[gap] = 1
+    mask_2d = cv2.erode(mask_2d, kernel)    # close
+    cleaned_mask = mask_2d.astype(bool) & ~gap
+
+    cleaned_counts = np.bincount(owner[cleaned_mask], minlength=n)
+    valid = filtered_counts >= 15
+    use_cleaned = cleaned_counts >= 10
+    if not valid.any():
+        return colors, valid
+
+    # Per crop, keep cleaned pixels, or all filtered pixels if cleaning
+    # removed too much
+    pixel_mask = np.where(use_cleaned[np.maximum(owner, 0)], cleaned_mask, combined_mask)
+    pixel_mask &= valid[np.maximum(owner, 0)] & ~gap
+    pixels = hsv[pixel_mask]
+    owners = owner[pixel_mask]
+    hues = pixels[:, 0].astype(int)
+
+    # Dominant hue per crop from a 36-bin histogram of every crop at once
+    hue_bins = np.minimum(hues // 5, 35)
+    hist = np.bincount(owners * 36 + hue_bins, minlength=n * 36).reshape(n, 36)
+    dominant_hue = np.argmax(hist, axis=1) * 5
+
+    # Mean color of the pixels close to the dominant hue, per crop
+    hue_tolerance = 15
+    in_group = np.abs(hues - dominant_hue[owners]) <= hue_tolerance
+    all_counts = np.bincount(owners, minlength=n)
+    group_counts = np.bincount(owners, weights=in_group, minlength=n)
+    all_sums = np.stack([
+        np.bincount(owners, weights=pixels[:, c], minlength=n) for c in range(3)
+    ], axis=1)
+    group_sums = np.stack([
+        np.bincount(owners, weights=pixels[:, c] * in_group, minlength=n)
+        for c in range(3)
+    ], axis=1)
+
+    use_group = group_counts >= 5
+    counts = np.where(use_group, group_counts, all_counts)
+    sums = np.where(use_group[:, None], group_sums, all_sums)
+    dominant_color_hsv = sums[valid] / counts[valid][:, None]
+
+    # Convert back to BGR for compatibility with detection.py
+    dominant_color_hsv = dominant_color_hsv.astype(np.uint8)[:, None, :]
+    colors[valid] = cv2.cvtColor(dominant_color_hsv, cv2.COLOR_HSV2BGR)[:, 0, :]
+
+    return colors, valid
+
+
 def cluster_players(colors, prev_team_centers=None):
     """
     Cluster player colors into 2 teams with frame-to-frame consistency.
@@ -135,6 +265,382 @@ def cluster_players(colors, prev_team_centers=None):
     return labels.tolist(), kmeans.cluster_centers_
 
 
+class TeamClusterer:
+    """
+    Streaming two-team assignment that carries its centers across frames.
+
+    Each frame warm-starts 2-means from the previous centers and runs a few
+    closed-form nearest-center/mean updates, so label orientation is kept
+    without flipping. A full KMeans refit only happens on the first frame or
+    when drift is detected: the centers collapse, or the mean distance to the
+    assigned center jumps past `drift_ratio` times its running average.
+    Frames with fewer than `min_refit` players neither move nor refit the
+    centers; they are only labelled against them.
+    """
+
+    def __init__(self, max_iter: int = 5, drift_ratio: float = 2.0,
+                 min_separation: float = 20.0, smoothing: float = 0.5,
+                 min_refit: int = 6):
+        self.max_iter = max_iter
+        self.drift_ratio = drift_ratio
+        self.min_separation = min_separation
+        self.smoothing = smoothing
+        self.min_refit = min_refit
+        self.centers = None
+        self.refits = 0
+        self._spread = None  # running mean distance to assigned center
+        self._reference = None  # centers before the last reset
+
+    def reset(self):
+        """
+        Forget the current centers, e.g. after a hard scene cut.
+
+        The next frame refits from scratch; the old centers are only kept
+        to orient the new ones, so team labels stay the same across shots.
+        """
+        if self.centers is not None:
+            self._reference = self.centers
+        self.centers = None
+        self._spread = None
+
+    def state(self) -> dict:
+        """
+        JSON-serializable centers, to carry team orientation over a resumed
+        run (see `load_state`).
+        """
+        return {
+            "centers": self.centers.tolist() if self.centers is not None else None,
+            "spread": float(self._spread) if self._spread is not None else None,
+        }
+
+    def load_state(self, state: dict):
+        """
+        Continue from centers saved with `state`.
+        """
+        centers = state.get("centers")
+        self.centers = np.asarray(centers, dtype=float) if centers is not None else None
+        self._spread = state.get("spread")
+
+    @staticmethod
+    def _nearest(colors, centers):
+        distances = np.linalg.norm(colors[:, None, :] - centers[None, :, :], axis=2)
+        labels = np.argmin(distances, axis=1)
+        return labels, distances[np.arange(len(colors)), labels]
+
+    def _refit(self, colors):
+        kmeans = KMeans(n_clusters=2, n_init=10, max_iter=300, random_state=42)
+        kmeans.fit(colors)
+        centers = kmeans.cluster_centers_
+        # Keep team orientation from the previous centers
+        reference = self.centers if self.centers is not None else self._reference
+        if reference is not None:
+            flip = (
+                np.linalg.norm(centers[0] - reference[1])
+                + np.linalg.norm(centers[1] - reference[0])
+                < np.linalg.norm(centers[0] - reference[0])
+                + np.linalg.norm(centers[1] - reference[1])
+            )
+            if flip:
+                centers = centers[::-1]
+        self.refits += 1
+        return centers
+
+    def _warm_start(self, colors):
+        # Teams missing from this frame keep their previous center
+        centers = self.centers.copy()
+        labels = None
+        for _ in range(self.max_iter):
+            new_labels, _ = self._nearest(colors, centers)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            for team in (0, 1):
+                members = colors[labels == team]
+                if len(members):
+                    centers[team] = members.mean(axis=0)
+        return centers
+
+    def assign(self, colors):
+        """
+        Assign each color to a team.
+
+        Args:
+            colors: Array of player colors
+
+        Returns:
+            tuple: (team_labels, team_centers) like `cluster_players`
+        """
+        colors = np.asarray(colors, dtype=float).reshape(-1, 3)
+        enough = len(colors) >= self.min_refit
+        if self.centers is None and len(colors) < 2:
+            return [0] * len(colors), None
+        if len(colors) == 0:
+            return [], self.centers.copy()
+
+        # Same outlier filtering as cluster_players
+        median_color = np.median(colors, axis=0)
+        distances = np.linalg.norm(colors - median_color, axis=1)
+        valid_mask = distances <= (np.median(distances) + 2 * np.std(distances))
+        if valid_mask.sum() < max(2, len(colors) // 2):
+            valid_mask[:] = True
+        valid_colors = colors[valid_mask]
+
+        if self.centers is None:
+            centers = self._refit(valid_colors)
+        elif not enough:
+            centers = self.centers
+        else:
+            centers = self._warm_start(valid_colors)
+            _, spread = self._nearest(valid_colors, centers)
+            drifted = (
+                np.linalg.norm(centers[0] - centers[1]) < self.min_separation
+                or (self._spread is not None and spread.mean() > self.drift_ratio * self._spread)
+            )
+            if drifted:
+                centers = self._refit(valid_colors)
+            else:
+                centers = (1 - self.smoothing) * self.centers + self.smoothing * centers
+
+        labels, spread = self._nearest(colors, centers)
+        spread = spread[valid_mask].mean()
+        if self._spread is None:
+            self._spread = spread
+        elif enough:
+            self._spread = 0.9 * self._spread + 0.1 * spread
+
+        self.centers = centers
+        return labels.tolist(), centers.copy()
+
+
+# Team label for players that match neither team (officials, staff, ...)
+OTHER_TEAM = 2
+
+
+class TeamColorModel:
+    """
+    Per-video team colors, fitted once from jersey colors sampled across the
+    whole video and then used for a nearest-center lookup on every frame.
+
+    The samples are split into two teams with 2-means, and separately into
+    `n_clusters` finer prototypes (a team under sun and shade can need
+    several). Each prototype belongs to the team most of its samples went
+    to, except small clusters (under `other_share` of the samples) whose
+    color differs from that team's by more than lighting would explain
+    (hue angle above `max_angle` degrees or brightness outside
+    `brightness_range`); those form the "other" class (officials). Colors
+    further than `radius_scale` times their prototype's 95th percentile
+    spread (at least `min_radius`) are also labelled "other".
+
+    Has the same `assign` / `centers` / `reset` interface as `TeamClusterer`,
+    so it can be passed wherever a clusterer is expected. Labels never flip,
+    and frames with few or unusual players can't move the centers.
+    """
+
+    def __init__(self, n_clusters: int = 6, other_share: float = 0.15,
+                 max_angle: float = 12.0, brightness_range=(0.6, 1.6),
+                 radius_scale: float = 1.5, min_radius: float = 20.0,
+                 min_samples: int = 20):
+        self.n_clusters = n_clusters
+        self.other_share = other_share
+        self.max_angle = max_angle
+        self.brightness_range = brightness_range
+        self.radius_scale = radius_scale
+        self.min_radius = min_radius
+        self.min_samples = min_samples
+        self.centers = None      # (2, 3) team centers, team 0 first
+        self.prototypes = None   # (K, 3) cluster centers
+        self.labels = None       # (K,) team label of each prototype
+        self.radii = None        # (K,) "other" threshold per prototype
+
+    def fit(self, colors):
+        """
+        Fit team colors from sampled jersey colors.
+
+        Args:
+            colors: (N, 3) array of BGR jersey colors from many frames
+
+        Returns:
+            self
+
+        Raises:
+            ValueError: If there are fewer than `min_samples` colors, or
+                fewer than two distinct ones
+        """
+        colors = np.asarray(colors, dtype=float).reshape(-1, 3)
+        if len(colors) < self.min_samples:
+            raise ValueError(f"Need at least {self.min_samples} jersey colors, got {len(colors)}")
+        distinct = len(np.unique(colors, axis=0))
+        if distinct < 2:
+            raise ValueError("Need at least two distinct jersey colors")
+
+        teams = KMeans(n_clusters=2, n_init=10, random_state=42).fit_predict(colors)
+        if np.sum(teams == 1) > np.sum(teams == 0):
+            teams = 1 - teams  # Larger team is team 0
+
+        # KMeans leaves clusters empty when there are fewer distinct colors
+        # than clusters; drop any that still end up empty
+        n_clusters = min(self.n_clusters, distinct)
+        kmeans = KMeans(n_clusters=n_clusters, n_init=10, max_iter=300, random_state=42)
+        assignment = kmeans.fit_predict(colors)
+        used = np.flatnonzero(np.bincount(assignment, minlength=n_clusters))
+        prototypes = kmeans.cluster_centers_[used]
+        assignment = np.searchsorted(used, assignment)
+        n_clusters = len(used)
+
+        team_centers = np.array([colors[teams == team].mean(axis=0) for team in (0, 1)])
+        labels = np.zeros(n_clusters, dtype=int)
+        radii = np.zeros(n_clusters)
+        for k in range(n_clusters):
+            members = assignment == k
+            labels[k] = np.bincount(teams[members], minlength=2).argmax()
+            if members.mean() < self.other_share and not self._same_color(prototypes[k], team_centers[labels[k]]):
+                labels[k] = OTHER_TEAM
+            spread = np.linalg.norm(colors[members] - prototypes[k], axis=1)
+            radii[k] = max(self.radius_scale * np.percentile(spread, 95), self.min_radius)
+
+        # Team centers without the samples that turned out to be "other"
+        sample_labels = labels[assignment]
+        self.centers = np.array([
+            colors[sample_labels == team].mean(axis=0) if np.any(sample_labels == team)
+            else team_centers[team]
+            for team in (0, 1)
+        ])
+        self.prototypes = prototypes
+        self.labels = labels
+        self.radii = radii
+        return self
+
+    def _same_color(self, color, reference) -> bool:
+        """
+        Whether `color` is `reference` under different lighting.
+        """
+        norm, reference_norm = np.linalg.norm(color), np.linalg.norm(reference)
+        if norm == 0 or reference_norm == 0:
+            return norm == reference_norm
+        cos = np.clip(np.dot(color, reference) / (norm * reference_norm), -1.0, 1.0)
+        low, high = self.brightness_range
+        return np.degrees(np.arccos(cos)) <= self.max_angle and low <= norm / reference_norm <= high
+
+    def reset(self):
+        """
+        No-op: the fitted colors hold for the whole video.
+        """
+
+    def assign(self, colors):
+        """
+        Label each color with the team of its nearest prototype.
+
+        Args:
+            colors: Array of player colors
+
+        Returns:
+            tuple: (team_labels, team_centers) like `TeamClusterer.assign`;
+            labels are 0, 1 or `OTHER_TEAM`
+        """
+        colors = np.asarray(colors, dtype=float).reshape(-1, 3)
+        if len(colors) == 0:
+            return [], self.centers.copy()
+        distances = np.linalg.norm(colors[:, None, :] - self.prototypes[None, :, :], axis=2)
+        nearest = np.argmin(distances, axis=1)
+        labels = self.labels[nearest].copy()
+        outside = distances[np.arange(len(colors)), nearest] > self.radii[nearest]
+        labels[outside] = OTHER_TEAM
+        return labels.tolist(), self.centers.copy()
+
+
+class TrackColorCache:
+    """
+    Jersey colors cached per ByteTrack ID.
+
+    A track's color is extracted when the track first appears and refreshed
+    every `refresh_every` frames after that, blending the new sample into the
+    cached one with an exponential moving average. Teams are not cached: the
+    clusterer assigns them from these colors on every frame, so labels follow
+    its centers. Tracks not seen for `max_age` frames (ByteTrack's
+    `track_buffer`) are evicted.
+    """
+
+    def __init__(self, refresh_every: int = 10, alpha: float = 0.3, max_age: int = 75):
+        self.refresh_every = refresh_every
+        self.alpha = alpha
+        self.max_age = max_age
+        self.colors = {}         # track_id -> BGR color (float)
+        self._last_sampled = {}  # track_id -> frame of last extraction attempt
+        self._last_seen = {}     # track_id -> frame the track was last seen
+
+    def stale(self, frame_index, track_ids):
+        """
+        Mask of tracks that need a color extraction on this frame.
+        """
+        return np.array([
+            frame_index - self._last_sampled.get(int(tid), -self.refresh_every)
+            >= self.refresh_every
+            for tid in track_ids
+        ], dtype=bool)
+
+    def update(self, frame_index, track_ids, colors, valid):
+        """
+        Record freshly extracted colors for `track_ids`.
+
+        Tracks whose extraction failed (`valid` False) keep their previous
+        color and are retried after `refresh_every` frames.
+        """
+        for tid, color, ok in zip(track_ids, colors, valid):
+            tid = int(tid)
+            self._last_sampled[tid] = frame_index
+            if not ok:
+                continue
+            color = np.asarray(color, dtype=float)
+            if tid in self.colors:
+                color = (1 - self.alpha) * self.colors[tid] + self.alpha * color
+            self.colors[tid] = color
+
+    def lookup(self, frame_index, track_ids):
+        """
+        Cached colors for `track_ids`, marking them as seen on this frame.
+
+        Returns:
+            tuple: (colors, valid) as returned by `get_player_colors`
+        """
+        colors = np.zeros((len(track_ids), 3))
+        valid = np.zeros(len(track_ids), dtype=bool)
+        for i, tid in enumerate(track_ids):
+            tid = int(tid)
+            self._last_seen[tid] = frame_index
+            if tid in self.colors:
+                colors[i] = self.colors[tid]
+                valid[i] = True
+        return colors, valid
+
+    def evict(self, frame_index):
+        """
+        Drop tracks that have not been seen for more than `max_age` frames.
+        """
+        dead = [
+            tid for tid, seen in self._last_seen.items()
+            if frame_index - seen > self.max_age
+        ]
+        for tid in dead:
+            self._last_seen.pop(tid, None)
+            self._last_sampled.pop(tid, None)
+            self.colors.pop(tid, None)
+
+    def colors_for(self, frame, frame_index, boxes, track_ids):
+        """
+        Colors for the boxes of a frame, extracting only stale tracks.
+
+        Returns:
+            tuple: (colors, valid) as returned by `get_player_colors`
+        """
+        stale = self.stale(frame_index, track_ids)
+        if stale.any():
+            fresh, ok = get_player_colors(frame, np.asarray(boxes)[stale])
+            self.update(frame_index, np.asarray(track_ids)[stale], fresh, ok)
+        colors, valid = self.lookup(frame_index, track_ids)
+        self.evict(frame_index)
+        return colors, valid
+
+
 def assign_team_colors(frame, detections, track_colors=None):
     """
     Extract colors for all players in frame and assign teams.
@@ -142,7 +648,8 @@ def assign_team_colors(frame, detections, track_colors=None):
     Args:
         frame: Image frame (numpy array)
         detections: List of dicts with keys: x1, y1, x2, y2, track_id
-        track_colors: Optional dict to cache colors by track_id
+        track_colors: Optional dict to cache colors by track_id. Cached
+            tracks skip color extraction; new colors are stored in it.
     
     Returns:
         Dictionary mapping track_id to team (0 or 1)
@@ -152,19 +659,25 @@ def assign_team_colors(frame, detections, track_colors=None):
     
     # Extract color for each detection
     for det in detections:
-        box = [det["x1"], det["y1"], det["x2"], det["y2"]]
-        color = get_player_color(frame, box)
+        track_id = int(det["track_id"])
+        if track_colors is not None and track_id in track_colors:
+            color = track_colors[track_id]
+        else:
+            box = [det["x1"], det["y1"], det["x2"], det["y2"]]
+            color = get_player_color(frame, box)
+            if color is not None and track_colors is not None:
+                track_colors[track_id] = color
         
         if color is not None:
             colors.append(color)
-            track_ids.append(int(det["track_id"]))
+            track_ids.append(track_id)
     
     if len(colors) < 2:
         # Not enough players to cluster
         return {tid: 0 for tid in track_ids}
     
     # Cluster colors into 2 teams
-    team_labels = cluster_players(np.array(colors))
+    team_labels, _ = cluster_players(np.array(colors))
     
     # Create mapping of track_id to team
     team_assignment = {
@@ -209,7 +722,7 @@ def assign_teams_frame_batch(frame, detections_list):
     
     # Cluster into teams
     colors_array = np.array(colors)
-    team_labels = cluster_players(colors_array)
+    team_labels, _ = cluster_players(colors_array)
     
     # Create team mapping
     team_map = {
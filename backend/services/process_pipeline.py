@@ -1,13 +1,254 @@
 from pathlib import Path
-from services.frame_extract import extract_frames
-from services.detection import run_yolo
+from typing import Optional
+from services.frame_extract import (
+    extract_frames, frame_geometry, iter_frames, probe_duration, probe_frame_size
+)
+from services.detection import (
+    DETECT_ARGS, TRACKER_CONFIG, WEIGHTS, fit_team_model, run_yolo, run_yolo_stream
+)
+from services.detections_store import detections_path, open_writer
+from services.frame_store import (
+    FrameStoreWriter, build_frame_store, fits_frame_store, frame_store_path,
+    open_frame_store, store_frames
+)
+from services.player_classification import TeamClusterer
+from services.parallel_pipeline import process_pipeline_parallel
+from services.progress import ProgressReporter
+from services.render import render_path, render_video
+from services.scene_filter import SceneFilter
+from services.result_cache import cache_key, result_cache
+from services.track_analytics import precompute_analytics
+from services.upload_catalog import derived_paths, upload_catalog
+from services.video_metadata import estimate_frames, metadata_store
 
-def process_pipeline(video_id: str):
+
+def _cache_key(video_path: Path, video_hash: Optional[str], fps: int, workers: int,
+               segment_seconds: float, output_format: str, striding: dict,
+               decode: dict, team_samples: Optional[int]) -> str:
+    """
+    Key of the pipeline output for this video content and configuration.
+    """
+    return cache_key(
+        # Uploads are hashed while they are written; hash older files here
+        video=video_hash or result_cache.file_hash(video_path),
+        fps=fps,
+        weights=result_cache.file_hash(Path(WEIGHTS)),
+        tracker=result_cache.file_hash(Path(TRACKER_CONFIG)),
+        detect_args=DETECT_ARGS,
+        # Segmented runs stitch tracks at segment boundaries
+        segment_seconds=segment_seconds if workers > 1 else None,
+        output_format=output_format,
+        striding=striding,
+        decode=decode,
+        team_samples=team_samples,
+    )
+
+
+def _team_sampling(team_samples: int, use_store: bool):
+    # Runs with a frame store sample team colors from its 7 fps frames,
+    # which differ from the frames decoded at `team_samples / duration` fps
+    return dict(samples=team_samples, source="frame_store") if use_store else team_samples
+
+
+def _store_writer(path: Path, video_hash: str, crop, max_side: int, size) -> FrameStoreWriter:
+    return FrameStoreWriter(path, fps=7, meta=dict(
+        video=video_hash, crop=crop, max_side=max_side, source_size=size
+    ))
+
+
+def process_pipeline(video_id: str, stream: bool = True, workers: int = 1,
+                     segment_seconds: float = 60, output_format: str = "columnar",
+                     use_cache: bool = True, batch_size: int = 8, stride: int = 1,
+                     adaptive_stride: bool = False, max_stride: int = 8,
+                     render: bool = False, decode_size: Optional[int] = None,
+                     decode_threads: int = 0, crop: Optional[dict] = None,
+                     team_model: bool = False, team_samples: int = 48,
+                     skip_scenes: bool = False, frame_store: bool = False,
+                     job_id: Optional[str] = None):
+    """
+    Run frame extraction and player tracking for an uploaded video.
+
+    Args:
+        video_id: Name of the uploaded video file
+        stream: Decode frames in memory and feed them straight to the
+            tracker. When False, frames are written to `frames/{video_id}`
+            as JPEGs first.
+        workers: When greater than 1, split the video into
+            `segment_seconds` long segments and process them in that many
+            worker processes (implies streaming)
+        segment_seconds: Segment length for parallel processing
+        output_format: "columnar" writes `detections/{video_id}/` as column
+            chunks (see `services.detections_store`), "jsonl" writes
+            `detections/{video_id}.jsonl` one frame per line, "json" writes
+            the legacy `detections/{video_id}.json`. In streaming mode
+            columnar and JSON Lines output is checkpointed, and a re-run of
+            an interrupted job with the same settings resumes after the last
+            checkpointed frame.
+        use_cache: Reuse the output of an earlier run on the same video
+            content with the same settings (see `services.result_cache`)
+        batch_size: Number of frames per model call
+        stride: Run the model on every `stride`-th sampled frame and
+            interpolate boxes in between (streaming and parallel modes)
+        adaptive_stride: Vary the stride between `stride` and `max_stride`
+            with how fast players move
+        max_stride: Largest stride used when adaptive
+        render: Also write an annotated MP4 to `renders/` (see
+            `services.render`)
+        decode_size: Scale decoded frames so their longer side is at most
+            this many pixels (e.g. the model's 640) inside ffmpeg; boxes are
+            still reported in source pixels (streaming and parallel modes)
+        decode_threads: ffmpeg decoder threads (0: ffmpeg's default, or
+            each worker's share of the CPUs in parallel mode)
+        crop: Region (x, y, width, height) of the video to decode, e.g. to
+            skip broadcast overlays; nothing outside it is detected
+        team_model: Fit team colors once from `team_samples` frames spread
+            over the video and label players by nearest team color (with an
+            "other" class for officials) instead of clustering per frame
+        team_samples: Number of frames sampled for the team color model
+        skip_scenes: Classify frames before detection (see
+            `services.scene_filter`): skip crowd shots, close-ups and ads,
+            detect static stretches sparsely, and restart tracking at hard
+            cuts (streaming and parallel modes)
+        frame_store: Keep the decoded frames in a memory-mapped file under
+            `frame_store/{video_id}/` (see `services.frame_store`) and read
+            them from there instead of decoding on later runs with the same
+            decode settings (single-process streaming mode). Frames are
+            stored at most `decode_size` (default: the model's input size)
+            pixels on their longer side; with `team_model`, team colors are
+            sampled from the stored frames.
+        job_id: Job to report progress for (see `services.progress`)
+    """
     print(video_id)
     video_path = Path("uploads") / video_id
     frames_dir = Path("frames") / video_id
-    detections_path = Path("detections") / f"{video_id}.json"
+    output_path = detections_path(video_id, output_format)
+
+    progress = ProgressReporter(job_id, reset=True)
+    metadata = metadata_store.get(video_id) or {}
+    size = (metadata["width"], metadata["height"]) if metadata else None
+
+    striding = dict(stride=stride, adaptive_stride=adaptive_stride, max_stride=max_stride)
+    # Parallel segments each get their own copy of the scene filter
+    scene_filter = SceneFilter() if skip_scenes else None
+    detect_options = dict(batch_size=batch_size, scene_filter=scene_filter, **striding)
+    crop = (crop["x"], crop["y"], crop["width"], crop["height"]) if crop else None
+    use_store = frame_store and stream and workers <= 1
+    if use_store and not decode_size:
+        # Store frames at inference resolution, not full source frames
+        decode_size = DETECT_ARGS["imgsz"]
+    decode = dict(crop=crop, max_side=decode_size)
+
+    progress.set_stage("cache")
+    with progress.timed("cache"):
+        key = _cache_key(video_path, metadata.get("sha256"), 7, workers,
+                         segment_seconds, output_format,
+                         dict(striding, skip_scenes=skip_scenes) if skip_scenes else striding,
+                         decode if workers > 1 or stream else None,
+                         _team_sampling(team_samples, use_store) if team_model else None)
+    cached = use_cache and result_cache.restore(key, output_path)
+    total_frames = estimate_frames(metadata, fps=7)
+
+    if cached:
+        print(f"Reused cached results for {video_id}")
+    else:
+        store = store_path = video_hash = None
+        if use_store:
+            video_hash = metadata.get("sha256") or result_cache.file_hash(video_path)
+            store_path = frame_store_path(video_id, video_hash, 7, crop, decode_size)
+            store = open_frame_store(store_path, video_hash)
+            size = size or probe_frame_size(video_path)
+            out_size, _, _ = frame_geometry(size, crop, decode_size)
+            if store is None and not fits_frame_store(out_size, total_frames):
+                print(f"Not storing frames of {video_id}: larger than FRAME_STORE_MAX_BYTES")
+                store_path = None
+            elif store is None and team_model:
+                # The team model samples from the store, so build it first
+                progress.set_stage("extract", total_frames)
+                with progress.timed("extract", frames=total_frames or 0):
+                    frames = iter_frames(video_path, fps=7, size=size,
+                                         threads=decode_threads, **decode)
+                    store = build_frame_store(frames, _store_writer(
+                        store_path, video_hash, crop, decode_size, size
+                    ))
+
+        clusterer = None
+        if team_model:
+            progress.set_stage("sample")
+            with progress.timed("sample"):
+                duration = metadata.get("duration") or probe_duration(video_path)
+                sample_decode = dict(decode, threads=decode_threads) if workers > 1 or stream else {}
+                clusterer = fit_team_model(video_path, duration, samples=team_samples,
+                                           batch_size=batch_size, size=size,
+                                           frames=store.sample(team_samples) if store else None,
+                                           **sample_decode)
+
+        # Only the single-process streaming run can pick up mid-video
+        resumable = workers <= 1 and stream
+        writer = open_writer(output_path, output_format, fps=7,
+                             resume_key=key if resumable else None)
+
+        if workers > 1:
+            progress.set_stage("detect", total_frames)
+            process_pipeline_parallel(
+                video_path, writer, fps=7,
+                workers=workers, segment_seconds=segment_seconds,
+                progress=progress, metadata=metadata or None,
+                decode_options=dict(decode, threads=decode_threads),
+                team_model=clusterer, **detect_options
+            )
+        elif stream:
+            progress.set_stage("detect", total_frames)
+            if clusterer is None:
+                # Per-frame clustering: checkpoint its centers so a resumed
+                # run keeps the team orientation
+                clusterer = TeamClusterer()
+                writer.state_fn = clusterer.state
+                if writer.resume_state:
+                    clusterer.load_state(writer.resume_state)
+            start_index = writer.resume_frame
+            if start_index > 1:
+                print(f"Resuming {video_id} at frame {start_index}")
+                progress.advance(start_index - 1)
+            size = size or probe_frame_size(video_path)
+            _, scale, offset = frame_geometry(size, crop, decode_size)
+            if store is not None:
+                print(f"Reading frames of {video_id} from {store.path}")
+                frames = store.iter_frames(start_index)
+            else:
+                frames = iter_frames(video_path, fps=7, size=size, threads=decode_threads,
+                                     start=(start_index - 1) / 7 if start_index > 1 else None,
+                                     **decode)
+                if store_path is not None and start_index == 1:
+                    frames = store_frames(frames, _store_writer(
+                        store_path, video_hash, crop, decode_size, size
+                    ))
+            run_yolo_stream(frames, writer, progress, geometry=(scale, offset),
+                            clusterer=clusterer, start_index=start_index,
+                            **detect_options)
+            if scene_filter is not None:
+                print(f"Scenes in {video_id}: {scene_filter.summary()}")
+        else:
+            progress.set_stage("extract", total_frames)
+            with progress.timed("extract", frames=total_frames or 0):
+                extract_frames(video_path, frames_dir, fps=7)
+            progress.set_stage("detect")
+            run_yolo(frames_dir, writer, progress, batch_size=batch_size, clusterer=clusterer)
+
+        progress.set_stage("serialize")
+        with progress.timed("serialize"):
+            writer.close()
+        result_cache.store(key, output_path)
+
+    # Precompute the aggregates `VideoAnalysisService.analyze_video` serves
+    progress.set_stage("analytics")
+    with progress.timed("analytics"):
+        precompute_analytics(video_id, output_path, output_format, fps=7)
 
-    extract_frames(video_path, frames_dir, fps=7)
-    run_yolo(frames_dir, detections_path)
+    if render:
+        progress.set_stage("render")
+        render_video(video_path, output_path, render_path(video_id), fps=7,
+                     progress=progress, size=size)
 
+    # Register what this run left on disk so deleting the upload removes it
+    upload_catalog.record_artifacts(video_id, derived_paths(video_id))
+    progress.flush(force=True)
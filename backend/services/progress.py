@@ -0,0 +1,243 @@
+import time
+from bisect import bisect_left
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.db import DATA_DIR, connect
+
+PROGRESS_DB = DATA_DIR / "jobs.db"
+
+# Upper bounds (seconds) of the per-call stage duration histogram; calls
+# slower than the last bound land in a final +Inf bucket
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_progress (
+    job_id TEXT PRIMARY KEY,
+    stage TEXT,
+    frames_done INTEGER NOT NULL DEFAULT 0,
+    frames_total INTEGER,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_stage_stats (
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL DEFAULT 0,
+    frames INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, stage)
+);
+CREATE TABLE IF NOT EXISTS stage_metrics (
+    stage TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL DEFAULT 0,
+    frames INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS stage_latency (
+    stage TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stage, bucket)
+);
+"""
+
+
+class ProgressReporter:
+    """
+    Reports pipeline progress for a job into the shared status store.
+
+    Counters are buffered in memory and flushed at most every `interval`
+    seconds, so per-frame calls stay cheap. Flushes add to the stored
+    counters, which lets several worker processes report into the same job.
+    With `job_id=None` nothing is stored and the reporter only keeps local
+    totals.
+
+    Stages are "cache" (hashing inputs and result cache lookup), "sample"
+    (fitting the team color model), "extract" (decoding), "filter" (scene
+    classification), "detect" (YOLO inference), "track" (ByteTrack),
+    "classify" (jersey colors), "cluster" (team assignment), "serialize"
+    (writing detections), "analytics" (track analytics) and "render"
+    (annotated video).
+
+    Besides the per-job totals, every timed call is added to service-wide
+    counters and a duration histogram per stage (`stage_metrics`,
+    `stage_latency`), which `services.metrics` exposes for Prometheus.
+    """
+
+    def __init__(self, job_id: Optional[str] = None, db_path: Path = PROGRESS_DB,
+                 interval: float = 1.0, reset: bool = False):
+        self.job_id = job_id
+        self.db_path = db_path
+        self.interval = interval
+        self.stage_seconds = {}
+        self.stage_frames = {}
+        self._frames = 0
+        self._pending_stage = None
+        self._pending_total = None
+        self._pending_seconds = {}
+        self._pending_stage_frames = {}
+        self._pending_calls = {}
+        self._pending_buckets = {}
+        self._last_flush = time.monotonic()
+
+        if self.job_id is not None:
+            with closing(connect(self.db_path)) as conn, conn:
+                conn.executescript(SCHEMA)
+                now = time.time()
+                if reset:
+                    # A re-run of the job (e.g. after a restart) starts over
+                    conn.execute("DELETE FROM job_progress WHERE job_id = ?", (self.job_id,))
+                    conn.execute("DELETE FROM job_stage_stats WHERE job_id = ?", (self.job_id,))
+                conn.execute(
+                    "INSERT OR IGNORE INTO job_progress (job_id, started_at, updated_at)"
+                    " VALUES (?, ?, ?)",
+                    (self.job_id, now, now),
+                )
+
+    def set_stage(self, stage: str, frames_total: Optional[int] = None):
+        """
+        Mark `stage` as the job's current stage.
+        """
+        self._pending_stage = stage
+        if frames_total is not None:
+            self._pending_total = frames_total
+        self.flush(force=True)
+
+    def advance(self, frames: int = 1):
+        """
+        Count `frames` as fully processed.
+        """
+        self._frames += frames
+        self.flush()
+
+    def add(self, stage: str, seconds: float, frames: int = 0):
+        """
+        Add `seconds` of work on `frames` frames to `stage`'s totals.
+        """
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+        self.stage_frames[stage] = self.stage_frames.get(stage, 0) + frames
+        self._pending_seconds[stage] = self._pending_seconds.get(stage, 0.0) + seconds
+        self._pending_stage_frames[stage] = self._pending_stage_frames.get(stage, 0) + frames
+        self._pending_calls[stage] = self._pending_calls.get(stage, 0) + 1
+        bucket = (stage, bisect_left(LATENCY_BUCKETS, seconds))
+        self._pending_buckets[bucket] = self._pending_buckets.get(bucket, 0) + 1
+
+    @contextmanager
+    def timed(self, stage: str, frames: int = 0):
+        """
+        Add the wall time of the block (and `frames`) to `stage`'s totals.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, frames)
+
+    def iterate(self, iterable, stage: str):
+        """
+        Yield from `iterable`, charging the time spent waiting on each item
+        to `stage`.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(stage, time.perf_counter() - start, 1)
+            yield item
+
+    def flush(self, force: bool = False):
+        """
+        Write buffered counters to the status store.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.interval:
+            return
+        self._last_flush = now
+        if self.job_id is None:
+            self._reset_pending()
+            return
+
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.execute(
+                "UPDATE job_progress SET frames_done = frames_done + ?,"
+                " stage = COALESCE(?, stage), frames_total = COALESCE(?, frames_total),"
+                " updated_at = ? WHERE job_id = ?",
+                (self._frames, self._pending_stage, self._pending_total, time.time(), self.job_id),
+            )
+            for stage, seconds in self._pending_seconds.items():
+                conn.execute(
+                    "INSERT INTO job_stage_stats (job_id, stage, seconds, frames)"
+                    " VALUES (?, ?, ?, ?) ON CONFLICT (job_id, stage) DO UPDATE SET"
+                    " seconds = seconds + excluded.seconds, frames = frames + excluded.frames",
+                    (self.job_id, stage, seconds, self._pending_stage_frames.get(stage, 0)),
+                )
+                conn.execute(
+                    "INSERT INTO stage_metrics (stage, calls, seconds, frames)"
+                    " VALUES (?, ?, ?, ?) ON CONFLICT (stage) DO UPDATE SET"
+                    " calls = calls + excluded.calls, seconds = seconds + excluded.seconds,"
+                    " frames = frames + excluded.frames",
+                    (stage, self._pending_calls.get(stage, 0), seconds,
+                     self._pending_stage_frames.get(stage, 0)),
+                )
+            conn.executemany(
+                "INSERT INTO stage_latency (stage, bucket, count) VALUES (?, ?, ?)"
+                " ON CONFLICT (stage, bucket) DO UPDATE SET count = count + excluded.count",
+                [(stage, bucket, count) for (stage, bucket), count in self._pending_buckets.items()],
+            )
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._frames = 0
+        self._pending_stage = None
+        self._pending_total = None
+        self._pending_seconds = {}
+        self._pending_stage_frames = {}
+        self._pending_calls = {}
+        self._pending_buckets = {}
+
+
+def read_progress(job_id: str, db_path: Path = PROGRESS_DB) -> Optional[Dict[str, Any]]:
+    """
+    Current progress of a job, with throughput and ETA.
+
+    The tables are created by `JobQueue` on startup.
+
+    Returns:
+        Progress dict, or None if the job has not reported anything yet
+    """
+    with closing(connect(db_path)) as conn:
+        row = conn.execute("SELECT * FROM job_progress WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        stats = conn.execute(
+            "SELECT stage, seconds, frames FROM job_stage_stats WHERE job_id = ?", (job_id,)
+        ).fetchall()
+
+    done = row["frames_done"]
+    total = row["frames_total"]
+    elapsed = max(row["updated_at"] - row["started_at"], 1e-6)
+    fps = done / elapsed
+    eta = (total - done) / fps if total and fps > 0 else None
+
+    return {
+        "stage": row["stage"],
+        "frames_processed": done,
+        "frames_total": total,
+        "progress": round(100 * min(done / total, 1.0), 1) if total else 0,
+        "fps": round(fps, 2),
+        "eta_seconds": round(max(eta, 0.0), 1) if eta is not None else None,
+        "updated_at": datetime.fromtimestamp(row["updated_at"]).isoformat(),
+        "stages": {
+            s["stage"]: {
+                "seconds": round(s["seconds"], 3),
+                "frames": s["frames"],
+                "fps": round(s["frames"] / s["seconds"], 2) if s["seconds"] > 0 else None,
+            }
+            for s in stats
+        },
+    }
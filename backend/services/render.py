@@ -0,0 +1,99 @@
+import subprocess
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from services.detections_store import iter_detections
+from services.frame_extract import iter_frames
+from services.progress import ProgressReporter
+
+RENDER_DIR = Path("renders")
+
+# BGR box colors per team label; anything else is drawn in gray
+TEAM_COLORS = {
+    0: (255, 128, 0),
+    1: (0, 0, 255),
+}
+OTHER_COLOR = (160, 160, 160)
+
+
+def render_path(video_id: str) -> Path:
+    """
+    Where the annotated video of `video_id` is written.
+
+    Keyed on the full upload name, so `game.mp4` and `game.mov` get
+    separate renders.
+    """
+    return RENDER_DIR / f"{video_id}_annotated.mp4"
+
+
+def draw_detections(frame: np.ndarray, detections) -> np.ndarray:
+    """
+    Draw team-colored boxes and track IDs onto `frame` (in place).
+    """
+    for d in detections:
+        color = TEAM_COLORS.get(d["team"], OTHER_COLOR)
+        x1, y1, x2, y2 = (int(round(d[k])) for k in ("x1", "y1", "x2", "y2"))
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, str(d["track_id"]), (x1, max(y1 - 4, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return frame
+
+
+def render_video(video_path: Path, detections: Path, output_path: Path, fps: int = 7,
+                 progress: ProgressReporter = None, size=None):
+    """
+    Write an annotated MP4 of `video_path` from stored detections.
+
+    The video is decoded at the same `fps` the detections were made at, so
+    frame indices line up; annotated frames are piped as raw video into a
+    single ffmpeg encoder instead of being written out as images.
+
+    Args:
+        video_path: Path to the source video
+        detections: Detections output (see `services.detections_store`)
+        output_path: Where to write the MP4
+        fps: Sampling rate the detections were made at
+        progress: Optional reporter for the "render" stage
+        size: (width, height) of the video if already known
+    """
+    progress = progress or ProgressReporter()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.stem + ".tmp.mp4")
+
+    encoder = None
+    stored = iter_detections(detections)
+    next_frame, next_detections = next(stored, (None, []))
+    try:
+        for index, frame in enumerate(iter_frames(video_path, fps=fps, size=size), start=1):
+            with progress.timed("render", frames=1):
+                if encoder is None:
+                    height, width = frame.shape[:2]
+                    encoder = subprocess.Popen([
+                        "ffmpeg", "-y", "-loglevel", "error",
+                        "-f", "rawvideo", "-pix_fmt", "bgr24",
+                        "-s", f"{width}x{height}", "-r", str(fps),
+                        "-i", "pipe:0",
+                        "-c:v", "libx264", "-preset", "veryfast",
+                        "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+                        str(tmp_path)
+                    ], stdin=subprocess.PIPE)
+
+                while next_frame is not None and next_frame < index:
+                    next_frame, next_detections = next(stored, (None, []))
+                if next_frame == index:
+                    draw_detections(frame, next_detections)
+                encoder.stdin.write(frame.data)
+    finally:
+        if encoder is not None:
+            encoder.stdin.close()
+            returncode = encoder.wait()
+        stored.close()
+
+    if encoder is None:
+        raise ValueError(f"No frames decoded from {video_path}")
+    if returncode != 0:
+        tmp_path.unlink(missing_ok=True)
+        raise subprocess.CalledProcessError(returncode, "ffmpeg")
+    tmp_path.replace(output_path)
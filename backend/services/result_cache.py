@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.db import DATA_DIR, connect
+from utils.helpers import generate_file_hash
+
+CACHE_DIR = Path("cache")
+CACHE_DB = DATA_DIR / "cache.db"
+
+# Bump when the pipeline output changes in a way the key doesn't capture
+CACHE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    artifact TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (last_used);
+"""
+
+
+def _size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    elif path.exists():
+        path.unlink()
+
+
+def _link_or_copy(src, dst):
+    # Hard links make restores free; fall back to a copy across filesystems
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def _copy_artifact(src: Path, dst: Path):
+    if src.is_dir():
+        shutil.copytree(src, dst, copy_function=_link_or_copy)
+    else:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(src, dst)
+
+
+class ResultCache:
+    """
+    Content-addressed store of pipeline outputs.
+
+    Entries live in `root/{key}/` where the key is a hash of everything the
+    output depends on (see `cache_key`), so the same video uploaded under a
+    different name, or re-requested with the same settings, is served
+    without running the pipeline again. Entries are evicted least recently
+    used first once the store exceeds `max_bytes` or `max_entries`.
+    Artifacts are hard-linked in and out of the store where possible.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, db_path: Path = CACHE_DB,
+                 max_bytes: int = 10 * 1024 ** 3, max_entries: int = 500):
+        self.root = root
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return closing(connect(self.db_path))
+
+    def file_hash(self, path: Path) -> str:
+        """
+        SHA-256 of a file, remembered per (path, size, mtime) so unchanged
+        files are only read once.
+        """
+        stat = path.stat()
+        key = str(path.resolve())
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT sha256 FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (key, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        if row is not None:
+            return row["sha256"]
+
+        digest = generate_file_hash(path)
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def restore(self, key: str, dest: Path) -> bool:
+        """
+        Materialize the cached artifact for `key` at `dest`.
+
+        Returns:
+            True on a cache hit
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT artifact FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+
+        src = self.root / key / row["artifact"]
+        _remove(dest)
+        try:
+            _copy_artifact(src, dest)
+        except (OSError, shutil.Error):
+            # Evicted by another process in the meantime
+            _remove(dest)
+            return False
+
+        with self._connect() as conn, conn:
+            conn.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return True
+
+    def store(self, key: str, src: Path):
+        """
+        Add the artifact at `src` (file or directory) under `key` and evict
+        old entries if the store is over its limits.
+        """
+        entry = self.root / key
+        if entry.exists():
+            return
+
+        # Build the entry next to its final place and move it in atomically,
+        # so concurrent jobs for the same key never see a partial entry
+        tmp = self.root / f".{key}.{uuid.uuid4().hex}"
+        _copy_artifact(src, tmp / src.name)
+        try:
+            tmp.rename(entry)
+        except OSError:
+            _remove(tmp)
+            return
+
+        now = time.time()
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, artifact, size_bytes, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, src.name, _size(entry), now, now),
+            )
+        self.evict()
+
+    def discard(self, artifact: str):
+        """
+        Remove the entries whose artifact is named `artifact`.
+        """
+        with self._connect() as conn, conn:
+            keys = [row["key"] for row in conn.execute(
+                "SELECT key FROM cache_entries WHERE artifact = ?", (artifact,)
+            )]
+            conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(k,) for k in keys])
+        for key in keys:
+            _remove(self.root / key)
+
+    def evict(self):
+        """
+        Remove least recently used entries until the store fits its limits.
+        """
+        with self._connect() as conn, conn:
+            rows = conn.execute(
+                "SELECT key, size_bytes FROM cache_entries ORDER BY last_used DESC"
+            ).fetchall()
+            total = 0
+            expired = []
+            for n, row in enumerate(rows):
+                total += row["size_bytes"]
+                if total > self.max_bytes or n >= self.max_entries:
+                    expired.append(row["key"])
+            conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(k,) for k in expired])
+
+        for key in expired:
+            _remove(self.root / key)
+        if expired:
+            print(f"Evicted {len(expired)} cached results")
+
+
+def cache_key(**parts: Any) -> str:
+    """
+    Hash keyword `parts` (JSON-serializable) into a cache key.
+    """
+    payload = json.dumps({"version": CACHE_VERSION, **parts}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", 10 * 1024 ** 3)),
+    max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 500)),
+)
@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+# Frame kinds returned by `SceneFilter.classify`
+PLAY = "play"        # Field in view: detect as usual
+CUT = "cut"          # First frame of a new shot (also a play frame)
+STATIC = "static"    # Nearly identical to the previous frame
+OFF_PLAY = "off_play"  # Little field in view: crowd, close-ups, graphics, ads
+
+
+class SceneFilter:
+    """
+    Cheap per-frame shot segmentation ahead of detection.
+
+    Works on a small blurred thumbnail of each frame:
+
+    - a hard cut is a large Bhattacharyya distance between the hue /
+      saturation histograms of consecutive frames
+    - a static frame changes fewer than `static_ratio` of the thumbnail's
+      pixels by more than `pixel_threshold` levels
+    - an off-play frame has less than `min_green` of its pixels in field
+      green (crowd and sideline cutaways, close-ups, ads, graphics)
+
+    Shots are tracked in `shots` as dicts with `start`, `end` (frame
+    indices), `green` (mean field ratio) and `off_play`.
+    """
+
+    def __init__(self, thumb_size=(160, 90), cut_threshold: float = 0.45,
+                 pixel_threshold: int = 12, static_ratio: float = 0.002,
+                 min_green: float = 0.2):
+        self.thumb_size = thumb_size
+        self.cut_threshold = cut_threshold
+        self.pixel_threshold = pixel_threshold
+        self.static_ratio = static_ratio
+        self.min_green = min_green
+        self.shots = []
+        self.counts = {PLAY: 0, CUT: 0, STATIC: 0, OFF_PLAY: 0}
+        self._gray = None
+        self._hist = None
+
+    @staticmethod
+    def green_ratio(hsv: np.ndarray) -> float:
+        """
+        Share of pixels in field green (OpenCV hue 35-85, saturated, not
+        dark).
+        """
+        h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        return float(np.mean((h >= 35) & (h <= 85) & (s >= 60) & (v >= 40)))
+
+    def classify(self, frame: np.ndarray, frame_index: int) -> str:
+        """
+        Classify the next frame of the video (frames must arrive in order).
+
+        Returns:
+            One of `PLAY`, `CUT`, `STATIC` or `OFF_PLAY`; a cut into an
+            off-play shot is reported as `CUT`, the frames after it as
+            `OFF_PLAY`
+        """
+        thumb = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        thumb = cv2.GaussianBlur(thumb, (3, 3), 0)
+        hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        cv2.normalize(hist, hist)
+        green = self.green_ratio(hsv)
+
+        if self._hist is None:
+            kind = CUT
+        elif cv2.compareHist(self._hist, hist, cv2.HISTCMP_BHATTACHARYYA) > self.cut_threshold:
+            kind = CUT
+        elif green < self.min_green:
+            kind = OFF_PLAY
+        else:
+            changed = np.mean(cv2.absdiff(gray, self._gray) > self.pixel_threshold)
+            kind = STATIC if changed < self.static_ratio else PLAY
+        self._gray, self._hist = gray, hist
+
+        if kind == CUT:
+            self.shots.append({"start": frame_index, "end": frame_index, "green": green,
+                               "frames": 1, "off_play": green < self.min_green})
+        else:
+            shot = self.shots[-1]
+            shot["end"] = frame_index
+            shot["frames"] += 1
+            shot["green"] += (green - shot["green"]) / shot["frames"]
+            shot["off_play"] = shot["green"] < self.min_green
+        self.counts[kind] += 1
+        return kind
+
+    def summary(self) -> str:
+        total = sum(self.counts.values())
+        off_play = sum(s["frames"] for s in self.shots if s["off_play"])
+        return (f"{len(self.shots)} shots, {self.counts[STATIC]} static and "
+                f"{off_play} off-play frames of {total}")
@@ -0,0 +1,302 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from services.detections_store import (
+    FORMATS, _write_atomic, detections_path, json_to_columns, read_detections, read_manifest
+)
+
+ANALYTICS_DIR = Path("analytics")
+
+# Frames averaged (centered) when smoothing positions; ~0.7 s at 7 fps
+SMOOTH_WINDOW = 5
+
+# Per-track summary, one row per track ID
+TRACK_COLUMNS = ("track_id", "team", "first_frame", "last_frame", "frames",
+                 "distance", "mean_speed", "max_speed")
+# Smoothed trajectories, rows grouped by track ID and ordered by frame
+TRAJECTORY_COLUMNS = ("track_id", "frame", "x", "y", "vx", "vy", "speed")
+# Per frame and team: player count, centroid and spread
+TEAM_COLUMNS = ("frame", "team", "players", "centroid_x", "centroid_y", "spread")
+
+
+def analytics_path(video_id: str, root: Path = ANALYTICS_DIR) -> Path:
+    """
+    Where the precomputed analytics of `video_id` are stored.
+    """
+    return root / f"{video_id}.npz"
+
+
+def find_detections(video_id: str) -> Optional[Tuple[Path, str]]:
+    """
+    Stored detections of `video_id` as (path, format), or None.
+
+    Columnar output is preferred when a video was processed in several
+    formats.
+    """
+    for fmt in FORMATS:
+        path = detections_path(video_id, fmt)
+        if (path / "manifest.json").is_file() if fmt == "columnar" else path.is_file():
+            return path, fmt
+    return None
+
+
+def load_columns(path: Path, fmt: str) -> Tuple[Dict[str, np.ndarray], Optional[float]]:
+    """
+    Load stored detections as columns.
+
+    Returns:
+        tuple: (columns ordered by frame, sampling fps or None if the
+        format doesn't store it)
+    """
+    if fmt == "columnar":
+        return read_detections(path), read_manifest(path)["fps"]
+    return json_to_columns(path), None
+
+
+def _group_bounds(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end (exclusive) row of each run of equal `keys`.
+    """
+    if not len(keys):
+        return np.empty(0, int), np.empty(0, int)
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[:1] - 1))
+    ends = np.append(starts[1:], len(keys))
+    return starts, ends
+
+
+def _smooth(values: np.ndarray, row_start: np.ndarray, row_end: np.ndarray,
+            window: int) -> np.ndarray:
+    """
+    Centered moving average of `values` that never crosses a group
+    boundary. Windows shrink symmetrically near the ends of a group, so
+    steady motion isn't biased there.
+    """
+    index = np.arange(len(values))
+    half = np.minimum(window // 2, np.minimum(index - row_start, row_end - 1 - index))
+    lo = index - half
+    hi = index + half + 1
+    sums = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    return (sums[hi] - sums[lo]) / (hi - lo)
+
+
+def compute_analytics(columns: Dict[str, np.ndarray], fps: float = 7,
+                      window: int = SMOOTH_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    Per-track trajectories and stats and per-frame team shape.
+
+    Everything is computed with group-by style array operations over the
+    detection columns; there is no loop over tracks or frames. A player's
+    position is the bottom center of the box (the feet), in source video
+    pixels, so distances are in pixels and speeds in pixels per second.
+
+    Args:
+        columns: Detection columns (see `services.detections_store.COLUMNS`)
+        fps: Sampling rate of the frames
+        window: Frames in the centered moving average applied to positions
+            before differentiating
+
+    Returns:
+        Flat dict of arrays: `track_*` (`TRACK_COLUMNS`), `trajectory_*`
+        (`TRAJECTORY_COLUMNS`) and `team_*` (`TEAM_COLUMNS`); all empty
+        when there are no detections
+    """
+    frame = columns["frame"].astype(np.int64)
+    track = columns["track_id"].astype(np.int64)
+    team = columns["team"].astype(np.int64)
+    x = (columns["x1"].astype(np.float64) + columns["x2"]) / 2
+    y = columns["y2"].astype(np.float64)
+
+    # Trajectories: rows grouped by track, in frame order
+    order = np.lexsort((frame, track))
+    frame, track, team, x, y = frame[order], track[order], team[order], x[order], y[order]
+    starts, ends = _group_bounds(track)
+    group = np.repeat(np.arange(len(starts)), ends - starts)
+    row_start, row_end = starts[group], ends[group]
+
+    x = _smooth(x, row_start, row_end, window)
+    y = _smooth(y, row_start, row_end, window)
+
+    # Central differences inside each track, one-sided at its ends
+    index = np.arange(len(frame))
+    prev = np.maximum(index - 1, row_start)
+    nxt = np.minimum(index + 1, row_end - 1)
+    dt = (frame[nxt] - frame[prev]) / fps
+    moving = dt > 0
+    vx = np.zeros(len(frame))
+    vy = np.zeros(len(frame))
+    vx[moving] = (x[nxt] - x[prev])[moving] / dt[moving]
+    vy[moving] = (y[nxt] - y[prev])[moving] / dt[moving]
+    speed = np.hypot(vx, vy)
+
+    # Per-track totals
+    step = np.hypot(np.diff(x, prepend=x[:1]), np.diff(y, prepend=y[:1]))
+    step[starts] = 0
+    frames = ends - starts
+    if len(starts):
+        distance = np.add.reduceat(step, starts)
+        max_speed = np.maximum.reduceat(speed, starts)
+        duration = (frame[ends - 1] - frame[starts]) / fps
+    else:
+        distance = max_speed = duration = np.empty(0)
+    mean_speed = np.divide(distance, duration, out=np.zeros(len(starts)), where=duration > 0)
+
+    # Majority team per track from a (track, team) count matrix
+    team_values, team_index = np.unique(team, return_inverse=True)
+    counts = np.zeros((len(starts), max(len(team_values), 1)), dtype=np.int64)
+    np.add.at(counts, (group, team_index), 1)
+    track_team = team_values[counts.argmax(axis=1)] if len(team_values) else np.empty(0, np.int64)
+
+    # Team shape per frame, from the raw (unsmoothed) positions
+    frame_raw = columns["frame"].astype(np.int64)
+    team_raw = columns["team"].astype(np.int64)
+    x_raw = (columns["x1"].astype(np.float64) + columns["x2"]) / 2
+    y_raw = columns["y2"].astype(np.float64)
+    keys, inverse = np.unique(np.stack([frame_raw, team_raw], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    players = np.bincount(inverse, minlength=len(keys))
+    cx = np.bincount(inverse, weights=x_raw, minlength=len(keys)) / np.maximum(players, 1)
+    cy = np.bincount(inverse, weights=y_raw, minlength=len(keys)) / np.maximum(players, 1)
+    squared = (x_raw - cx[inverse]) ** 2 + (y_raw - cy[inverse]) ** 2
+    spread = np.sqrt(np.bincount(inverse, weights=squared, minlength=len(keys)) / np.maximum(players, 1))
+    keys = keys.reshape(-1, 2)
+
+    return {
+        "track_track_id": track[starts].astype(np.int32),
+        "track_team": track_team.astype(np.int8),
+        "track_first_frame": frame[starts].astype(np.int32),
+        "track_last_frame": frame[ends - 1].astype(np.int32),
+        "track_frames": frames.astype(np.int32),
+        "track_distance": distance.astype(np.float32),
+        "track_mean_speed": mean_speed.astype(np.float32),
+        "track_max_speed": max_speed.astype(np.float32),
+        "trajectory_track_id": track.astype(np.int32),
+        "trajectory_frame": frame.astype(np.int32),
+        "trajectory_x": x.astype(np.float32),
+        "trajectory_y": y.astype(np.float32),
+        "trajectory_vx": vx.astype(np.float32),
+        "trajectory_vy": vy.astype(np.float32),
+        "trajectory_speed": speed.astype(np.float32),
+        "team_frame": keys[:, 0].astype(np.int32),
+        "team_team": keys[:, 1].astype(np.int8),
+        "team_players": players.astype(np.int32),
+        "team_centroid_x": cx.astype(np.float32),
+        "team_centroid_y": cy.astype(np.float32),
+        "team_spread": spread.astype(np.float32),
+        "fps": np.float64(fps),
+    }
+
+
+def precompute_analytics(video_id: str, path: Optional[Path] = None,
+                         fmt: Optional[str] = None, fps: float = 7) -> Optional[Path]:
+    """
+    Compute the analytics of a processed video and store them for
+    `load_analytics`.
+
+    Args:
+        video_id: Name of the uploaded video file
+        path, fmt: Stored detections (default: `find_detections`)
+        fps: Sampling rate, used when the format doesn't store it
+
+    Returns:
+        Path of the written analytics, or None if there are no detections
+    """
+    if path is None:
+        found = find_detections(video_id)
+        if found is None:
+            return None
+        path, fmt = found
+    columns, stored_fps = load_columns(path, fmt)
+    analytics = compute_analytics(columns, fps=stored_fps or fps)
+
+    out = analytics_path(video_id)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(out, lambda f: np.savez(f, **analytics))
+    return out
+
+
+@lru_cache(maxsize=32)
+def _load(path: str, mtime: float) -> Dict[str, np.ndarray]:
+    # Keyed on the mtime so a rerun of the job invalidates the entry
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def load_analytics(video_id: str) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Load (and cache per process) the analytics written by
+    `precompute_analytics`, or None if there are none.
+    """
+    path = analytics_path(video_id)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    return _load(str(path), mtime)
+
+
+def _table(analytics: Dict[str, np.ndarray], prefix: str, names: Iterable[str],
+           rows=slice(None)) -> list:
+    values = {name: analytics[f"{prefix}_{name}"][rows].tolist() for name in names}
+    for name, column in values.items():
+        if analytics[f"{prefix}_{name}"].dtype.kind == "f":
+            values[name] = [round(v, 2) for v in column]
+    return [dict(zip(values, row)) for row in zip(*values.values())]
+
+
+def summarize(analytics: Dict[str, np.ndarray], track_ids: Optional[Iterable[int]] = None,
+              frames: Optional[Tuple[int, Optional[int]]] = None,
+              trajectories: bool = False, team_frames: bool = False) -> Dict[str, Any]:
+    """
+    Select the parts of stored analytics a request asks for.
+
+    Args:
+        analytics: Arrays from `load_analytics`
+        track_ids: Only report these tracks
+        frames: Inclusive (first, last) frame range for trajectories and
+            team shape; `last` may be None
+        trajectories: Include the smoothed trajectory of each track
+        team_frames: Include team centroid and spread per frame
+
+    Returns:
+        dict with `fps`, `tracks`, `teams` (per-team totals) and, if asked
+        for, `trajectories` and `team_frames`
+    """
+    track_id = analytics["track_track_id"]
+    selected = np.isin(track_id, list(track_ids)) if track_ids is not None else np.ones(len(track_id), bool)
+    track_rows = np.flatnonzero(selected)
+
+    team = analytics["track_team"]
+    teams = []
+    for value in np.unique(team):
+        members = team == value
+        teams.append({
+            "team": int(value),
+            "tracks": int(members.sum()),
+            "distance": round(float(analytics["track_distance"][members].sum()), 2),
+            "mean_spread": round(float(analytics["team_spread"][analytics["team_team"] == value].mean()), 2)
+            if (analytics["team_team"] == value).any() else None,
+        })
+
+    result = {
+        "fps": float(analytics["fps"]),
+        "units": {"distance": "px", "speed": "px/s"},
+        "tracks": _table(analytics, "track", TRACK_COLUMNS, track_rows),
+        "teams": teams,
+    }
+
+    first, last = frames or (1, None)
+    if trajectories:
+        frame = analytics["trajectory_frame"]
+        rows = np.flatnonzero(
+            np.isin(analytics["trajectory_track_id"], track_id[track_rows])
+            & (frame >= first) & ((frame <= last) if last is not None else True)
+        )
+        result["trajectories"] = _table(analytics, "trajectory", TRAJECTORY_COLUMNS, rows)
+    if team_frames:
+        frame = analytics["team_frame"]
+        rows = np.flatnonzero((frame >= first) & ((frame <= last) if last is not None else True))
+        result["team_frames"] = _table(analytics, "team", TEAM_COLUMNS, rows)
+    return result
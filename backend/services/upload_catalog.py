@@ -0,0 +1,290 @@
+import shutil
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.video_metadata import metadata_store
+from utils.db import DATA_DIR, connect
+
+UPLOAD_DIR = Path("uploads")
+CATALOG_DB = DATA_DIR / "uploads.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    video_id TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    content_type TEXT,
+    created_at TEXT NOT NULL,
+    processed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS uploads_created ON uploads (created_at);
+CREATE INDEX IF NOT EXISTS uploads_size ON uploads (size);
+CREATE TABLE IF NOT EXISTS upload_artifacts (
+    video_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (video_id, path)
+);
+"""
+
+# Sort keys accepted by `UploadCatalog.list`, mapped to SQL expressions
+SORT_KEYS = {
+    "created": "u.created_at",
+    "filename": "u.video_id",
+    "size": "u.size",
+    "duration": "m.duration",
+    "artifacts": "artifact_bytes",
+}
+
+
+def _path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def derived_paths(video_id: str) -> List[Tuple[str, Path]]:
+    """
+    Every place the pipeline can write output for `video_id`, as
+    (kind, path), whether or not it exists.
+
+    Covers outputs of runs that predate the catalog, or were interrupted
+    before their artifacts were recorded.
+    """
+    # Imported here: the pipeline modules pull in numpy / OpenCV
+    from services.detections_store import FORMATS, detections_path
+    from services.frame_store import FRAME_STORE_DIR
+    from services.render import render_path
+    from services.track_analytics import analytics_path
+
+    paths = [("frames", Path("frames") / video_id),
+             ("frame_store", FRAME_STORE_DIR / video_id),
+             ("analytics", analytics_path(video_id)),
+             ("render", render_path(video_id))]
+    for fmt in FORMATS:
+        path = detections_path(video_id, fmt)
+        paths.append(("detections", path))
+        # Unfinished JSON Lines output and its checkpoint
+        for suffix in (".partial", ".checkpoint", ".tmp"):
+            paths.append(("detections", path.with_name(path.name + suffix)))
+    return paths
+
+
+class UploadCatalog:
+    """
+    SQLite catalog of uploaded videos and the artifacts derived from them.
+
+    Rows are added when an upload completes and artifacts are recorded when
+    a processing job finishes, so listing never touches the upload
+    directory. The catalog lives next to the `video_metadata` table, which
+    listings join for duration and resolution. Deleting an upload removes
+    its file, metadata and every artifact. Videos copied into `uploads/`
+    by hand are picked up by `sync()`.
+    """
+
+    def __init__(self, db_path: Path = CATALOG_DB, upload_dir: Path = UPLOAD_DIR):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return closing(connect(self.db_path))
+
+    def add(self, video_id: str, size: int, sha256: Optional[str] = None,
+            content_type: Optional[str] = None, created_at: Optional[str] = None):
+        """
+        Record a finished upload (replacing any earlier row for the name).
+        """
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (video_id, size, sha256, content_type, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (video_id, size, sha256, content_type, created_at or datetime.now().isoformat()),
+            )
+
+    def record_artifacts(self, video_id: str, artifacts: Iterable[Tuple[str, Path]]):
+        """
+        Record the outputs of a processing run that exist on disk.
+
+        Args:
+            video_id: Name of the uploaded video file
+            artifacts: (kind, path) pairs, e.g. ("detections", path)
+        """
+        now = datetime.now().isoformat()
+        rows = [(video_id, kind, str(path), _path_size(Path(path)), now)
+                for kind, path in artifacts if Path(path).exists()]
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO upload_artifacts (video_id, kind, path, size, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("UPDATE uploads SET processed_at = ? WHERE video_id = ?", (now, video_id))
+
+    def get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Catalog entry of `video_id` with its artifacts, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM uploads WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return None
+            artifacts = conn.execute(
+                "SELECT kind, path, size, created_at FROM upload_artifacts WHERE video_id = ?"
+                " ORDER BY kind, path",
+                (video_id,),
+            ).fetchall()
+        upload = dict(row)
+        upload["artifacts"] = [dict(a) for a in artifacts]
+        return upload
+
+    def list(self, offset: int = 0, limit: int = 100, sort: str = "created",
+             descending: bool = True, query: Optional[str] = None,
+             processed: Optional[bool] = None, min_size: Optional[int] = None,
+             max_size: Optional[int] = None, created_after: Optional[str] = None,
+             created_before: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of uploads.
+
+        Args:
+            offset: Number of matching uploads to skip
+            limit: Page size
+            sort: Key in `SORT_KEYS`
+            descending: Sort order
+            query: Case-insensitive substring of the file name
+            processed: Only uploads with (True) or without (False) recorded
+                artifacts
+            min_size, max_size: Inclusive range of the upload size in bytes
+            created_after, created_before: Inclusive ISO timestamp range of
+                the upload time
+
+        Returns:
+            dict with `total` matching uploads and the `uploads` of the page,
+            each with duration / resolution (when probed) and the total
+            size of its artifacts
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        where, params = [], []
+        if query:
+            where.append("u.video_id LIKE ? ESCAPE '\\'")
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if processed is not None:
+            where.append("u.processed_at IS NOT NULL" if processed else "u.processed_at IS NULL")
+        if min_size is not None:
+            where.append("u.size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            where.append("u.size <= ?")
+            params.append(max_size)
+        if created_after is not None:
+            where.append("u.created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            where.append("u.created_at <= ?")
+            params.append(created_before)
+        condition = f"WHERE {' AND '.join(where)}" if where else ""
+        direction = "DESC" if descending else "ASC"
+
+        with self._connect() as conn:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM uploads u {condition}", params
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"""
+                SELECT u.*, m.duration, m.width, m.height, m.fps,
+                       COALESCE((SELECT SUM(a.size) FROM upload_artifacts a
+                                 WHERE a.video_id = u.video_id), 0) AS artifact_bytes
+                FROM uploads u
+                LEFT JOIN video_metadata m ON m.video_id = u.video_id
+                {condition}
+                ORDER BY {SORT_KEYS[sort]} {direction}, u.video_id {direction}
+                LIMIT ? OFFSET ?
+                """,
+                (*params, limit, offset),
+            ).fetchall()
+        return {"total": total, "uploads": [dict(row) for row in rows]}
+
+    def delete(self, video_id: str) -> List[str]:
+        """
+        Remove an upload, its artifacts, its metadata and its catalog entry.
+
+        Artifacts are looked up in the catalog and at every path the
+        pipeline writes to (`derived_paths`); paths that are another
+        upload's file or recorded artifact are kept. Cached results are
+        left to the result cache, which may share them with other uploads
+        of the same content.
+
+        Returns:
+            Paths that were removed
+        """
+        with self._connect() as conn:
+            recorded = conn.execute(
+                "SELECT path FROM upload_artifacts WHERE video_id = ?", (video_id,)
+            ).fetchall()
+            paths = {Path(row["path"]) for row in recorded}
+            paths.update(path for _, path in derived_paths(video_id))
+            candidates = [str(path) for path in paths]
+            shared = conn.execute(
+                "SELECT path FROM upload_artifacts WHERE video_id != ?"
+                f" AND path IN ({', '.join('?' * len(candidates))})",
+                (video_id, *candidates),
+            ).fetchall()
+            others = conn.execute(
+                "SELECT video_id FROM uploads WHERE video_id != ?"
+                f" AND video_id IN ({', '.join('?' * len(candidates))})",
+                (video_id, *(Path(p).name for p in candidates)),
+            ).fetchall()
+        paths.difference_update(Path(row["path"]) for row in shared)
+        paths.difference_update(self.upload_dir / row["video_id"] for row in others)
+        paths.add(self.upload_dir / video_id)
+
+        removed = []
+        for path in sorted(paths):
+            if path.exists():
+                _remove(path)
+                removed.append(str(path))
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM upload_artifacts WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM uploads WHERE video_id = ?", (video_id,))
+        metadata_store.delete(video_id)
+        return removed
+
+    def sync(self):
+        """
+        Add videos in the upload directory that have no catalog entry, and
+        drop entries whose file is gone.
+        """
+        with self._connect() as conn:
+            known = {row["video_id"] for row in conn.execute("SELECT video_id FROM uploads")}
+        present = set()
+        for path in self.upload_dir.glob("*"):
+            if path.name.startswith(".") or not path.is_file():
+                continue
+            present.add(path.name)
+            if path.name not in known:
+                stat = path.stat()
+                self.add(path.name, stat.st_size,
+                         created_at=datetime.fromtimestamp(stat.st_ctime).isoformat())
+        with self._connect() as conn, conn:
+            conn.executemany("DELETE FROM upload_artifacts WHERE video_id = ?",
+                             [(v,) for v in known - present])
+            conn.executemany("DELETE FROM uploads WHERE video_id = ?",
+                             [(v,) for v in known - present])
+
+
+upload_catalog = UploadCatalog()
@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+import anyio
+
+from utils.db import DATA_DIR, connect
+from utils.helpers import update_file_hash
+
+UPLOAD_DIR = Path("uploads")
+PARTIAL_DIR = UPLOAD_DIR / ".partial"
+UPLOADS_DB = DATA_DIR / "uploads.db"
+
+# Bytes written (and hashed) per worker-thread call
+WRITE_BLOCK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    session_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    received INTEGER NOT NULL DEFAULT 0,
+    content_type TEXT,
+    process_options TEXT,
+    status TEXT NOT NULL,
+    video_id TEXT,
+    sha256 TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+class UploadRangeError(Exception):
+    """Raised when a chunk does not continue the received bytes"""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+def stored_name(filename: str) -> str:
+    """
+    Name an upload is stored under: a timestamp prefix keeps names unique.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{Path(filename).name}"
+
+
+def _write_block(f, hash_obj, block: bytes):
+    f.write(block)
+    hash_obj.update(block)
+
+
+def _open_at(path: Path, offset: int):
+    # Reopen a partial upload, dropping anything past `offset`
+    f = open(path, "r+b")
+    f.seek(offset)
+    f.truncate()
+    return f
+
+
+async def _blocks(stream: AsyncIterator[bytes], block_size: int = WRITE_BLOCK):
+    """
+    Regroup a byte stream into blocks of about `block_size` bytes.
+    """
+    buffer = bytearray()
+    async for chunk in stream:
+        buffer += chunk
+        if len(buffer) >= block_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def write_stream(stream: AsyncIterator[bytes], f, hash_obj, skip: int = 0,
+                       limit: Optional[int] = None, length: Optional[int] = None) -> int:
+    """
+    Append a byte stream to an open file, hashing it on the way.
+
+    Writes and hashing run in a worker thread one block at a time, so the
+    event loop is never blocked by disk I/O or SHA-256.
+
+    Args:
+        stream: Async iterator of byte chunks
+        f: File opened for binary writing, positioned at the end
+        hash_obj: hashlib object updated with the written bytes
+        skip: Number of leading bytes to drop (already received)
+        limit: Maximum number of bytes to write
+        length: Exact number of bytes the stream must carry, skipped bytes
+            included (e.g. from a `Content-Range` header)
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        ValueError: If the stream carries more than `limit` bytes, or not
+            exactly `length` bytes
+    """
+    written = 0
+    seen = 0
+    async for block in _blocks(stream):
+        seen += len(block)
+        if length is not None and seen > length:
+            raise ValueError(f"Chunk is longer than the {length} bytes of its Content-Range")
+        if skip:
+            dropped = min(skip, len(block))
+            block, skip = block[dropped:], skip - dropped
+            if not block:
+                continue
+        if limit is not None and written + len(block) > limit:
+            raise ValueError("Chunk extends past the declared upload size")
+        await anyio.to_thread.run_sync(_write_block, f, hash_obj, block)
+        written += len(block)
+    if length is not None and seen != length:
+        raise ValueError(f"Chunk has {seen} bytes, its Content-Range {length}")
+    return written
+
+
+async def save_stream(stream: AsyncIterator[bytes], dest: Path) -> Dict[str, Any]:
+    """
+    Write a byte stream to `dest`, computing its SHA-256 while writing.
+
+    Returns:
+        dict with `size` and `sha256`
+    """
+    hash_obj = hashlib.sha256()
+    f = await anyio.to_thread.run_sync(open, dest, "wb")
+    try:
+        size = await write_stream(stream, f, hash_obj)
+    finally:
+        await anyio.to_thread.run_sync(f.close)
+    return {"size": size, "sha256": hash_obj.hexdigest()}
+
+
+class UploadSessions:
+    """
+    Resumable chunked uploads.
+
+    A session is created with the final file size, then the file is sent in
+    sequential chunks (`append`), each starting at the number of bytes
+    already received. Interrupted uploads resume from `received`; a chunk
+    that overlaps bytes already stored is accepted and the overlap dropped,
+    so retrying a chunk is safe. The SHA-256 is computed incrementally while
+    writing; after a server restart the received prefix is hashed once
+    before continuing.
+    """
+
+    def __init__(self, db_path: Path = UPLOADS_DB, partial_dir: Path = PARTIAL_DIR,
+                 upload_dir: Path = UPLOAD_DIR):
+        self.db_path = db_path
+        self.partial_dir = partial_dir
+        self.upload_dir = upload_dir
+        # session_id -> (hash of the received bytes, bytes hashed)
+        self._hashes = {}
+        self._locks = {}
+
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return closing(connect(self.db_path))
+
+    def _partial_path(self, session_id: str) -> Path:
+        return self.partial_dir / session_id
+
+    def _row(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM upload_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session["process_options"] = json.loads(session["process_options"] or "null")
+        return session
+
+    def _update(self, session_id: str, updates: Dict[str, Any]):
+        with self._connect() as conn, conn:
+            assignments = ", ".join(f"{column} = ?" for column in updates)
+            conn.execute(
+                f"UPDATE upload_sessions SET {assignments} WHERE session_id = ?",
+                (*updates.values(), session_id),
+            )
+
+    def _store(self, partial: Path, video_id: str):
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        partial.replace(self.upload_dir / video_id)
+
+    def create(self, filename: str, size: int, content_type: Optional[str] = None,
+               process_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Start an upload of `size` bytes.
+
+        Args:
+            filename: Original file name
+            size: Total size in bytes
+            content_type: MIME type reported by the client
+            process_options: Pipeline options to queue processing with once
+                the upload completes (None: don't process)
+
+        Returns:
+            Session dict
+        """
+        session_id = uuid.uuid4().hex
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self._partial_path(session_id).touch()
+        now = datetime.now().isoformat()
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT INTO upload_sessions (session_id, filename, size, content_type,"
+                " process_options, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 'uploading', ?, ?)",
+                (session_id, Path(filename).name, size, content_type,
+                 json.dumps(process_options) if process_options is not None else None, now, now),
+            )
+        self._hashes[session_id] = (hashlib.sha256(), 0)
+        return self._row(session_id)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a session by ID.
+        """
+        return self._row(session_id)
+
+    async def append(self, session_id: str, start: int, stream: AsyncIterator[bytes],
+                     length: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Write a chunk starting at byte `start`, of exactly `length` bytes if
+        given. Bytes of a chunk that is too short are kept.
+
+        Database and file system calls run in worker threads, like the
+        writes themselves, so the event loop is never blocked.
+
+        Returns:
+            Updated session dict; `status` is "complete" once all bytes
+            arrived and the file was moved into the upload directory
+
+        Raises:
+            KeyError: If the session does not exist
+            UploadRangeError: If the chunk leaves a gap or the upload is
+                already complete (or failed)
+            ValueError: If the chunk runs past the declared size or doesn't
+                have `length` bytes
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            session = await anyio.to_thread.run_sync(self._row, session_id)
+            if session is None:
+                raise KeyError(session_id)
+            received = session["received"]
+            if session["status"] != "uploading":
+                raise UploadRangeError(f"Upload already {session['status']}", received)
+            if start > received:
+                raise UploadRangeError(f"Expected a chunk starting at byte {received}", received)
+
+            partial = self._partial_path(session_id)
+            hash_obj, hashed = self._hashes.get(session_id, (None, -1))
+            if hashed != received:
+                # Server restarted mid-upload: hash what we already have
+                hash_obj = hashlib.sha256()
+                await anyio.to_thread.run_sync(update_file_hash, hash_obj, partial, received)
+
+            error = None
+            f = await anyio.to_thread.run_sync(_open_at, partial, received)
+            try:
+                await write_stream(
+                    stream, f, hash_obj, skip=received - start,
+                    limit=session["size"] - received, length=length
+                )
+            except Exception as e:
+                # Keep what was written; the client resumes from there
+                error = e
+            finally:
+                received = f.tell()
+                await anyio.to_thread.run_sync(f.close)
+
+            if error is None:
+                self._hashes[session_id] = (hash_obj, received)
+            else:
+                # The hash may be ahead of the file; rebuild it on resume
+                self._hashes.pop(session_id, None)
+            updates = {"received": received, "updated_at": datetime.now().isoformat()}
+            if error is None and received == session["size"]:
+                video_id = stored_name(session["filename"])
+                await anyio.to_thread.run_sync(self._store, partial, video_id)
+                self._hashes.pop(session_id, None)
+                updates.update(status="complete", video_id=video_id, sha256=hash_obj.hexdigest())
+
+            await anyio.to_thread.run_sync(self._update, session_id, updates)
+            if error is not None:
+                raise error
+            # Read back under the lock, before an abort can drop the row
+            session = await anyio.to_thread.run_sync(self._row, session_id)
+        if session["status"] == "complete":
+            self._locks.pop(session_id, None)
+        return session
+
+    def fail(self, session_id: str):
+        """
+        Mark a complete upload as failed, e.g. when the stored file turned
+        out not to be a video and was deleted.
+        """
+        self._update(session_id, {"status": "failed", "video_id": None,
+                                  "updated_at": datetime.now().isoformat()})
+
+    def _delete(self, session_id: str) -> bool:
+        with self._connect() as conn, conn:
+            deleted = conn.execute(
+                "DELETE FROM upload_sessions WHERE session_id = ? AND status = 'uploading'",
+                (session_id,),
+            ).rowcount
+        if deleted:
+            self._partial_path(session_id).unlink(missing_ok=True)
+        return bool(deleted)
+
+    async def abort(self, session_id: str) -> bool:
+        """
+        Drop an unfinished upload and its partial file.
+
+        Waits for a chunk that is being written to finish, so the partial
+        file is never removed under `append`.
+
+        Returns:
+            False if there was no unfinished session with this ID
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            deleted = await anyio.to_thread.run_sync(self._delete, session_id)
+            if deleted:
+                self._hashes.pop(session_id, None)
+        self._locks.pop(session_id, None)
+        return deleted
+
+
+upload_sessions = UploadSessions()
@@ -1,6 +1,9 @@
 from pathlib import Path
 from typing import Dict, Any
 from fastapi import BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from services.track_analytics import load_analytics, precompute_analytics, summarize
+from services.video_metadata import metadata_store
 
 class VideoAnalysisService:
     """
@@ -21,36 +24,45 @@ class VideoAnalysisService:
     async def analyze_video(self, filename: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Analyze a video file.
-        
+
+        Serves the track analytics precomputed when the video's processing
+        job finished (see `services.track_analytics`); they are computed
+        and stored here only for detections written before that existed.
+
         Args:
             filename: Name of the video file to analyze
-            options: Optional analysis parameters
-        
+            options: Optional analysis parameters: `track_ids`, `frame_start`,
+                `frame_end`, `trajectories` and `team_frames` (see
+                `services.track_analytics.summarize`)
+
         Returns:
             Analysis results dictionary
         """
         video_path = self.upload_dir / filename
-        
+
         if not video_path.exists():
             raise FileNotFoundError(f"Video file {filename} not found")
-        
-        # TODO: Implement your video analysis logic
-        # Example placeholders:
-        # - Load video using OpenCV or similar
-        # - Process frames
-        # - Run ML models for detection/tracking
-        # - Extract relevant data
-        
-        results = {
+
+        options = options or {}
+        analytics = await run_in_threadpool(load_analytics, filename)
+        if analytics is None:
+            if await run_in_threadpool(precompute_analytics, filename) is None:
+                return {"status": "not_processed", "filename": filename, "analysis": None}
+            analytics = await run_in_threadpool(load_analytics, filename)
+
+        analysis = await run_in_threadpool(
+            summarize, analytics,
+            track_ids=options.get("track_ids"),
+            frames=(options.get("frame_start") or 1, options.get("frame_end")),
+            trajectories=options.get("trajectories", False),
+            team_frames=options.get("team_frames", False),
+        )
+        return {
             "status": "success",
             "filename": filename,
-            "analysis": {
-                "message": "Implement your analysis logic here"
-            }
+            "analysis": analysis
         }
-        
-        return results
-    
+
     async def get_video_metadata(self, filename: str) -> Dict[str, Any]:
         """
         Extract metadata from a video file.
@@ -66,11 +78,22 @@ class VideoAnalysisService:
         if not video_path.exists():
             raise FileNotFoundError(f"Video file {filename} not found")
         
-        # TODO: Use a library like opencv-python or ffmpeg-python
-        # to extract actual video metadata
+        # Probed once at upload time (see services.video_metadata)
+        metadata = await run_in_threadpool(metadata_store.get, filename)
+        if metadata is None:
+            return {
+                "filename": filename,
+                "size": video_path.stat().st_size,
+                "format": video_path.suffix
+            }
         
         return {
             "filename": filename,
-            "size": video_path.stat().st_size,
-            "format": video_path.suffix
+            "size": metadata["size"],
+            "duration": metadata["duration"],
+            "resolution": f"{metadata['width']}x{metadata['height']}",
+            "format": metadata["format"],
+            "fps": metadata["fps"],
+            "frame_count": metadata["frame_count"],
+            "codec": metadata["codec"]
         }
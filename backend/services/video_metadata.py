@@ -0,0 +1,128 @@
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from services.frame_extract import probe_video
+from utils.db import DATA_DIR, connect
+
+UPLOAD_DIR = Path("uploads")
+METADATA_DB = DATA_DIR / "uploads.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_metadata (
+    video_id TEXT PRIMARY KEY,
+    sha256 TEXT,
+    size INTEGER NOT NULL,
+    duration REAL,
+    fps REAL,
+    frame_count INTEGER,
+    codec TEXT,
+    width INTEGER,
+    height INTEGER,
+    format TEXT,
+    bit_rate INTEGER,
+    probed_at TEXT NOT NULL
+);
+"""
+
+
+class MetadataStore:
+    """
+    ffprobe metadata of uploaded videos, probed once and kept in SQLite.
+
+    Uploads are probed right after they are written; videos that predate
+    the store are probed on first access.
+    """
+
+    def __init__(self, db_path: Path = METADATA_DB, upload_dir: Path = UPLOAD_DIR):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+
+        with closing(connect(self.db_path)) as conn, conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(video_metadata)")}
+            if "keyframes" in columns:
+                # Keyframes used to be listed at upload; they are now probed
+                # where segmenting needs them
+                conn.execute("ALTER TABLE video_metadata DROP COLUMN keyframes")
+
+    def _connect(self):
+        return closing(connect(self.db_path))
+
+    def probe(self, video_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Probe an uploaded video and store its metadata.
+
+        Args:
+            video_id: Name of the uploaded video file
+            sha256: Content hash, if computed during the upload
+
+        Returns:
+            Metadata dict
+
+        Raises:
+            subprocess.CalledProcessError, ValueError: If the file can't be
+                read as a video
+        """
+        video_path = self.upload_dir / video_id
+        info = probe_video(video_path)
+        metadata = {
+            "video_id": video_id,
+            "sha256": sha256,
+            "size": video_path.stat().st_size,
+            **info,
+            "probed_at": datetime.now().isoformat(),
+        }
+        with self._connect() as conn, conn:
+            columns = ", ".join(metadata)
+            placeholders = ", ".join("?" for _ in metadata)
+            conn.execute(
+                f"INSERT OR REPLACE INTO video_metadata ({columns}) VALUES ({placeholders})",
+                tuple(metadata.values()),
+            )
+        return metadata
+
+    def get(self, video_id: str, probe_missing: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Stored metadata of `video_id`.
+
+        Args:
+            video_id: Name of the uploaded video file
+            probe_missing: Probe (and store) videos without metadata
+
+        Returns:
+            Metadata dict, or None if unknown / not readable
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM video_metadata WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        if row is not None:
+            return dict(row)
+        if not probe_missing or not (self.upload_dir / video_id).is_file():
+            return None
+        try:
+            return self.probe(video_id)
+        except Exception as e:
+            print(f"Could not probe {video_id}: {e}")
+            return None
+
+    def delete(self, video_id: str):
+        """
+        Forget the metadata of a deleted video.
+        """
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM video_metadata WHERE video_id = ?", (video_id,))
+
+
+def estimate_frames(metadata: Optional[Dict[str, Any]], fps: float) -> Optional[int]:
+    """
+    Number of frames the pipeline will sample at `fps`, from stored metadata.
+    """
+    if not metadata or not metadata.get("duration"):
+        return None
+    return round(metadata["duration"] * fps)
+
+
+metadata_store = MetadataStore()
@@ -0,0 +1,23 @@
+import sqlite3
+from pathlib import Path
+
+# Shared location for the service's SQLite databases
+DATA_DIR = Path("data")
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """
+    Open a SQLite connection usable from any thread.
+
+    Args:
+        db_path: Path to the database file (parent directories are created)
+
+    Returns:
+        Connection with rows returned as `sqlite3.Row`
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers (status polling) proceed while a writer holds the lock
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
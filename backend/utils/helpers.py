@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import hashlib
 
 def generate_file_hash(file_path: Path) -> str:
@@ -13,11 +13,30 @@ def generate_file_hash(file_path: Path) -> str:
         Hexadecimal hash string
     """
     sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
+    update_file_hash(sha256_hash, file_path)
     return sha256_hash.hexdigest()
 
+def update_file_hash(hash_obj, file_path: Path, length: Optional[int] = None, block_size: int = 1024 * 1024):
+    """
+    Feed a file (or its first `length` bytes) into a hashlib object.
+    
+    Args:
+        hash_obj: hashlib hash to update
+        file_path: Path to the file
+        length: Number of bytes to read (default: the whole file)
+        block_size: Read size
+    """
+    remaining = length
+    with open(file_path, "rb") as f:
+        while remaining is None or remaining > 0:
+            size = block_size if remaining is None else min(block_size, remaining)
+            byte_block = f.read(size)
+            if not byte_block:
+                break
+            hash_obj.update(byte_block)
+            if remaining is not None:
+                remaining -= len(byte_block)
+
 def get_file_extension(filename: str) -> str:
     """
     Extract file extension from filename.